@@ -1,18 +1,22 @@
-use axum::{http::StatusCode, Json};
+use std::sync::Arc;
+use axum::{extract::State, http::StatusCode, Json};
 use serde::{Deserialize, Serialize};
 use tfhe::integer::{RadixClientKey, RadixCiphertext, ServerKey};
 use crate::fhe_engine::core as fhe_core;
+use crate::key_registry::KeyRegistry;
 use crate::mpc_client::MPCClient;
+use crate::wire::{Blob, Wire};
 
 
 #[derive(Deserialize)]
 pub struct EvaluationPayload {
     strategy_type: String,
-    encrypted_upper_bound: String,
-    encrypted_lower_bound: String,
-    server_key: String,
+    encrypted_upper_bound: Blob,
+    encrypted_lower_bound: Blob,
+    server_key: Option<Blob>, // Full key - omitted when `server_key_handle` is sent
+    server_key_handle: Option<String>, // Handle returned by /registerKey
     current_price_cents: u32,
-    encrypted_client_key: Option<String>, // Optional - only if shares NOT stored on MPC
+    encrypted_client_key: Option<Blob>, // Optional - only if shares NOT stored on MPC
     mpc_public_key_set: Option<String>, // MPC public key set for distributed key
     mpc_share_indices: Option<Vec<usize>>, // Which MPC servers hold shares
     fhe_key_id: Option<String>, // Key ID when shares are stored on MPC servers
@@ -21,68 +25,126 @@ pub struct EvaluationPayload {
 #[derive(Serialize)]
 pub struct EvaluationResponse {
     is_triggered: bool,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    error: Option<String>,
+}
+
+/// One strategy inside a batch: everything from `EvaluationPayload` except the shared key and price.
+#[derive(Deserialize)]
+pub struct BatchItem {
+    strategy_type: String,
+    encrypted_upper_bound: Blob,
+    encrypted_lower_bound: Blob,
+    encrypted_client_key: Option<Blob>,
+    mpc_public_key_set: Option<String>,
+    mpc_share_indices: Option<Vec<usize>>,
+    fhe_key_id: Option<String>,
+}
+
+/// Strategies that share one server key, evaluated against one price.
+#[derive(Deserialize)]
+pub struct BatchEvaluationPayload {
+    server_key: Option<Blob>,
+    server_key_handle: Option<String>,
+    current_price_cents: u32,
+    strategies: Vec<BatchItem>,
+}
+
+#[derive(Serialize)]
+pub struct BatchEvaluationResponse {
+    /// Same order as the request; `null` when that strategy could not be evaluated.
+    results: Vec<Option<bool>>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    error: Option<String>,
 }
 
 /// This function simulates a Trusted Execution Environment (TEE).
-fn simulate_tee_decryption(encrypted_result: &RadixCiphertext, client_key_hex: &str) -> bool {
+fn simulate_tee_decryption(encrypted_result: &RadixCiphertext, client_key_bytes: &[u8]) -> bool {
     println!("[TEE Simulation] Performing secure decryption inside the enclave...");
     // The TEE can safely deserialize the client key to use it for the one-time decryption.
-    let client_key_bytes = hex::decode(client_key_hex).unwrap();
-    let client_key: RadixClientKey = bincode::deserialize(&client_key_bytes).unwrap();
+    let client_key: RadixClientKey = bincode::deserialize(client_key_bytes).unwrap();
     client_key.decrypt::<u64>(encrypted_result) == 1
 }
 
+/// Looks up a registered key by handle, or deserializes a key sent inline.
+/// An unregistered handle (e.g. after an engine restart) yields 422 "unknown_key" so the client re-uploads.
+fn resolve_server_key(
+    registry: &KeyRegistry,
+    server_key: &Option<Blob>,
+    server_key_handle: &Option<String>,
+) -> Result<Arc<ServerKey>, (StatusCode, String)> {
+    if let Some(handle) = server_key_handle {
+        return registry
+            .get(handle)
+            .ok_or((StatusCode::UNPROCESSABLE_ENTITY, "unknown_key".to_string()));
+    }
+    let key = server_key
+        .as_ref()
+        .ok_or((StatusCode::BAD_REQUEST, "missing_server_key".to_string()))?;
+    bincode::deserialize::<ServerKey>(&key.0)
+        .ok()
+        .map(Arc::new)
+        .ok_or((StatusCode::BAD_REQUEST, "invalid_server_key".to_string()))
+}
 
-pub async fn evaluate_strategy(
-    Json(payload): Json<EvaluationPayload>,
-) -> (StatusCode, Json<EvaluationResponse>) {
-    
-    println!("[Rust FHE Engine] Received REAL evaluation request from Python orchestrator.");
+fn decode_ciphertext(ciphertext: &Blob) -> Option<RadixCiphertext> {
+    bincode::deserialize(&ciphertext.0).ok()
+}
 
-    // 1. Deserialize the raw byte data from the JSON payload into real FHE objects.
-    let server_key: ServerKey = bincode::deserialize(&hex::decode(payload.server_key).unwrap()).unwrap();
-    
-    // 2. Perform the real homomorphic computation based on the strategy type.
-    let encrypted_result = match payload.strategy_type.as_str() {
+/// Runs the homomorphic comparison for one strategy type. `None` for unknown types or bad ciphertexts.
+fn compute_encrypted_result(
+    server_key: &ServerKey,
+    strategy_type: &str,
+    encrypted_upper_bound: &Blob,
+    encrypted_lower_bound: &Blob,
+    current_price_cents: u32,
+) -> Option<RadixCiphertext> {
+    match strategy_type {
         "LIMIT_ORDER" | "BRACKET_ORDER_SHORT" => {
-            let enc_upper: RadixCiphertext = bincode::deserialize(&hex::decode(payload.encrypted_upper_bound).unwrap()).unwrap();
-            let enc_lower: RadixCiphertext = bincode::deserialize(&hex::decode(payload.encrypted_lower_bound).unwrap()).unwrap();
-            
-            let is_above = fhe_core::homomorphic_check(&server_key, &enc_upper, "GTE", payload.current_price_cents);
-            let is_below = fhe_core::homomorphic_check(&server_key, &enc_lower, "LTE", payload.current_price_cents);
+            let enc_upper = decode_ciphertext(encrypted_upper_bound)?;
+            let enc_lower = decode_ciphertext(encrypted_lower_bound)?;
+
+            let is_above = fhe_core::homomorphic_check(server_key, &enc_upper, "GTE", current_price_cents);
+            let is_below = fhe_core::homomorphic_check(server_key, &enc_lower, "LTE", current_price_cents);
 
-            fhe_core::homomorphic_or(&server_key, &is_above, &is_below)
+            Some(fhe_core::homomorphic_or(server_key, &is_above, &is_below))
         },
         "LIMIT_BUY_DIP" => {
-             let enc_lower: RadixCiphertext = bincode::deserialize(&hex::decode(payload.encrypted_lower_bound).unwrap()).unwrap();
-             fhe_core::homomorphic_check(&server_key, &enc_lower, "LTE", payload.current_price_cents)
+            let enc_lower = decode_ciphertext(encrypted_lower_bound)?;
+            Some(fhe_core::homomorphic_check(server_key, &enc_lower, "LTE", current_price_cents))
         },
         "LIMIT_SELL_RALLY" => {
-             let enc_upper: RadixCiphertext = bincode::deserialize(&hex::decode(payload.encrypted_upper_bound).unwrap()).unwrap();
-             fhe_core::homomorphic_check(&server_key, &enc_upper, "GTE", payload.current_price_cents)
+            let enc_upper = decode_ciphertext(encrypted_upper_bound)?;
+            Some(fhe_core::homomorphic_check(server_key, &enc_upper, "GTE", current_price_cents))
         },
         _ => {
-            println!("[Rust FHE Engine] ❌ Error: Unknown strategy type '{}'", payload.strategy_type);
-            return (StatusCode::BAD_REQUEST, Json(EvaluationResponse { is_triggered: false }));
+            println!("[Rust FHE Engine] ❌ Error: Unknown strategy type '{}'", strategy_type);
+            None
         }
-    };
-    
-    // 3. Decrypt the result - ALWAYS use MPC if key_id is provided (no direct decryption)
-    let is_triggered = if let Some(key_id) = &payload.fhe_key_id {
+    }
+}
+
+/// Decrypts the comparison result - ALWAYS uses MPC if key_id is provided (no direct decryption).
+async fn decrypt_result(
+    encrypted_result: &RadixCiphertext,
+    fhe_key_id: &Option<String>,
+    encrypted_client_key: &Option<Blob>,
+) -> Result<bool, StatusCode> {
+    if let Some(key_id) = fhe_key_id {
         println!("[Rust FHE Engine] Using MPC threshold decryption (key_id: {})...", key_id);
-        
+
         // Serialize the encrypted result for MPC servers
-        let encrypted_result_hex = hex::encode(bincode::serialize(&encrypted_result).unwrap());
-        
+        let encrypted_result_hex = hex::encode(bincode::serialize(encrypted_result).unwrap());
+
         // Create MPC client and request threshold decryption
         let mpc_client = MPCClient::new();
-        
+
         // Check if MPC servers are available
         let mpc_available = mpc_client.check_health().await;
-        
+
         if mpc_available {
             println!("[Rust FHE Engine] MPC servers available, requesting threshold decryption...");
-            
+
             // Request threshold decryption using key shares stored on MPC servers
             // Full key is NEVER reconstructed - MPC servers use their shares directly
             match mpc_client.request_mpc_decryption(
@@ -92,34 +154,99 @@ pub async fn evaluate_strategy(
             ).await {
                 Ok(decrypted_value) => {
                     println!("[Rust FHE Engine] ✅ MPC threshold decryption successful: {}", decrypted_value);
-                    decrypted_value == 1
+                    Ok(decrypted_value == 1)
                 }
                 Err(e) => {
                     eprintln!("[Rust FHE Engine] ❌ MPC threshold decryption failed: {}", e);
                     eprintln!("[Rust FHE Engine] ❌ Cannot fall back - threshold decryption required");
                     // Return error - no fallback to direct decryption
-                    return (StatusCode::SERVICE_UNAVAILABLE, Json(EvaluationResponse { 
-                        is_triggered: false 
-                    }));
+                    Err(StatusCode::SERVICE_UNAVAILABLE)
                 }
             }
         } else {
             eprintln!("[Rust FHE Engine] ❌ MPC servers not available - threshold decryption required");
-            return (StatusCode::SERVICE_UNAVAILABLE, Json(EvaluationResponse { 
-                is_triggered: false 
-            }));
+            Err(StatusCode::SERVICE_UNAVAILABLE)
         }
-    } else if let Some(client_key_hex) = &payload.encrypted_client_key {
+    } else if let Some(client_key) = encrypted_client_key {
         // Fallback: Only if no MPC key_id and client_key provided (legacy support)
         println!("[Rust FHE Engine] ⚠️  No MPC key_id, using direct decryption (legacy mode)");
-        simulate_tee_decryption(&encrypted_result, client_key_hex)
+        Ok(simulate_tee_decryption(encrypted_result, &client_key.0))
     } else {
         eprintln!("[Rust FHE Engine] ❌ No decryption method available - missing both key_id and client_key");
-        return (StatusCode::BAD_REQUEST, Json(EvaluationResponse { 
-            is_triggered: false 
-        }));
+        Err(StatusCode::BAD_REQUEST)
+    }
+}
+
+
+pub async fn evaluate_strategy(
+    State(registry): State<KeyRegistry>,
+    Wire(payload): Wire<EvaluationPayload>,
+) -> (StatusCode, Json<EvaluationResponse>) {
+
+    println!("[Rust FHE Engine] Received REAL evaluation request from Python orchestrator.");
+
+    // 1. Resolve the server key (registered handle or inline bytes) into a real FHE object.
+    let server_key = match resolve_server_key(&registry, &payload.server_key, &payload.server_key_handle) {
+        Ok(key) => key,
+        Err((status, error)) => {
+            eprintln!("[Rust FHE Engine] ❌ Server key unavailable: {}", error);
+            return (status, Json(EvaluationResponse { is_triggered: false, error: Some(error) }));
+        }
+    };
+
+    // 2. Perform the real homomorphic computation based on the strategy type.
+    let encrypted_result = match compute_encrypted_result(
+        &server_key,
+        &payload.strategy_type,
+        &payload.encrypted_upper_bound,
+        &payload.encrypted_lower_bound,
+        payload.current_price_cents,
+    ) {
+        Some(result) => result,
+        None => return (StatusCode::BAD_REQUEST, Json(EvaluationResponse { is_triggered: false, error: None })),
+    };
+
+    // 3. Decrypt the result
+    let is_triggered = match decrypt_result(&encrypted_result, &payload.fhe_key_id, &payload.encrypted_client_key).await {
+        Ok(is_triggered) => is_triggered,
+        Err(status) => return (status, Json(EvaluationResponse { is_triggered: false, error: None })),
     };
 
     println!("[Rust FHE Engine] Real FHE evaluation complete. Responding with 'is_triggered: {}'", is_triggered);
-    (StatusCode::OK, Json(EvaluationResponse { is_triggered }))
-}
\ No newline at end of file
+    (StatusCode::OK, Json(EvaluationResponse { is_triggered, error: None }))
+}
+
+/// Evaluates many strategies that share a server key, deserializing the key only once.
+pub async fn evaluate_batch(
+    State(registry): State<KeyRegistry>,
+    Wire(payload): Wire<BatchEvaluationPayload>,
+) -> (StatusCode, Json<BatchEvaluationResponse>) {
+
+    println!("[Rust FHE Engine] Received batch of {} strategies.", payload.strategies.len());
+
+    let server_key = match resolve_server_key(&registry, &payload.server_key, &payload.server_key_handle) {
+        Ok(key) => key,
+        Err((status, error)) => {
+            eprintln!("[Rust FHE Engine] ❌ Batch server key unavailable: {}", error);
+            return (status, Json(BatchEvaluationResponse { results: vec![], error: Some(error) }));
+        }
+    };
+
+    let mut results = Vec::with_capacity(payload.strategies.len());
+    for item in &payload.strategies {
+        let outcome = match compute_encrypted_result(
+            &server_key,
+            &item.strategy_type,
+            &item.encrypted_upper_bound,
+            &item.encrypted_lower_bound,
+            payload.current_price_cents,
+        ) {
+            Some(encrypted_result) => decrypt_result(&encrypted_result, &item.fhe_key_id, &item.encrypted_client_key).await.ok(),
+            None => None,
+        };
+        results.push(outcome);
+    }
+
+    println!("[Rust FHE Engine] Batch evaluation complete: {:?}", results);
+    (StatusCode::OK, Json(BatchEvaluationResponse { results, error: None }))
+}
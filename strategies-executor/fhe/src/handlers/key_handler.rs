@@ -0,0 +1,34 @@
+use axum::{extract::State, http::StatusCode, Json};
+use serde::{Deserialize, Serialize};
+use crate::key_registry::KeyRegistry;
+use crate::wire::{Blob, Wire};
+
+#[derive(Deserialize)]
+pub struct RegisterKeyPayload {
+    server_key: Blob,
+}
+
+#[derive(Serialize)]
+pub struct RegisterKeyResponse {
+    #[serde(skip_serializing_if = "Option::is_none")]
+    key_handle: Option<String>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    error: Option<String>,
+}
+
+/// Uploads a server key once; later evaluations reference it by the returned handle.
+pub async fn register_key(
+    State(registry): State<KeyRegistry>,
+    Wire(payload): Wire<RegisterKeyPayload>,
+) -> (StatusCode, Json<RegisterKeyResponse>) {
+    match registry.register(&payload.server_key.0) {
+        Ok(handle) => {
+            println!("[Rust FHE Engine] 🔑 Server key registered (handle: {})", handle);
+            (StatusCode::OK, Json(RegisterKeyResponse { key_handle: Some(handle), error: None }))
+        }
+        Err(e) => {
+            eprintln!("[Rust FHE Engine] ❌ Could not deserialize server key: {}", e);
+            (StatusCode::BAD_REQUEST, Json(RegisterKeyResponse { key_handle: None, error: Some("invalid_server_key".to_string()) }))
+        }
+    }
+}
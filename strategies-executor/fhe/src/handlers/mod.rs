@@ -1 +1,2 @@
 pub mod evaluation_handler;
+pub mod key_handler;
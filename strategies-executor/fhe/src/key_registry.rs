@@ -0,0 +1,67 @@
+// Registry of deserialized server keys, so clients upload a key once and evaluate by handle
+use std::collections::{HashMap, VecDeque};
+use std::env;
+use std::sync::{Arc, RwLock};
+use sha2::{Digest, Sha256};
+use tfhe::integer::ServerKey;
+
+const DEFAULT_MAX_REGISTERED_KEYS: usize = 32;
+
+struct RegistryInner {
+    keys: HashMap<String, Arc<ServerKey>>,
+    order: VecDeque<String>, // Registration order, oldest first, for eviction
+}
+
+#[derive(Clone)]
+pub struct KeyRegistry {
+    inner: Arc<RwLock<RegistryInner>>,
+    capacity: usize,
+}
+
+impl KeyRegistry {
+    pub fn new(capacity: usize) -> Self {
+        Self {
+            inner: Arc::new(RwLock::new(RegistryInner {
+                keys: HashMap::new(),
+                order: VecDeque::new(),
+            })),
+            capacity: capacity.max(1),
+        }
+    }
+
+    pub fn from_env() -> Self {
+        let capacity = env::var("MAX_REGISTERED_KEYS")
+            .ok()
+            .and_then(|v| v.parse().ok())
+            .unwrap_or(DEFAULT_MAX_REGISTERED_KEYS);
+        Self::new(capacity)
+    }
+
+    /// Deserializes and stores a key, returning its handle (hex sha256 of the serialized key).
+    /// Registering a key that is already present is a cheap no-op.
+    pub fn register(&self, key_bytes: &[u8]) -> Result<String, String> {
+        let handle = hex::encode(Sha256::digest(key_bytes));
+        if self.get(&handle).is_some() {
+            return Ok(handle);
+        }
+
+        let server_key: ServerKey = bincode::deserialize(key_bytes).map_err(|e| e.to_string())?;
+
+        let mut inner = self.inner.write().unwrap();
+        if !inner.keys.contains_key(&handle) {
+            inner.order.push_back(handle.clone());
+            inner.keys.insert(handle.clone(), Arc::new(server_key));
+            // Evict the oldest keys; clients re-register transparently on "unknown_key"
+            while inner.order.len() > self.capacity {
+                if let Some(evicted) = inner.order.pop_front() {
+                    inner.keys.remove(&evicted);
+                }
+            }
+        }
+        Ok(handle)
+    }
+
+    pub fn get(&self, handle: &str) -> Option<Arc<ServerKey>> {
+        self.inner.read().unwrap().keys.get(handle).cloned()
+    }
+}
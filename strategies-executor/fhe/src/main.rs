@@ -3,9 +3,12 @@ mod fhe_engine;
 mod config;
 mod mpc_client;
 mod auth;
+mod key_registry;
+mod wire;
 
 use axum::{routing::post, Router, extract::DefaultBodyLimit, middleware};
-use handlers::evaluation_handler;
+use handlers::{evaluation_handler, key_handler};
+use key_registry::KeyRegistry;
 use tower_http::cors::CorsLayer;
 use std::net::SocketAddr;
 use auth::auth_middleware;
@@ -19,9 +22,12 @@ async fn main() {
     
     let app = Router::new()
         .route("/evaluateStrategy", post(evaluation_handler::evaluate_strategy))
+        .route("/evaluateBatch", post(evaluation_handler::evaluate_batch))
+        .route("/registerKey", post(key_handler::register_key))
         .layer(middleware::from_fn(auth_middleware)) // Add authentication
         .layer(CorsLayer::permissive()) 
-        .layer(DefaultBodyLimit::max(50000000000 * 1024 * 1024)); 
+        .layer(DefaultBodyLimit::max(50000000000 * 1024 * 1024))
+        .with_state(KeyRegistry::from_env());
 
     let addr = SocketAddr::from(([0, 0, 0, 0], 5001));
     let listener = tokio::net::TcpListener::bind(addr).await.unwrap();
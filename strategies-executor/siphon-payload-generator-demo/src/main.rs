@@ -24,6 +24,8 @@ struct StrategyInput {
     upper_bound: f64,
     lower_bound: f64,
     recipient_address: String,
+    #[serde(default)]
+    pool_address: Option<String>, // Swap pool; the executor falls back to its default pool
     zk_proof: Value, 
 }
 
@@ -35,6 +37,7 @@ struct StrategyPayload {
     asset_out: String,
     amount: f64,
     recipient_address: String,
+    pool_address: Option<String>,
     zkp_data: String,
     encrypted_upper_bound: String,
     encrypted_lower_bound: String,
@@ -309,6 +312,7 @@ async fn handle_generate_payload(Json(input): Json<StrategyInput>) -> impl IntoR
         asset_out: input.asset_out.clone(),
         amount: input.amount,
         recipient_address: input.recipient_address.clone(),
+        pool_address: input.pool_address.clone(),
         zkp_data: zkp_data_string,
         encrypted_upper_bound: encode(bincode::serialize(&encrypted_upper).unwrap()),
         encrypted_lower_bound: encode(bincode::serialize(&encrypted_lower).unwrap()),
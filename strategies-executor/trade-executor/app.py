@@ -1,12 +1,19 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import threading
 import os
-import json
+import uuid
 from database import db, Strategy
-from scheduler import worker_loop
-from config import DATABASE_URI, PYTH_PRICE_FEED_IDS
+from scheduler import worker_loop, cadence_report, feed_round_report
+from config import (
+    DATABASE_URI, EMBEDDED_SCHEDULER, INGEST_MODE,
+    BULK_INGEST_BATCH_SIZE, BULK_INGEST_BATCH_BYTES, BULK_MAX_LINE_BYTES,
+)
 from auth import require_auth, rate_limit
+import ingest
+import leases
+import metrics
+from ingest import InvalidStrategy
 
 
 app = Flask(__name__)
@@ -35,7 +42,14 @@ db.init_app(app)
 def health():
     return jsonify({"status": "healthy", "service": "trade-executor"}), 200
 
-if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+# Prometheus scrape endpoint (no auth required, like /health)
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+# Standalone schedulers (run_scheduler.py) import this app with EMBEDDED_SCHEDULER off, and
+# ingest pool workers re-import a `python app.py` dev server as __mp_main__
+if EMBEDDED_SCHEDULER and __name__ != '__mp_main__' and (not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
     print("--- Starting the background scheduler thread ---")
     scheduler_thread = threading.Thread(target=worker_loop, args=(app,), daemon=True)
     scheduler_thread.start()
@@ -48,29 +62,26 @@ def create_strategy():
     if not data: 
         return jsonify({"error": "Invalid JSON"}), 400
 
-
     try:
-        strategy_type = data.get("strategy_type", "")
-        token_symbol = data.get('asset_in') if "LONG" in strategy_type or "SELL" in strategy_type else data.get('asset_out')
+        swap_template = ingest.validate_payload(data)
+    except InvalidStrategy as e:
+        return jsonify({"error": str(e)}), 400
+
+    if INGEST_MODE == "async":
+        # Spool the raw body and let the ingest pool encode and insert it
+        strategy_id = str(uuid.uuid4())
+        try:
+            ingest.spool_payload(strategy_id, request.get_data())
+        except OSError as e:
+            print(f"Error spooling strategy: {e}")
+            return jsonify({"error": f"Could not accept strategy: {e}"}), 503
+        ingest.submit(strategy_id)
+        return jsonify({"status": "accepted", "strategy_id": strategy_id,
+                        "status_url": f"/strategyStatus/{strategy_id}"}), 202
 
+    try:
         # Data is automatically compressed and encrypted by the database model
-        new_strategy = Strategy(
-            user_id=data['user_id'],
-            strategy_type=strategy_type,
-            asset_in=data['asset_in'],
-            asset_out=data['asset_out'],
-            amount=data['amount'],
-            recipient_address=data['recipient_address'],
-            encrypted_upper_bound=json.dumps(data.get('encrypted_upper_bound')),
-            encrypted_lower_bound=json.dumps(data.get('encrypted_lower_bound')),
-            server_key=json.dumps(data.get('server_key')),  # Will be compressed + encrypted
-            encrypted_client_key=json.dumps(data.get('encrypted_client_key')) if data.get('encrypted_client_key') else None,  # Optional - None if using MPC shares
-            mpc_public_key_set=data.get('mpc_public_key_set'),
-            mpc_share_indices=json.dumps(data.get('mpc_share_indices')) if data.get('mpc_share_indices') else None,
-            fhe_key_id=data.get('fhe_key_id'),  # Key ID when shares stored on MPC
-            zkp_data=json.dumps(data.get('zkp_data') or data.get('zk_proof')) if (data.get('zkp_data') or data.get('zk_proof')) else None
-        )
-        
+        new_strategy = ingest.new_strategy(data, swap_template)
         db.session.add(new_strategy)
         db.session.commit()
         return jsonify({"status": "success", "strategy_id": new_strategy.id}), 201
@@ -80,6 +91,39 @@ def create_strategy():
         db.session.rollback()
         return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
 
+@app.route('/createStrategies', methods=['POST'])
+@require_auth
+@rate_limit(max_requests=10, window_seconds=60)
+def create_strategies():
+    """Bulk ingest: one strategy per NDJSON line, read as it streams in and inserted in batched transactions"""
+    results = ingest.ingest_ndjson(request.stream, BULK_INGEST_BATCH_SIZE, BULK_INGEST_BATCH_BYTES, BULK_MAX_LINE_BYTES)
+    created = sum(1 for result in results if "strategy_id" in result)
+    print(f"[Ingest] Bulk request: {created} created, {len(results) - created} failed")
+    return jsonify({"created": created, "failed": len(results) - created, "results": results}), 200
+
+@app.route('/strategyStatus/<strategy_id>', methods=['GET'])
+@require_auth
+def strategy_status(strategy_id):
+    """Where a strategy is: INGESTING/REJECTED before it has a row, then its lifecycle status"""
+    row = db.session.query(Strategy.status, Strategy.tx_hash, Strategy.last_error).filter_by(id=strategy_id).first()
+    if row is not None:
+        return jsonify({"strategy_id": strategy_id, "status": row.status, "live": True,
+                        "tx_hash": row.tx_hash, "last_error": row.last_error}), 200
+
+    spooled = ingest.spool_status(strategy_id)
+    if spooled is None:
+        return jsonify({"error": "Unknown strategy"}), 404
+    status, error = spooled
+    return jsonify({"strategy_id": strategy_id, "status": status, "live": False, "error": error}), 200
+
+@app.route('/schedulerStatus', methods=['GET'])
+@require_auth
+def scheduler_status():
+    """Latest evaluation round per feed from the database, whichever scheduler process ran it (standalone
+    run_scheduler.py ones included), and this process's own cadence if it embeds a scheduler"""
+    return jsonify({"owner": leases.owner_id(), "embedded_scheduler": EMBEDDED_SCHEDULER,
+                    "feeds": feed_round_report(), "cadence": cadence_report()}), 200
+
 if __name__ == '__main__':
     # Local dev (prefer gunicorn for production-like behavior)
     app.run(port=5005, debug=True)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Payload Archive
+Background compaction of terminal strategies. Once a CONFIRMED or FAILED
+strategy (or an EXECUTED one from before execution was tracked) hasn't changed
+for ARCHIVE_AFTER_SECONDS, its payloads (server key reference, client key,
+bounds, proof, swap template) are appended to an append-only segment file in
+ARCHIVE_DIR and deleted from the database, and the strategy row records the
+segment and offset. Server keys no strategy references any more are archived
+the same way. The freed pages are handed back with incremental vacuum, so the
+database (and its backups) grow with the live book instead of all-time volume;
+segments only ever grow at the end, so they back up incrementally.
+
+Records hold the stored column bytes as they are: the blob envelope is already
+compressed, and encrypted for key material. Work goes in batches of
+ARCHIVE_BATCH_SIZE: payloads are read and written to the segment (fsynced)
+outside any write transaction, then one short transaction points the rows at
+the archive. A crash in between only leaves an unreferenced record behind.
+
+    python archive.py                 # one compaction pass
+    python archive.py --restore ID    # put an archived strategy's payloads back
+"""
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta
+from threading import Lock
+from config import (
+    ARCHIVE_DIR, ARCHIVE_AFTER_SECONDS, ARCHIVE_INTERVAL_SECONDS, ARCHIVE_BATCH_SIZE, ARCHIVE_BATCH_PAUSE_SECONDS,
+    ARCHIVE_SEGMENT_MAX_BYTES, ARCHIVE_VACUUM_PAGES,
+)
+from database import (
+    db, Strategy, StrategyBlob, ServerKey, BLOB_ATTRIBUTES, archivable_strategy_ids, raw_payloads, mark_archived,
+    orphaned_server_keys, delete_orphaned_server_keys,
+)
+import leases
+
+# Record: magic, header length, body length, CRC-32 of header + body; then the JSON header and the body.
+# The header lists the body's columns in order, with their lengths (None for NULL).
+MAGIC = b"SBA1"
+RECORD_HEAD = struct.Struct(">4sIII")
+
+_stats_lock = Lock()
+archive_stats = {"strategies": 0, "server_keys": 0, "bytes": 0, "pages_freed": 0}
+
+def count(**amounts):
+    with _stats_lock:
+        for name, amount in amounts.items():
+            archive_stats[name] += amount
+
+# --- Segments ---
+
+def segment_names():
+    """Segment files in ARCHIVE_DIR, oldest first"""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(name for name in os.listdir(ARCHIVE_DIR) if name.startswith("segment-") and name.endswith(".sba"))
+
+def _open_segment():
+    """The segment to append to (a new one once the last is full), opened for append and locked"""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    names = segment_names()
+    number = int(names[-1][len("segment-"):-len(".sba")]) if names else 1
+    if names and os.path.getsize(os.path.join(ARCHIVE_DIR, names[-1])) >= ARCHIVE_SEGMENT_MAX_BYTES:
+        number += 1
+    name = f"segment-{number:06d}.sba"
+    path = os.path.join(ARCHIVE_DIR, name)
+    created = not os.path.exists(path)
+    f = open(path, "ab")
+    fcntl.flock(f, fcntl.LOCK_EX)  # Other scheduler processes append to the same segment
+    if created:
+        dir_fd = os.open(ARCHIVE_DIR, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)  # Make the new file itself durable
+        finally:
+            os.close(dir_fd)
+    return name, f
+
+def encode_record(header, columns):
+    """One record for `columns` ({column name: bytes or None}), described by `header`"""
+    header = dict(header, columns=[[name, None if raw is None else len(raw)] for name, raw in columns.items()])
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    body = b"".join(raw for raw in columns.values() if raw is not None)
+    crc = zlib.crc32(body, zlib.crc32(header_bytes))
+    return RECORD_HEAD.pack(MAGIC, len(header_bytes), len(body), crc) + header_bytes + body
+
+def append_records(records):
+    """Append encoded records to the current segment and fsync it; returns (segment, offset) per record"""
+    name, f = _open_segment()
+    try:
+        offset = f.seek(0, os.SEEK_END)
+        locations = []
+        for record in records:
+            locations.append((name, offset))
+            f.write(record)
+            offset += len(record)
+        f.flush()
+        os.fsync(f.fileno())
+        return locations
+    finally:
+        f.close()  # Also releases the lock
+
+def _read_at(f, offset):
+    """(header, {column name: bytes or None}) of the record at `offset`, or None at a torn or corrupt tail"""
+    f.seek(offset)
+    head = f.read(RECORD_HEAD.size)
+    if len(head) < RECORD_HEAD.size:
+        return None
+    magic, header_length, body_length, crc = RECORD_HEAD.unpack(head)
+    header_bytes = f.read(header_length)
+    body = f.read(body_length)
+    if magic != MAGIC or len(body) != body_length or zlib.crc32(body, zlib.crc32(header_bytes)) != crc:
+        return None
+    header = json.loads(header_bytes)
+    columns, position = {}, 0
+    for name, length in header.pop("columns"):
+        columns[name] = None if length is None else body[position:position + length]
+        position += length or 0
+    return header, columns
+
+def read_record(segment, offset):
+    with open(os.path.join(ARCHIVE_DIR, segment), "rb") as f:
+        record = _read_at(f, offset)
+    if record is None:
+        raise ValueError(f"no valid archive record at {segment}:{offset}")
+    return record
+
+def iter_records(segment):
+    """(offset, header, columns) for every record in a segment, stopping at a torn tail"""
+    with open(os.path.join(ARCHIVE_DIR, segment), "rb") as f:
+        offset = 0
+        while True:
+            record = _read_at(f, offset)
+            if record is None:
+                return
+            yield (offset,) + record
+            offset = f.tell()
+
+# --- Compaction ---
+
+def archive_strategies():
+    """Archive one batch of terminal strategies; returns how many"""
+    updated_before = datetime.utcnow() - timedelta(seconds=ARCHIVE_AFTER_SECONDS)
+    # Leases keep two scheduler processes from archiving the same strategy
+    claimed = leases.claim(archivable_strategy_ids(updated_before, ARCHIVE_BATCH_SIZE))
+    if not claimed:
+        return 0
+    try:
+        payloads = raw_payloads(claimed)
+        archived_at = datetime.utcnow().isoformat()
+        ids = sorted(payloads)
+        records = [
+            encode_record({"kind": "strategy", "id": strategy_id, "server_key_digest": payloads[strategy_id][0],
+                           "archived_at": archived_at}, payloads[strategy_id][1])
+            for strategy_id in ids
+        ]
+        locations = append_records(records)
+        archived = mark_archived({strategy_id: location + (payloads[strategy_id][0],)
+                                  for strategy_id, location in zip(ids, locations)}, leases.owner_id())
+    finally:
+        leases.release(claimed)  # Only what wasn't archived is still ours
+    count(strategies=len(archived), bytes=sum(len(record) for record in records))
+    return len(archived)
+
+def archive_orphaned_keys():
+    """Archive and delete one batch of server keys no strategy references; returns how many"""
+    keys = orphaned_server_keys(ARCHIVE_BATCH_SIZE)
+    if not keys:
+        return 0
+    records = [encode_record({"kind": "server_key", "id": digest}, {"key_data": raw}) for digest, raw in keys]
+    append_records(records)
+    deleted = delete_orphaned_server_keys([digest for digest, _ in keys])
+    count(server_keys=deleted, bytes=sum(len(record) for record in records))
+    return deleted
+
+def vacuum_step():
+    """Hand up to ARCHIVE_VACUUM_PAGES free pages back to the filesystem; returns how many"""
+    with db.engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            return 0  # Not INCREMENTAL yet: the file switches at its next full VACUUM
+        before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        # sqlite3's execute() runs a single step of this pragma, which frees one page; executescript() runs it all
+        conn.connection.dbapi_connection.executescript(f"PRAGMA incremental_vacuum({ARCHIVE_VACUUM_PAGES});")
+        freed = before - conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    count(pages_freed=freed)
+    return freed
+
+def compact():
+    """Archive everything due, batch by batch, pausing between batches; returns the number of strategies"""
+    total = 0
+    while True:
+        archived = archive_strategies()
+        keys = archive_orphaned_keys()
+        if archived or keys:
+            vacuum_step()
+        total += archived
+        if not archived and not keys:
+            break
+        time.sleep(ARCHIVE_BATCH_PAUSE_SECONDS)
+    # Leftover free pages (e.g. from deletes elsewhere), still in small steps
+    while vacuum_step() >= ARCHIVE_VACUUM_PAGES:
+        time.sleep(ARCHIVE_BATCH_PAUSE_SECONDS)
+    return total
+
+def stats():
+    """Strategies and server keys archived, bytes written to segments and pages freed by this process so far"""
+    with _stats_lock:
+        return dict(archive_stats)
+
+async def run(app):
+    """Background loop: a compaction pass every ARCHIVE_INTERVAL_SECONDS, on a worker thread"""
+    def compact_in_app():
+        with app.app_context():
+            return compact()
+
+    while True:
+        try:
+            archived = await asyncio.to_thread(compact_in_app)
+            if archived:
+                print(f"[Archive] Archived {archived} strategies: {stats()}")
+        except Exception as e:
+            print(f"[Archive] Compaction error: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+# --- Reading back ---
+
+def find_server_key(digest):
+    """Stored bytes of an archived server key, searching the newest segments first"""
+    for segment in reversed(segment_names()):
+        found = None
+        for _, header, columns in iter_records(segment):
+            if header["kind"] == "server_key" and header["id"] == digest:
+                found = columns["key_data"]
+        if found is not None:
+            return found
+    return None
+
+def load_archived(strategy_id):
+    """Decoded payloads of an archived strategy, by Strategy attribute, plus its server key as 'server_key'"""
+    strategy = db.session.get(Strategy, strategy_id)
+    if strategy is None or strategy.archived_at is None:
+        raise ValueError(f"strategy {strategy_id} is not archived")
+    header, columns = read_record(strategy.archive_segment, strategy.archive_offset)
+    dialect = db.engine.dialect
+    values = {}
+    for attr in BLOB_ATTRIBUTES:
+        column = StrategyBlob.__mapper__.get_property(attr).columns[0]
+        values[attr] = column.type.process_result_value(columns.get(column.name), dialect)
+
+    digest = header.get("server_key_digest")
+    values["server_key"] = values["inline_server_key"]
+    if digest:
+        key = db.session.get(ServerKey, digest)  # Still stored if another strategy uses it
+        raw = None if key is not None else find_server_key(digest)
+        values["server_key"] = key.key_data if key is not None else ServerKey.key_data.type.process_result_value(raw, dialect)
+    return values
+
+def restore(strategy_id):
+    """Put an archived strategy's payloads back in the database (its record stays in the segment).
+    Compaction archives it again once it has been left alone for ARCHIVE_AFTER_SECONDS."""
+    values = load_archived(strategy_id)
+    strategy = db.session.get(Strategy, strategy_id)
+    strategy.server_key = values.pop("server_key")
+    values.pop("inline_server_key")
+    for attr, value in values.items():
+        setattr(strategy, attr, value)
+    strategy.archived_at = strategy.archive_segment = strategy.archive_offset = None
+    db.session.commit()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive payloads of terminal strategies")
+    parser.add_argument("--restore", metavar="STRATEGY_ID", help="Put an archived strategy's payloads back")
+    args = parser.parse_args()
+
+    import config
+    config.EMBEDDED_SCHEDULER = False
+    from app import app
+    with app.app_context():
+        if args.restore:
+            restore(args.restore)
+            print(f"✅ Restored strategy {args.restore}")
+        else:
+            archived = compact()
+            print(f"✅ Archived {archived} strategies: {stats()}")
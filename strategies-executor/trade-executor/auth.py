@@ -3,14 +3,9 @@ Authentication and Rate Limiting Module
 """
 from functools import wraps
 from flask import request, jsonify
-from datetime import datetime, timedelta
-from collections import defaultdict
+import math
 import os
-from threading import Lock
-
-# Rate limiting storage
-rate_limit_store = defaultdict(list)
-rate_limit_lock = Lock()
+from rate_limiter import limiter, fallback
 
 def require_auth(f):
     """Decorator to require API token authentication"""
@@ -38,34 +33,30 @@ def require_auth(f):
     return decorated_function
 
 def rate_limit(max_requests=100, window_seconds=60):
-    """Decorator for rate limiting"""
+    """Decorator for rate limiting: a token bucket of `max_requests` per client and endpoint,
+    refilled over `window_seconds` (see rate_limiter.py)"""
+    rate = max_requests / window_seconds
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # Get client identifier
-            client_id = request.headers.get('X-Client-ID') or request.remote_addr
-            
-            now = datetime.now()
-            window_start = now - timedelta(seconds=window_seconds)
-            
-            with rate_limit_lock:
-                # Clean old requests
-                rate_limit_store[client_id] = [
-                    req_time for req_time in rate_limit_store[client_id]
-                    if req_time > window_start
-                ]
-                
-                # Check limit
-                if len(rate_limit_store[client_id]) >= max_requests:
-                    return jsonify({
-                        "error": "Rate limit exceeded",
-                        "limit": max_requests,
-                        "window_seconds": window_seconds
-                    }), 429
-                
-                # Add current request
-                rate_limit_store[client_id].append(now)
-            
+            key = f"{f.__name__}:{get_client_id()}"
+            try:
+                allowed, retry_after = limiter.take(key, max_requests, rate)
+            except Exception as e:
+                # A broken limiter shouldn't take the API down with it, nor lift the limits
+                print(f"⚠️  Rate limiter error, limiting this process on its own: {e}")
+                allowed, retry_after = fallback.take(key, max_requests, rate)
+
+            if not allowed:
+                response = jsonify({
+                    "error": "Rate limit exceeded",
+                    "limit": max_requests,
+                    "window_seconds": window_seconds,
+                    "retry_after_seconds": round(retry_after, 3),
+                })
+                response.headers["Retry-After"] = str(math.ceil(retry_after))
+                return response, 429
+
             return f(*args, **kwargs)
         return decorated_function
     return decorator
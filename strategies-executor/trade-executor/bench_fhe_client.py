@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+FHE Client Benchmark
+Compares per-strategy evaluation, batched evaluation, and batched evaluation
+with server keys registered once up front, against the stub engine.
+
+    python bench_fhe_client.py --strategies 200 --keys 5 --latency 0.01 --key-latency 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+from fhe_client import FheClient
+from stub_fhe_engine import serve_in_background, encode_bound
+
+def make_strategies(count, keys):
+    strategies = []
+    for i in range(count):
+        strategies.append({
+            "id": f"bench-{i}",
+            "strategy_type": "LIMIT_SELL_RALLY",
+            "encrypted_upper_bound": json.dumps(encode_bound(100_000 + i)),
+            "encrypted_lower_bound": json.dumps(encode_bound(0)),
+            "server_key": json.dumps(f"{i % keys:04x}" * 1024),
+            "fhe_key_id": None,
+            "server_key_digest": f"key-{i % keys}",
+        })
+    return strategies
+
+async def run(base_url, strategies, price, batch_size, max_in_flight, register):
+    groups = {}
+    for strategy in strategies:
+        groups.setdefault(strategy["server_key_digest"], []).append(strategy)
+
+    async with FheClient(url=f"{base_url}/evaluateStrategy", batch_url=f"{base_url}/evaluateBatch",
+                         register_key_url=f"{base_url}/registerKey",
+                         max_in_flight=max_in_flight, batch_size=batch_size) as fhe:
+        fhe.registration_supported = register
+        async def evaluate(batch):
+            async with fhe.slots:
+                return await fhe.evaluate_batch(batch, price)
+
+        batches = [group[i:i + fhe.batch_size] for group in groups.values() for i in range(0, len(group), fhe.batch_size)]
+        started = time.perf_counter()
+        results = await asyncio.gather(*(evaluate(batch) for batch in batches))
+        elapsed = time.perf_counter() - started
+    return elapsed, sum(len(r) for r in results)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--strategies", type=int, default=200)
+    parser.add_argument("--keys", type=int, default=5, help="Distinct server keys shared by the strategies")
+    parser.add_argument("--latency", type=float, default=0.01, help="Stub seconds per evaluation")
+    parser.add_argument("--key-latency", type=float, default=0.05, help="Stub seconds per request to load a key")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    args = parser.parse_args()
+
+    strategies = make_strategies(args.strategies, args.keys)
+    server, base_url = serve_in_background(latency=args.latency, key_latency=args.key_latency)
+
+    runs = (("per-strategy", 1, False), ("batched", args.batch_size, False), ("registered", args.batch_size, True))
+    for label, batch_size, register in runs:
+        server.stats.update(dict.fromkeys(server.stats, 0))
+        server.keys.clear()
+        with contextlib.redirect_stdout(io.StringIO()):  # Silence the client's per-request logging
+            elapsed, evaluated = asyncio.run(run(base_url, strategies, 1000.0, batch_size, args.max_in_flight, register))
+        print(f"{label:>13}: {evaluated} strategies in {elapsed:.2f}s "
+              f"({server.stats['requests']} engine requests, {server.stats['registrations']} key uploads)")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Times `import app` in fresh interpreters (what every gunicorn/prestart process
+pays before serving anything), checks that slow optional modules stay out of
+it, and times database key derivation with a cold and a warm key cache.
+Exits non-zero when the import budget is exceeded, so it can gate CI.
+
+    python bench_startup.py --budget-ms 1500 --runs 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Only needed once a trade executes or the scheduler talks to the network
+LAZY_MODULES = ("web3", "eth_account", "aiohttp", "requests")
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import scheduler
+scheduler.worker_loop = lambda app: None  # Keep the scheduler thread app starts from racing the module check
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+KDF_PROBE = """
+import json, time
+from encryption import db_encryption
+started = time.perf_counter()
+db_encryption.cipher
+print(json.dumps({"seconds": time.perf_counter() - started}))
+"""
+
+def run_probe(code, env, importtime=False):
+    args = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    result = subprocess.run(args, cwd=HERE, env=env, capture_output=True, text=True)
+    lines = [line for line in result.stdout.splitlines() if line.startswith("{")]
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(f"probe failed:\n{result.stdout}\n{result.stderr}")
+    return json.loads(lines[-1]), result.stderr
+
+def slowest_imports(importtime_output, count):
+    """Modules `app` imports directly, by cumulative import time, from `python -X importtime`"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:  # Deeper imports are already counted in their parent's cumulative time
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Max time for `import app` (best of --runs)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8, help="Slowest top-level imports to list")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ)
+        env.setdefault("DATABASE_URI", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        env["DB_KEY_CACHE_DIR"] = workdir
+        env.setdefault("PYTH_HERMES_URL", "http://127.0.0.1:9")
+
+        timings = []
+        for _ in range(args.runs):
+            probe, _ = run_probe(IMPORT_PROBE, env)
+            timings.append(probe["seconds"])
+        _, importtime = run_probe(IMPORT_PROBE, env, importtime=True)
+
+        cold, _ = run_probe(KDF_PROBE, env)
+        warm, _ = run_probe(KDF_PROBE, env)
+
+    best_ms = min(timings) * 1000
+    print(f"import app: {best_ms:.0f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    for cumulative_us, name in slowest_imports(importtime, args.top):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+    print(f"key derivation: {cold['seconds'] * 1000:.1f} ms cold, {warm['seconds'] * 1000:.1f} ms from cache")
+
+    failures = []
+    if best_ms > args.budget_ms:
+        failures.append(f"import time {best_ms:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+    if probe["loaded"]:
+        failures.append(f"imported eagerly: {', '.join(probe['loaded'])}")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Startup within budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Wire Format Benchmark
+Compares JSON (hex blobs) with msgpack (raw bytes) request bodies for the FHE
+engine: payload size, client-side encoding time, and engine-side decoding time
+(parse plus getting the blobs back to bytes).
+
+    python bench_wire_format.py --key-mb 8 --ciphertext-kb 64 --batch 16
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+import msgpack
+from fhe_client import build_payload, build_batch_payload, encode_body
+
+def make_strategy(i, key_hex, ciphertext_bytes):
+    return {
+        "id": f"bench-{i}",
+        "strategy_type": "LIMIT_ORDER",
+        "encrypted_upper_bound": json.dumps(os.urandom(ciphertext_bytes).hex()),
+        "encrypted_lower_bound": json.dumps(os.urandom(ciphertext_bytes).hex()),
+        "server_key": key_hex,
+        "fhe_key_id": f"key-{i}",
+    }
+
+def decode_body(data, binary):
+    """What the engine does with a body before any FHE work: parse it and turn every blob into bytes"""
+    if binary:
+        return msgpack.unpackb(data, raw=False)
+    payload = json.loads(data)
+    for item in [payload] + payload.get("strategies", []):
+        for field in ("server_key", "encrypted_upper_bound", "encrypted_lower_bound"):
+            if field in item:
+                item[field] = bytes.fromhex(item[field])
+    return payload
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--key-mb", type=float, default=8, help="Server key size")
+    parser.add_argument("--ciphertext-kb", type=float, default=64, help="Size of each encrypted bound")
+    parser.add_argument("--batch", type=int, default=16, help="Strategies per /evaluateBatch request")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    key_hex = json.dumps(os.urandom(int(args.key_mb * 1024 * 1024)).hex())
+    strategies = [make_strategy(i, key_hex, int(args.ciphertext_kb * 1024)) for i in range(args.batch)]
+
+    cases = (
+        ("single, inline key", lambda binary: build_payload(strategies[0], 1000.0, None, binary)),
+        (f"batch of {args.batch}, key handle", lambda binary: build_batch_payload(strategies, 1000.0, "handle", binary)),
+    )
+    for label, build in cases:
+        print(f"{label}:")
+        for name, binary in (("json", False), ("msgpack", True)):
+            with contextlib.redirect_stdout(io.StringIO()):  # Silence the client's per-strategy logging
+                encode_seconds, (data, _) = timed(lambda: encode_body(build(binary), binary), args.repeat)
+            decode_seconds, _ = timed(lambda: decode_body(data, binary), args.repeat)
+            print(f"  {name:>8}: {len(data) / 1024 / 1024:8.2f} MB  "
+                  f"encode {encode_seconds * 1000:7.1f} ms  decode {decode_seconds * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
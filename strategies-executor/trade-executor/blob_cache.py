@@ -0,0 +1,77 @@
+"""
+Decoded Blob Cache
+Memory-bounded LRU of decrypted/decompressed column values, so the scheduler
+doesn't redo Fernet + gzip for ciphertexts and keys that haven't changed
+"""
+import sys
+from collections import OrderedDict
+from threading import Lock
+from config import BLOB_CACHE_MAX_BYTES
+
+# Returned by get() on a miss, so a cached NULL column is distinguishable from "not cached"
+MISSING = object()
+
+class DecodedBlobCache:
+    """LRU cache with a byte budget instead of an entry count"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _sizeof(value):
+        if isinstance(value, (str, bytes)):
+            return len(value)
+        return sys.getsizeof(value)
+
+    def get(self, key, default=MISSING):
+        """Return the cached value (moving it to the MRU end) or `default`"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Insert a value, evicting least recently used entries until it fits the budget"""
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return  # Never let one oversized value flush the whole cache
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Size against the byte budget, and hits, misses and evictions so far"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+# Singleton instance
+blob_cache = DecodedBlobCache(BLOB_CACHE_MAX_BYTES)
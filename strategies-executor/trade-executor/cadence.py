@@ -0,0 +1,103 @@
+"""
+Volatility-Adaptive Cadence
+How often each feed's strategies are evaluated. Every quote the scheduler
+sees updates a per-feed estimate of how fast the price moves (an
+exponentially weighted average of |log return| per second, with half-life
+CADENCE_HALF_LIFE_SECONDS). A feed is due again once the price is expected to
+have moved CADENCE_TARGET_MOVE since its last evaluation, i.e. after
+target / speed seconds clamped to [CADENCE_MIN_INTERVAL_SECONDS,
+CADENCE_MAX_INTERVAL_SECONDS], or at once if it has actually moved that much
+(a gap). Flat feeds back off to the maximum; fast ones tighten to the minimum.
+
+Evaluations are shared between scheduler processes: a due feed starts a new
+round in the database (FeedRound), whose start and price every process loads
+with evaluated() before checking is_due(), so N processes evaluate a feed once
+per interval between them, not N times. Times are wall-clock seconds for that
+reason. Speed estimates stay per process; they are built from the same quotes.
+"""
+import math
+import time
+from threading import Lock
+from config import (
+    CHECK_INTERVAL_SECONDS, CADENCE_MIN_INTERVAL_SECONDS, CADENCE_MAX_INTERVAL_SECONDS, CADENCE_TARGET_MOVE,
+    CADENCE_HALF_LIFE_SECONDS,
+)
+
+_lock = Lock()
+# Feed id -> state: last observed (price, publish_time), smoothed speed, and the latest round's (price, wall time)
+_feeds = {}
+
+def _state(feed_id):
+    return _feeds.setdefault(feed_id, {"observed": None, "speed": None, "evaluated": None})
+
+def observe(feed_id, quote):
+    """Fold a quote into the feed's speed estimate (repeats of the same publish time are ignored)"""
+    with _lock:
+        state = _state(feed_id)
+        previous = state["observed"]
+        if previous is not None and quote.publish_time <= previous[1]:
+            return
+        state["observed"] = (quote.price, quote.publish_time)
+        if previous is None or previous[0] <= 0 or quote.price <= 0:
+            return
+        elapsed = quote.publish_time - previous[1]
+        speed = abs(math.log(quote.price / previous[0])) / elapsed
+        weight = 1 - 0.5 ** (elapsed / CADENCE_HALF_LIFE_SECONDS)
+        state["speed"] = speed if state["speed"] is None else state["speed"] + weight * (speed - state["speed"])
+
+def _interval(state):
+    if state["speed"] is None:
+        return CHECK_INTERVAL_SECONDS  # No movement seen yet
+    if state["speed"] <= 0:
+        return CADENCE_MAX_INTERVAL_SECONDS
+    return min(CADENCE_MAX_INTERVAL_SECONDS, max(CADENCE_MIN_INTERVAL_SECONDS, CADENCE_TARGET_MOVE / state["speed"]))
+
+def interval(feed_id):
+    """Seconds between evaluations of the feed at its current speed"""
+    with _lock:
+        return _interval(_state(feed_id))
+
+def speed(feed_id):
+    """Smoothed |log return| per second, None before the feed has moved"""
+    with _lock:
+        return _state(feed_id)["speed"]
+
+def is_due(feed_id, price, now=None):
+    """True if the feed's interval has passed since its latest round started, or the price has gapped since"""
+    now = time.time() if now is None else now
+    with _lock:
+        state = _state(feed_id)
+        if state["evaluated"] is None:
+            return True
+        last_price, last_time = state["evaluated"]
+        if now - last_time >= _interval(state):
+            return True
+        return last_price > 0 and abs(price / last_price - 1) >= CADENCE_TARGET_MOVE
+
+def evaluated(feed_id, price, at=None):
+    """Record that the feed's latest round started at `at` (wall time), at `price`"""
+    with _lock:
+        _state(feed_id)["evaluated"] = (price, time.time() if at is None else at)
+
+def seconds_until_due(feed_ids, now=None):
+    """Time until the first of `feed_ids` is due by its interval (gaps can make one due sooner)"""
+    now = time.time() if now is None else now
+    with _lock:
+        waits = []
+        for feed_id in feed_ids:
+            state = _state(feed_id)
+            if state["evaluated"] is None:
+                return 0.0
+            waits.append(max(0.0, state["evaluated"][1] + _interval(state) - now))
+        return min(waits, default=CHECK_INTERVAL_SECONDS)
+
+def stats():
+    """Per-feed interval and speed (% per minute) for logging/monitoring"""
+    with _lock:
+        return {
+            feed_id: {
+                "interval_seconds": round(_interval(state), 2),
+                "speed_pct_per_min": None if state["speed"] is None else round(state["speed"] * 6000, 4),
+            }
+            for feed_id, state in _feeds.items()
+        }
@@ -1,6 +1,5 @@
 import os
 from dotenv import load_dotenv
-from web3 import Web3
 
 load_dotenv()
 
@@ -10,8 +9,20 @@ FHE_ENGINE_URL = os.getenv("FHE_ENGINE_URL", "http://localhost:5001/evaluateStra
 FHE_ENGINE_BRACKET_URL = os.getenv("FHE_ENGINE_BRACKET_URL", "http://localhost:5001/evaluate_bracket_order")
 FHE_ENGINE_LIMIT_BUY_URL = os.getenv("FHE_ENGINE_LIMIT_BUY_URL", "http://localhost:5001/evaluate_limit_buy")
 FHE_ENGINE_LIMIT_SELL_URL = os.getenv("FHE_ENGINE_LIMIT_SELL_URL", "http://localhost:5001/evaluate_limit_sell")
+# Evaluations sent to the FHE engine concurrently, and the deadline for each one
+FHE_MAX_IN_FLIGHT = int(os.getenv("FHE_MAX_IN_FLIGHT", 4))
+FHE_REQUEST_TIMEOUT_SECONDS = float(os.getenv("FHE_REQUEST_TIMEOUT_SECONDS", 300))
+# Batch endpoint: strategies sharing a server key and price are evaluated in one request
+FHE_ENGINE_BATCH_URL = os.getenv("FHE_ENGINE_BATCH_URL", FHE_ENGINE_URL.rsplit("/", 1)[0] + "/evaluateBatch")
+FHE_BATCH_SIZE = int(os.getenv("FHE_BATCH_SIZE", 16))
+# Server keys are uploaded once here and then referenced by handle
+FHE_ENGINE_REGISTER_KEY_URL = os.getenv("FHE_ENGINE_REGISTER_KEY_URL", FHE_ENGINE_URL.rsplit("/", 1)[0] + "/registerKey")
+# "msgpack" sends ciphertexts and keys as raw bytes; "json" sends them hex-encoded
+FHE_WIRE_FORMAT = os.getenv("FHE_WIRE_FORMAT", "msgpack")
 
 PYTH_HERMES_URL = os.getenv("PYTH_HERMES_URL")
+# Hermes endpoints in order of preference (comma-separated); defaults to PYTH_HERMES_URL alone
+PYTH_HERMES_URLS = [url.strip().rstrip("/") for url in os.getenv("PYTH_HERMES_URLS", PYTH_HERMES_URL or "").split(",") if url.strip()]
 # ARKIV_RPC_URL = os.getenv("ARKIV_RPC_URL") # Uncomment if using Arkiv
 
 DATABASE_URI = os.getenv("DATABASE_URI")
@@ -22,10 +33,15 @@ SEPOLIA_RPC_URL = raw_rpc.strip('"').strip("'")
 # Using Web3.to_checksum_address ensures the address is in the correct format
 # Make sure your .env file does not have trailing spaces in the address string!
 contract_address_raw = os.getenv("ENTRYPOINT_CONTRACT_ADDRESS")
-if contract_address_raw:
-    ENTRYPOINT_CONTRACT_ADDRESS = Web3.to_checksum_address(contract_address_raw.strip())
-else:
-    ENTRYPOINT_CONTRACT_ADDRESS = None
+
+def __getattr__(name):
+    # web3 takes seconds to import, so ENTRYPOINT_CONTRACT_ADDRESS is only checksummed when first read
+    if name == "ENTRYPOINT_CONTRACT_ADDRESS":
+        from web3 import Web3
+        value = Web3.to_checksum_address(contract_address_raw.strip()) if contract_address_raw else None
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # The private key for the account that will execute trades
 EXECUTOR_PRIVATE_KEY = os.getenv("EXECUTOR_PRIVATE_KEY")
@@ -37,8 +53,111 @@ MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 16 * 1024 * 1024))
 # Flag to bypass on-chain ZK verification for demos (default: False)
 SKIP_ZK_VERIFY = os.getenv("SKIP_ZK_VERIFY", "false").lower() == "true"
 
+# --- Rate Limiting ---
+# "memory" keeps token buckets per process (at most RATE_LIMIT_MAX_CLIENTS); "sqlite" keeps them in
+# RATE_LIMIT_DB_PATH so every worker process on the host shares one budget per client
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", 10000))
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "rate_limit.db"))
+
+# --- SQLite ---
+# Applied to every new connection. WAL lets the scheduler read while ingest writes; with WAL,
+# synchronous=NORMAL only risks the last transactions on power loss, never corruption
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+# INCREMENTAL lets archival return freed pages in small steps; existing files switch at their next VACUUM
+SQLITE_AUTO_VACUUM = os.getenv("SQLITE_AUTO_VACUUM", "INCREMENTAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", 64 * 1024))  # Page cache per connection
+SQLITE_MMAP_SIZE_BYTES = int(os.getenv("SQLITE_MMAP_SIZE_BYTES", 256 * 1024 * 1024))
+
+# --- Ingest ---
+# "sync" encodes and inserts strategies in the request; "async" spools the payload,
+# answers 202 and leaves encoding and the insert to a pool of INGEST_WORKERS processes
+INGEST_MODE = os.getenv("INGEST_MODE", "sync")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "spool"))
+# A spooled strategy whose insert keeps failing (database locked, ...) is retried this many times, waiting
+# INGEST_RETRY_BACKOFF_SECONDS and doubling it in between, then rejected
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", 5))
+INGEST_RETRY_BACKOFF_SECONDS = float(os.getenv("INGEST_RETRY_BACKOFF_SECONDS", 0.5))
+# /createStrategies commits every BULK_INGEST_BATCH_SIZE rows or BULK_INGEST_BATCH_BYTES of input,
+# and rejects single lines over BULK_MAX_LINE_BYTES
+BULK_INGEST_BATCH_SIZE = int(os.getenv("BULK_INGEST_BATCH_SIZE", 100))
+BULK_INGEST_BATCH_BYTES = int(os.getenv("BULK_INGEST_BATCH_BYTES", 64 * 1024 * 1024))
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", 16 * 1024 * 1024))
+
 # --- Scheduler Configuration ---
 CHECK_INTERVAL_SECONDS = 10
+# Pending strategies are streamed from the database in pages of this size
+PENDING_BATCH_SIZE = int(os.getenv("PENDING_BATCH_SIZE", 50))
+# Each feed is evaluated about as often as its price moves CADENCE_TARGET_MOVE (a fraction; see cadence.py),
+# within these bounds, and at once when it gaps by that much. CHECK_INTERVAL_SECONDS applies until a feed has moved.
+CADENCE_MIN_INTERVAL_SECONDS = float(os.getenv("CADENCE_MIN_INTERVAL_SECONDS", 1))
+CADENCE_MAX_INTERVAL_SECONDS = float(os.getenv("CADENCE_MAX_INTERVAL_SECONDS", 60))
+CADENCE_TARGET_MOVE = float(os.getenv("CADENCE_TARGET_MOVE", 0.001))
+CADENCE_HALF_LIFE_SECONDS = float(os.getenv("CADENCE_HALF_LIFE_SECONDS", 300))
+# A cycle stops starting evaluations after this long; the strategies it didn't reach go first in the next
+# one, which bounds how stale a price a strategy can be evaluated against as the book grows
+CYCLE_TIME_BUDGET_SECONDS = float(os.getenv("CYCLE_TIME_BUDGET_SECONDS", CHECK_INTERVAL_SECONDS))
+# Byte budget for the LRU cache of decoded (decrypted + decompressed) blobs
+BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# --- Price Stream ---
+# The scheduler follows Hermes' server-sent price stream and starts a cycle as soon as a price
+# moves, waiting PRICE_DEBOUNCE_SECONDS first so a burst of updates costs one cycle. Without the
+# stream (disabled, or disconnected) it polls every CHECK_INTERVAL_SECONDS as before.
+PRICE_STREAM_ENABLED = os.getenv("PRICE_STREAM_ENABLED", "true").lower() == "true"
+PRICE_STREAM_URL = os.getenv("PRICE_STREAM_URL") or (f"{PYTH_HERMES_URLS[0]}/v2/updates/price/stream" if PYTH_HERMES_URLS else None)
+PRICE_DEBOUNCE_SECONDS = float(os.getenv("PRICE_DEBOUNCE_SECONDS", 0.5))
+# A stream silent for this long is treated as dropped; reconnects back off from PRICE_STREAM_RECONNECT_SECONDS
+PRICE_STREAM_IDLE_TIMEOUT_SECONDS = float(os.getenv("PRICE_STREAM_IDLE_TIMEOUT_SECONDS", 30))
+PRICE_STREAM_RECONNECT_SECONDS = float(os.getenv("PRICE_STREAM_RECONNECT_SECONDS", 1))
+
+# --- Oracle ---
+# A price request to PYTH_HERMES_URLS[0] that hasn't answered within ORACLE_HEDGE_DELAY_SECONDS (or has
+# failed) is hedged with the next endpoint; the first usable answer wins.
+ORACLE_TIMEOUT_SECONDS = float(os.getenv("ORACLE_TIMEOUT_SECONDS", 5))
+ORACLE_HEDGE_DELAY_SECONDS = float(os.getenv("ORACLE_HEDGE_DELAY_SECONDS", 0.3))
+# Quotes published longer ago than this, or with a confidence interval wider than this fraction of the
+# price, are not traded on. The last good quote per feed is reused while every endpoint fails, until it is this old.
+ORACLE_MAX_PRICE_AGE_SECONDS = float(os.getenv("ORACLE_MAX_PRICE_AGE_SECONDS", 30))
+ORACLE_MAX_CONFIDENCE_RATIO = float(os.getenv("ORACLE_MAX_CONFIDENCE_RATIO", 0.02))
+
+# --- Work Leases ---
+# Scheduler processes claim strategies through leases in the database, so several can share the book.
+# A lease that isn't renewed for LEASE_TTL_SECONDS (e.g. its process died) can be claimed by another process.
+LEASE_TTL_SECONDS = float(os.getenv("LEASE_TTL_SECONDS", 120))
+LEASE_RENEW_INTERVAL_SECONDS = float(os.getenv("LEASE_RENEW_INTERVAL_SECONDS", LEASE_TTL_SECONDS / 3))
+# Run the scheduler as a thread of each web process; disable when it runs on its own (run_scheduler.py)
+EMBEDDED_SCHEDULER = os.getenv("EMBEDDED_SCHEDULER", "true").lower() == "true"
+
+# --- Execution Tracking ---
+# Receipts of submitted trades are polled in JSON-RPC batches of RECEIPT_BATCH_SIZE
+RECEIPT_POLL_INTERVAL_SECONDS = float(os.getenv("RECEIPT_POLL_INTERVAL_SECONDS", 5))
+RECEIPT_BATCH_SIZE = int(os.getenv("RECEIPT_BATCH_SIZE", 100))
+# A transaction without a receipt after this long is treated as dropped and retried
+TX_RECEIPT_TIMEOUT_SECONDS = float(os.getenv("TX_RECEIPT_TIMEOUT_SECONDS", 300))
+# Sends + reverts/drops allowed per strategy before it is marked FAILED, and the wait between attempts
+MAX_EXECUTION_ATTEMPTS = int(os.getenv("MAX_EXECUTION_ATTEMPTS", 3))
+EXECUTION_RETRY_BACKOFF_SECONDS = float(os.getenv("EXECUTION_RETRY_BACKOFF_SECONDS", 30))
+
+# --- Archival ---
+# Payloads of CONFIRMED/FAILED strategies untouched for ARCHIVE_AFTER_SECONDS are moved out of the database
+# into append-only segment files, ARCHIVE_BATCH_SIZE strategies per transaction
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "archive"))
+ARCHIVE_AFTER_SECONDS = float(os.getenv("ARCHIVE_AFTER_SECONDS", 24 * 60 * 60))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", 300))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 20))
+ARCHIVE_BATCH_PAUSE_SECONDS = float(os.getenv("ARCHIVE_BATCH_PAUSE_SECONDS", 0.2))  # Lets other writers in between batches
+ARCHIVE_SEGMENT_MAX_BYTES = int(os.getenv("ARCHIVE_SEGMENT_MAX_BYTES", 256 * 1024 * 1024))
+# Free pages handed back to the filesystem after each batch (incremental vacuum)
+ARCHIVE_VACUUM_PAGES = int(os.getenv("ARCHIVE_VACUUM_PAGES", 4096))
+
+# --- Metrics ---
+# Port on which a standalone scheduler (run_scheduler.py) serves /metrics; 0 disables it.
+# Web processes serve /metrics on their own port.
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
 
 # --- Master Token Mapping ---
 # Maps token symbols to their Pyth Price Feed IDs
@@ -46,4 +165,7 @@ PYTH_PRICE_FEED_IDS = {
     "ETH": "0xff61491a931112ddf1bd8147cd1b641375f79f5825126d665480874634fd0ace",
     "BTC": "0xe62df6c8b4a85fe1a67db44dc12de5db330f7ac66b72dc658afedf0f4a415b43",
     "SOL": "0xef0d8b612d455ac6463494a99859f5b220de1b000b2b8d5423867332c525164d",
-}
\ No newline at end of file
+}
+
+# Strategies stored before price_feed_id was populated are evaluated against this feed
+DEFAULT_PRICE_FEED_ID = PYTH_PRICE_FEED_IDS["ETH"]
@@ -1,35 +1,68 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.types import TypeDecorator, LargeBinary
-from sqlalchemy import Column, String, Float, Text, DateTime
-from datetime import datetime
+from sqlalchemy import Column, String, Float, Text, DateTime, Index, select, type_coerce, func, insert, update, or_, text, literal_column, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import asyncio
+import contextvars
+import functools
+import hashlib
 import uuid
 import json
-from encryption import db_encryption, data_compression
+from encryption import db_encryption, data_compression, blob_envelope
+from blob_cache import blob_cache, MISSING
+import metrics
+from config import DEFAULT_PRICE_FEED_ID, SQLITE_AUTO_VACUUM, SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE_KIB, SQLITE_MMAP_SIZE_BYTES
 
 # ✅ Initialize db first
 db = SQLAlchemy()
 
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Journaling and cache settings for every new SQLite connection (see config.py)"""
+    import sqlite3
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA auto_vacuum={SQLITE_AUTO_VACUUM}")
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={-SQLITE_CACHE_SIZE_KIB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_BYTES}")
+    cursor.close()
+
 class CompressedEncryptedText(TypeDecorator):
-    """Custom SQLAlchemy type that compresses and encrypts text data"""
+    """Custom SQLAlchemy type that compresses and encrypts text data.
+
+    Writes the binary envelope format (see encryption.BlobEnvelope), bound to
+    `context` ("table.column"); still reads the legacy gzip + base64 + Fernet
+    text format (migrate_blob_envelope.py converts it).
+    """
     impl = LargeBinary
     cache_ok = True
-    
+
+    def __init__(self, context):
+        super().__init__()
+        self.context = context
+
     def process_bind_param(self, value, dialect):
         """Compress and encrypt before storing"""
         if value is None:
             return None
         if isinstance(value, str):
-            # Compress first (better for large data)
-            compressed = data_compression.compress_to_base64(value)
-            # Then encrypt
-            encrypted = db_encryption.encrypt(compressed)
-            return encrypted.encode()
+            return blob_envelope.seal(value, encrypt=True, context=self.context.encode())
         return value
     
     def process_result_value(self, value, dialect):
         """Decrypt and decompress after retrieving"""
         if value is None:
             return None
+        if blob_envelope.is_envelope(value):
+            return blob_envelope.open(value, context=self.context.encode())
         if isinstance(value, bytes):
             try:
                 # Decrypt first
@@ -43,7 +76,10 @@ class CompressedEncryptedText(TypeDecorator):
         return value
 
 class CompressedText(TypeDecorator):
-    """Custom SQLAlchemy type that compresses text data (for non-sensitive large data)"""
+    """Custom SQLAlchemy type that compresses text data (for non-sensitive large data).
+
+    Same envelope format as CompressedEncryptedText, without the encryption.
+    """
     impl = LargeBinary
     cache_ok = True
     
@@ -52,13 +88,15 @@ class CompressedText(TypeDecorator):
         if value is None:
             return None
         if isinstance(value, str):
-            return data_compression.compress_to_base64(value).encode()
+            return blob_envelope.seal(value, encrypt=False)
         return value
     
     def process_result_value(self, value, dialect):
         """Decompress after retrieving"""
         if value is None:
             return None
+        if blob_envelope.is_envelope(value):
+            return blob_envelope.open(value)
         if isinstance(value, bytes):
             try:
                 return data_compression.decompress_from_base64(value.decode())
@@ -66,6 +104,127 @@ class CompressedText(TypeDecorator):
                 return value.decode() if isinstance(value, bytes) else value
         return value
 
+class ServerKey(db.Model):
+    """Content-addressed FHE server key, shared by every strategy that uses it"""
+    __tablename__ = 'server_key'
+
+    digest = db.Column(db.String(64), primary_key=True)  # sha256 of the stored key text
+    key_data = db.Column(CompressedEncryptedText('server_key.key_data'), nullable=False)
+    refcount = db.Column(db.Integer, default=0, nullable=False)  # Number of strategies referencing this key
+    created_at = db.Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+def server_key_digest(server_key):
+    """Content address of a serialized server key"""
+    return hashlib.sha256(server_key.encode()).hexdigest()
+
+def intern_server_key(server_key):
+    """Return the stored ServerKey for `server_key`, inserting it on first use and bumping its refcount.
+    Both are statements run at once, so every strategy interning the key in one session counts, and two
+    workers inserting the same new key both succeed."""
+    digest = server_key_digest(server_key)
+    keys = ServerKey.__table__
+    bumped = db.session.execute(
+        update(keys).where(keys.c.digest == digest).values(refcount=keys.c.refcount + 1)
+    ).rowcount
+    if not bumped:
+        # Only a new key pays for encoding key_data
+        db.session.execute(
+            sqlite_insert(keys)
+            .values(digest=digest, key_data=server_key, refcount=1, created_at=datetime.utcnow())
+            .on_conflict_do_update(index_elements=[keys.c.digest], set_={'refcount': keys.c.refcount + 1})
+        )
+    return db.session.get(ServerKey, digest)
+
+def release_server_key(digest):
+    """Drop one reference to a stored key, deleting it once no strategy uses it"""
+    if not digest:
+        return
+    db.session.query(ServerKey).filter_by(digest=digest).update(
+        {ServerKey.refcount: ServerKey.refcount - 1}, synchronize_session=False
+    )
+    db.session.query(ServerKey).filter(ServerKey.digest == digest, ServerKey.refcount <= 0).delete(
+        synchronize_session=False
+    )
+
+class ExecutorNonce(db.Model):
+    """Next nonce of an executor account, shared by every process that sends from it"""
+    __tablename__ = 'executor_nonce'
+
+    account = db.Column(db.String(42), primary_key=True)
+    next_nonce = db.Column(db.Integer, nullable=False)
+
+class FeedRound(db.Model):
+    """Latest evaluation round of a price feed, shared by every scheduler process. A strategy is evaluated at
+    most once per round (its last_evaluated_at is later than started_at); see cadence.py."""
+    __tablename__ = 'feed_round'
+
+    price_feed_id = db.Column(db.String, primary_key=True)
+    started_at = db.Column(DateTime, nullable=False)
+    price = db.Column(db.Float, nullable=False)  # Price the round was started at
+    # The starting process's cadence for the feed, for /schedulerStatus
+    interval_seconds = db.Column(db.Float, nullable=True)
+    speed = db.Column(db.Float, nullable=True)  # Smoothed |log return| per second
+    started_by = db.Column(db.String, nullable=True)  # Lease owner id of the starting process
+
+
+# Statuses a strategy never leaves (EXECUTED: sent before execution was tracked, outcome unknown), and the SQL
+# condition for such strategies whose payloads are still in the database. Inlined (not bound) so SQLite can match
+# the partial index built on it.
+TERMINAL_STATUSES = ('CONFIRMED', 'FAILED', 'EXECUTED')
+UNARCHIVED_TERMINAL = f"status IN ({', '.join(repr(status) for status in TERMINAL_STATUSES)}) AND archived_at IS NULL"
+
+# Large FHE/ZK payloads of a strategy, kept in `strategy_blob` (see StrategyBlob)
+BLOB_ATTRIBUTES = ('inline_server_key', 'encrypted_client_key', 'encrypted_upper_bound', 'encrypted_lower_bound', 'zkp_data', 'swap_template')
+
+class StrategyBlob(db.Model):
+    """Cold half of a strategy: its multi-MB payloads, one row per strategy.
+
+    Keeping them out of `strategy` means scheduler scans, counts and lease updates only
+    ever touch small rows, however much key material is stored.
+    """
+    __tablename__ = 'strategy_blob'
+
+    strategy_id = db.Column(db.String, db.ForeignKey('strategy.id'), primary_key=True)
+
+    # Compressed and encrypted sensitive fields (FHE keys)
+    # `inline_server_key` only holds keys of rows written before the key store existed
+    inline_server_key = db.Column('server_key', CompressedEncryptedText('strategy_blob.server_key'), nullable=True)
+    encrypted_client_key = db.Column(CompressedEncryptedText('strategy_blob.encrypted_client_key'), nullable=True)  # Nullable when using MPC shares
+
+    # Compressed but not encrypted (FHE ciphertexts - already encrypted by FHE)
+    encrypted_upper_bound = db.Column(CompressedText, nullable=True)
+    encrypted_lower_bound = db.Column(CompressedText, nullable=True)
+
+    # Compressed JSON fields
+    zkp_data = db.Column(CompressedText, nullable=True)
+    # JSON of the validated, ABI-encoded swap call built at ingest (see trade_executor.build_swap_template)
+    swap_template = db.Column(CompressedText, nullable=True)
+
+class BlobField:
+    """Strategy attribute stored on its StrategyBlob row (created on first write).
+
+    Writes that change the value bump the strategy's updated_at, which versions the decoded-blob cache.
+    On the class it is the StrategyBlob column, for queries.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return getattr(StrategyBlob, self.name)
+        blob_row = instance.blob_row
+        return getattr(blob_row, self.name) if blob_row is not None else None
+
+    def __set__(self, instance, value):
+        if self.__get__(instance, type(instance)) == value:
+            return
+        if instance.blob_row is None:
+            instance.blob_row = StrategyBlob()
+        setattr(instance.blob_row, self.name, value)
+        instance.updated_at = datetime.utcnow()
+
 class Strategy(db.Model):
     id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String, nullable=False, index=True)  # Index for faster queries
@@ -75,31 +234,128 @@ class Strategy(db.Model):
     amount = db.Column(db.Float, nullable=False)
     price_feed_id = db.Column(db.String, nullable=True)
     recipient_address = db.Column(db.String, nullable=False)
+    pool_address = db.Column(db.String(42), nullable=True)  # Swap pool; the executor's fallback pool if unset
     
-    # Compressed and encrypted sensitive fields (FHE keys)
-    # These are the largest fields - compression + encryption reduces size significantly
-    server_key = db.Column(CompressedEncryptedText, nullable=False)
-    encrypted_client_key = db.Column(CompressedEncryptedText, nullable=True)  # Nullable when using MPC shares
-    
-    # Compressed but not encrypted (FHE ciphertexts - already encrypted by FHE)
-    encrypted_upper_bound = db.Column(CompressedText, nullable=False)
-    encrypted_lower_bound = db.Column(CompressedText, nullable=False)
-    
-    # Compressed JSON fields
-    zkp_data = db.Column(CompressedText, nullable=True)
+    # Server keys live once in the content-addressed `server_key` table; strategies reference them by digest.
+    server_key_digest = db.Column(db.String(64), db.ForeignKey('server_key.digest'), nullable=True, index=True)
+    server_key_ref = db.relationship(ServerKey)
+
+    # The large payloads live in `strategy_blob`; listing and scanning strategies never reads them,
+    # and touching any of them loads (and decodes) that row in a single SELECT
+    blob_row = db.relationship(StrategyBlob, uselist=False, cascade='all, delete-orphan')
+    inline_server_key = BlobField()
+    encrypted_client_key = BlobField()
+    encrypted_upper_bound = BlobField()
+    encrypted_lower_bound = BlobField()
+    zkp_data = BlobField()
+    swap_template = BlobField()
     mpc_share_indices = db.Column(CompressedText, nullable=True)
     
     # Small fields - no compression needed
     mpc_public_key_set = db.Column(db.Text, nullable=True)  # MPC public key set (smaller, hash-based)
     fhe_key_id = db.Column(db.String, nullable=True, index=True)  # Key ID when shares stored on MPC (no full key stored)
+    # Lifecycle: PENDING -> TRIGGERED -> SUBMITTED -> CONFIRMED | FAILED
+    # (reverted swaps, and nonces taken by another transaction, go back to TRIGGERED until MAX_EXECUTION_ATTEMPTS
+    # is reached; a transaction stuck without a receipt is replaced at the same nonce instead, see execution_tracker.py)
     status = db.Column(db.String, default='PENDING', nullable=False, index=True)
+
+    # Execution tracking
+    tx_hash = db.Column(db.String(66), nullable=True)  # Latest submitted transaction
+    tx_nonce = db.Column(db.Integer, nullable=True)  # Nonce the SUBMITTED transactions share; NULL once it's settled
+    tx_history = db.Column(db.Text, nullable=True)  # JSON list of every transaction sent: [nonce, hash, "swap" | "cancel"]
+    execution_attempts = db.Column(db.Integer, default=0, nullable=True)
+    last_attempt_at = db.Column(DateTime, nullable=True)
+    last_error = db.Column(db.String, nullable=True)
+
+    # Work lease: the scheduler process working on this strategy, and until when.
+    # After a release, lease_expires_at is when the strategy is next due (owner is NULL).
+    lease_owner = db.Column(db.String, nullable=True, index=True)
+    lease_expires_at = db.Column(DateTime, nullable=True)
+
+    # Highest/lowest prices (cents) the FHE engine has reported "not triggered" at (see pruning.py)
+    untriggered_high_cents = db.Column(db.Integer, nullable=True)
+    untriggered_low_cents = db.Column(db.Integer, nullable=True)
+
+    # When the FHE engine last answered for this strategy, and how old the price it compared against was then
+    last_evaluated_at = db.Column(DateTime, nullable=True)
+    last_price_age_seconds = db.Column(db.Float, nullable=True)
+
+    # Where a terminal strategy's payloads went when compaction moved them out of the database (see archive.py)
+    archived_at = db.Column(DateTime, nullable=True)
+    archive_segment = db.Column(db.String, nullable=True)
+    archive_offset = db.Column(db.Integer, nullable=True)
     
     # Timestamps for cleanup
     created_at = db.Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        # Partial index over PENDING rows only, in the order the scheduler pages through them and covering
+        # its feed and lease filters (see is_pending)
+        Index('ix_strategy_pending', 'id', 'price_feed_id', 'lease_expires_at', sqlite_where=text("status = 'PENDING'")),
+        # Terminal strategies still holding their payloads, oldest first (see archivable_strategy_ids)
+        Index('ix_strategy_unarchived_terminal', 'updated_at', sqlite_where=text(UNARCHIVED_TERMINAL)),
+    )
+
+    @property
+    def server_key(self):
+        """Serialized server key, decoded once per session no matter how many strategies share it"""
+        if self.server_key_ref is not None:
+            return self.server_key_ref.key_data
+        return self.inline_server_key
+
+    @server_key.setter
+    def server_key(self, value):
+        current_digest = self.server_key_ref.digest if self.server_key_ref is not None else self.server_key_digest
+        if value and current_digest == server_key_digest(value):
+            return
+        if current_digest:
+            release_server_key(current_digest)
+        self.server_key_ref = intern_server_key(value) if value else None
+        self.inline_server_key = None
+
+    def decoded_blobs(self):
+        """Blob values of this row, decoding only what the cache doesn't hold for its current version"""
+        values = {}
+        missing = []
+        blob_row = self.__dict__.get('blob_row')  # Already loaded (e.g. freshly created instance)
+        for attr in BLOB_ATTRIBUTES:
+            if blob_row is not None:
+                values[attr] = getattr(blob_row, attr)
+                continue
+            cached = blob_cache.get((self.id, attr, self.updated_at))
+            if cached is MISSING:
+                missing.append(attr)
+            else:
+                values[attr] = cached
+
+        if missing:
+            columns = [StrategyBlob.__mapper__.get_property(attr).columns[0] for attr in missing]
+            for attr, value in zip(missing, load_decoded(columns, StrategyBlob.__table__.c.strategy_id == self.id)):
+                blob_cache.put((self.id, attr, self.updated_at), value)
+                values[attr] = value
+
+        values['server_key'] = self._cached_server_key(values['inline_server_key'])
+        return values
+
+    def _cached_server_key(self, inline_value):
+        if self.__dict__.get('server_key_ref') is not None:
+            return self.server_key_ref.key_data
+        if not self.server_key_digest:
+            return inline_value
+        # Keys are content-addressed, so the digest alone identifies the version
+        cache_key = ('server_key', self.server_key_digest)
+        server_key = blob_cache.get(cache_key)
+        if server_key is MISSING:
+            server_key, = load_decoded([ServerKey.__table__.c.key_data], ServerKey.__table__.c.digest == self.server_key_digest)
+            blob_cache.put(cache_key, server_key)
+        return server_key
+
     def to_dict(self):
-        """Convert to dictionary (automatically decrypts/decompresses)"""
+        """Convert to dictionary (decrypts/decompresses through the decoded-blob cache)"""
+        blobs = self.decoded_blobs()
+        zkp_data = blobs['zkp_data']
+        swap_template = blobs['swap_template']
         return {
             'id': self.id,
             'user_id': self.user_id,
@@ -109,15 +365,348 @@ class Strategy(db.Model):
             'amount': self.amount,
             'price_feed_id': self.price_feed_id,
             'recipient_address': self.recipient_address,
-            'server_key': self.server_key,
-            'encrypted_client_key': self.encrypted_client_key,  # None if using MPC shares
-            'encrypted_upper_bound': self.encrypted_upper_bound,
-            'encrypted_lower_bound': self.encrypted_lower_bound,
-            'zkp_data': json.loads(self.zkp_data) if self.zkp_data and isinstance(self.zkp_data, str) else self.zkp_data,
+            'pool_address': self.pool_address,
+            'server_key': blobs['server_key'],
+            'server_key_digest': self.server_key_digest,
+            'encrypted_client_key': blobs['encrypted_client_key'],  # None if using MPC shares
+            'encrypted_upper_bound': blobs['encrypted_upper_bound'],
+            'encrypted_lower_bound': blobs['encrypted_lower_bound'],
+            'zkp_data': json.loads(zkp_data) if zkp_data and isinstance(zkp_data, str) else zkp_data,
+            'swap_template': json.loads(swap_template) if swap_template else None,
             'mpc_public_key_set': self.mpc_public_key_set,
             'mpc_share_indices': json.loads(self.mpc_share_indices) if self.mpc_share_indices and isinstance(self.mpc_share_indices, str) else self.mpc_share_indices,
             'fhe_key_id': self.fhe_key_id,  # Key ID when shares are on MPC servers
             'status': self.status,
+            'tx_hash': self.tx_hash,
+            'execution_attempts': self.execution_attempts or 0,
+            'last_error': self.last_error,
+            'last_evaluated_at': self.last_evaluated_at.isoformat() if self.last_evaluated_at else None,
+            'last_price_age_seconds': self.last_price_age_seconds,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
+
+
+def load_decoded(columns, whereclause):
+    """Read raw column bytes for one row and decode them with each column's own type (all None if there is no row)"""
+    raw_columns = [type_coerce(column, LargeBinary) for column in columns]
+    row = db.session.execute(select(*raw_columns).where(whereclause)).one_or_none()
+    if row is None:
+        return [None] * len(columns)
+    dialect = db.session.get_bind().dialect
+    return [column.type.process_result_value(raw, dialect) for column, raw in zip(columns, row)]
+
+def effective_price_feed_id():
+    """SQL expression for a strategy's feed, mapping legacy rows without one to the default feed"""
+    return func.coalesce(Strategy.price_feed_id, DEFAULT_PRICE_FEED_ID)
+
+def is_pending():
+    """SQL condition: the strategy is PENDING. The status is inlined rather than bound, so SQLite
+    can match it against the partial ix_strategy_pending index."""
+    return Strategy.status == literal_column("'PENDING'")
+
+def pending_count():
+    """Number of PENDING strategies, counted from the partial index alone"""
+    return Strategy.query.filter(is_pending()).count()
+
+def pending_price_feed_ids():
+    """Distinct price feeds that at least one PENDING strategy is waiting on"""
+    feed = effective_price_feed_id()
+    rows = db.session.query(feed).filter(is_pending()).distinct().all()
+    return [row[0] for row in rows]
+
+def lease_is_free(now):
+    """SQL condition: no process holds the strategy's lease and it is due"""
+    return or_(Strategy.lease_expires_at.is_(None), Strategy.lease_expires_at <= now)
+
+def iter_pending_pages(batch_size=50, price_feed_id=None, after_id=None, up_to_id=None, evaluated_before=None):
+    """Stream unleased PENDING strategies in id order, one page (list) at a time, with their blobs still unloaded.
+    `after_id`/`up_to_id` limit it to ids in (after_id, up_to_id]; `evaluated_before` to strategies not
+    evaluated since then."""
+    last_id = after_id
+    while True:
+        query = Strategy.query.filter(is_pending()).filter(lease_is_free(datetime.utcnow())).order_by(Strategy.id)
+        if price_feed_id is not None:
+            query = query.filter(effective_price_feed_id() == price_feed_id)
+        if evaluated_before is not None:
+            query = query.filter(or_(Strategy.last_evaluated_at.is_(None), Strategy.last_evaluated_at < evaluated_before))
+        if up_to_id is not None:
+            query = query.filter(Strategy.id <= up_to_id)
+        if last_id is not None:
+            query = query.filter(Strategy.id > last_id)
+        page = query.limit(batch_size).all()
+        if not page:
+            return
+        last_id = page[-1].id
+        yield page
+
+def record_untriggered(strategy_id, high_cents, low_cents, **values):
+    """Persist pruning watermarks (and other evaluation bookkeeping in `values`) without touching the
+    scheduler's session or the row version"""
+    stmt = (
+        update(Strategy.__table__)
+        .where(Strategy.__table__.c.id == strategy_id)
+        # Keep updated_at as-is: watermarks don't change the blobs, so cached decodes stay valid
+        .values(untriggered_high_cents=high_cents, untriggered_low_cents=low_cents,
+                updated_at=Strategy.__table__.c.updated_at, **values)
+    )
+    with db.engine.begin() as conn:
+        conn.execute(stmt)
+
+def transition_strategy(strategy_id, from_statuses, status, **values):
+    """Move a strategy to `status` only if it is still in one of `from_statuses`; returns whether it moved.
+
+    Runs on its own connection, leaving the scheduler's session untouched.
+    """
+    table = Strategy.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == strategy_id, table.c.status.in_(from_statuses))
+        .values(status=status, **values)
+    )
+    with db.engine.begin() as conn:
+        return conn.execute(stmt).rowcount == 1
+
+def record_attempt(strategy_id, from_status, expected_tx_hash, nonce, tx_hash, kind, attempts):
+    """Point a strategy at a newly signed transaction before it is broadcast: SUBMITTED at `nonce`, with the
+    hash appended to tx_history. Only if it is still in `from_status` with `expected_tx_hash` as its latest
+    transaction (any, when None), so of two processes replacing a transaction only one records it; returns
+    whether it did."""
+    table = Strategy.__table__
+    stmt = update(table).where(table.c.id == strategy_id, table.c.status == from_status)
+    if expected_tx_hash is not None:
+        stmt = stmt.where(table.c.tx_hash == expected_tx_hash)
+    history = '[]'
+    if from_status == 'SUBMITTED':
+        # A replacement for a row submitted before the history was kept: start it with the transaction it replaces
+        history = func.json_array(func.json_array(nonce, table.c.tx_hash, 'swap'))
+    entry = func.json(json.dumps([nonce, tx_hash, kind]))
+    stmt = stmt.values(
+        status='SUBMITTED', tx_hash=tx_hash, tx_nonce=nonce, execution_attempts=attempts,
+        tx_history=func.json_insert(func.coalesce(table.c.tx_history, history), '$[#]', entry),
+        last_attempt_at=datetime.utcnow(), last_error=None,
+    )
+    with db.engine.begin() as conn:
+        return conn.execute(stmt).rowcount == 1
+
+def allocate_nonce(account, chain_nonce=None):
+    """Take the next nonce of `account` from its shared counter. `chain_nonce` (the chain's pending transaction
+    count) creates the counter, and moves it forward when the chain is ahead; without it, returns None while
+    there's no counter yet."""
+    table = ExecutorNonce.__table__
+    if chain_nonce is not None:
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(table).values(account=account, next_nonce=chain_nonce))
+        except IntegrityError:
+            pass  # Another process created it first
+    with db.engine.begin() as conn:
+        if chain_nonce is not None:
+            conn.execute(update(table).where(table.c.account == account, table.c.next_nonce < chain_nonce)
+                         .values(next_nonce=chain_nonce))
+        # The increment write-locks the row, so the read below sees this transaction's value and no one else's
+        stmt = update(table).where(table.c.account == account).values(next_nonce=table.c.next_nonce + 1)
+        if conn.execute(stmt).rowcount != 1:
+            return None
+        return conn.execute(select(table.c.next_nonce).where(table.c.account == account)).scalar_one() - 1
+
+def submitted_executions(limit=None):
+    """(id, tx_hash, tx_nonce, tx_history, execution_attempts, last_attempt_at) of SUBMITTED strategies,
+    oldest attempt first"""
+    table = Strategy.__table__
+    stmt = (
+        select(table.c.id, table.c.tx_hash, table.c.tx_nonce, table.c.tx_history, table.c.execution_attempts,
+               table.c.last_attempt_at)
+        .where(table.c.status == 'SUBMITTED')
+        .order_by(table.c.last_attempt_at)
+        .limit(limit)
+    )
+    with db.engine.connect() as conn:
+        return conn.execute(stmt).all()
+
+def retryable_executions(retry_before, limit):
+    """Unleased TRIGGERED strategies whose last attempt (if any) was before `retry_before`"""
+    return (
+        Strategy.query.filter(Strategy.status == 'TRIGGERED')
+        .filter(lease_is_free(datetime.utcnow()))
+        .filter(db.or_(Strategy.last_attempt_at.is_(None), Strategy.last_attempt_at < retry_before))
+        .order_by(Strategy.last_attempt_at)
+        .limit(limit)
+        .all()
+    )
+
+# --- Work leases ---
+# Every write below keeps updated_at as-is: leases don't change the blobs, so cached decodes stay valid
+
+def claim_strategies(strategy_ids, owner, ttl_seconds):
+    """Take the lease of every strategy in `strategy_ids` that is free; returns the ids this owner won"""
+    table = Strategy.__table__
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    with db.engine.begin() as conn:
+        # The WHERE is re-checked under the write lock, so each lease has exactly one winner
+        conn.execute(
+            update(table)
+            .where(table.c.id.in_(strategy_ids), or_(table.c.lease_expires_at.is_(None), table.c.lease_expires_at <= now))
+            .values(lease_owner=owner, lease_expires_at=expires_at, updated_at=table.c.updated_at)
+        )
+        won = conn.execute(
+            select(table.c.id).where(table.c.id.in_(strategy_ids), table.c.lease_owner == owner, table.c.lease_expires_at == expires_at)
+        ).scalars().all()
+    return set(won)
+
+def renew_leases(owner, ttl_seconds):
+    """Push back the expiry of every lease this owner holds; returns how many"""
+    table = Strategy.__table__
+    stmt = (
+        update(table)
+        .where(table.c.lease_owner == owner)
+        .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=ttl_seconds), updated_at=table.c.updated_at)
+    )
+    with db.engine.begin() as conn:
+        return conn.execute(stmt).rowcount
+
+def release_leases(strategy_ids, owner, hold_seconds=0):
+    """Give back this owner's leases; the strategies can be claimed again after `hold_seconds`"""
+    table = Strategy.__table__
+    next_due = datetime.utcnow() + timedelta(seconds=hold_seconds) if hold_seconds else None
+    stmt = (
+        update(table)
+        .where(table.c.id.in_(strategy_ids), table.c.lease_owner == owner)
+        .values(lease_owner=None, lease_expires_at=next_due, updated_at=table.c.updated_at)
+    )
+    with db.engine.begin() as conn:
+        conn.execute(stmt)
+
+# --- Feed rounds ---
+
+def feed_rounds(feed_ids=None):
+    """{feed id: row of the feed_round columns} for `feed_ids` (every feed with a round when None)"""
+    table = FeedRound.__table__
+    stmt = select(table)
+    if feed_ids is not None:
+        stmt = stmt.where(table.c.price_feed_id.in_(feed_ids))
+    with db.engine.connect() as conn:
+        return {row.price_feed_id: row for row in conn.execute(stmt)}
+
+def start_feed_round(feed_id, seen_started_at, price, owner, **cadence_values):
+    """Start a new round of a feed, unless another process has started one since `seen_started_at` (the round
+    the caller last saw, None for none). Returns when the feed's current round started, whoever started it."""
+    table = FeedRound.__table__
+    now = datetime.utcnow()
+    values = dict(started_at=now, price=price, started_by=owner, **cadence_values)
+    if seen_started_at is None:
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(table).values(price_feed_id=feed_id, **values))
+            return now
+        except IntegrityError:
+            pass  # Another process started the feed's first round
+    with db.engine.begin() as conn:
+        if seen_started_at is not None:
+            conn.execute(update(table).where(table.c.price_feed_id == feed_id, table.c.started_at == seen_started_at)
+                         .values(**values))
+        return conn.execute(select(table.c.started_at).where(table.c.price_feed_id == feed_id)).scalar_one()
+
+# --- Archival ---
+# Compaction (archive.py) reads payloads outside any write transaction and keeps each write to a few
+# primary-key updates, so the scheduler's writers never wait on it for long
+
+def archivable_strategy_ids(updated_before, limit):
+    """Unleased terminal strategies that still hold their payloads and haven't changed since `updated_before`"""
+    table = Strategy.__table__
+    stmt = (
+        select(table.c.id)
+        .where(text(UNARCHIVED_TERMINAL), table.c.updated_at < updated_before, lease_is_free(datetime.utcnow()))
+        .order_by(table.c.updated_at)
+        .limit(limit)
+    )
+    with db.engine.connect() as conn:
+        return conn.execute(stmt).scalars().all()
+
+def raw_payloads(strategy_ids):
+    """{strategy id: (server key digest, {column name: stored bytes})}, without decoding anything"""
+    table, blobs = Strategy.__table__, StrategyBlob.__table__
+    columns = [column for column in blobs.columns if column is not blobs.c.strategy_id]
+    stmt = (
+        select(table.c.id, table.c.server_key_digest, *[type_coerce(column, LargeBinary) for column in columns])
+        .select_from(table.outerjoin(blobs, blobs.c.strategy_id == table.c.id))
+        .where(table.c.id.in_(strategy_ids))
+    )
+    with db.engine.connect() as conn:
+        rows = conn.execute(stmt).all()
+    return {row[0]: (row[1], {column.name: raw for column, raw in zip(columns, row[2:])}) for row in rows}
+
+def mark_archived(locations, owner):
+    """Record where each strategy's payloads were archived, delete them and drop its server key reference,
+    in one short transaction. `locations` maps strategy id -> (segment, offset, server key digest); only
+    strategies still leased by `owner` are touched. Returns the ids archived."""
+    table, blobs, keys = Strategy.__table__, StrategyBlob.__table__, ServerKey.__table__
+    now = datetime.utcnow()
+    archived = []
+    with db.engine.begin() as conn:
+        for strategy_id, (segment, offset, digest) in locations.items():
+            moved = conn.execute(
+                update(table)
+                .where(table.c.id == strategy_id, table.c.lease_owner == owner, text(UNARCHIVED_TERMINAL))
+                # updated_at moves on, so cached decodes of the deleted payloads are never served again
+                .values(archived_at=now, archive_segment=segment, archive_offset=offset, server_key_digest=None,
+                        lease_owner=None, lease_expires_at=None)
+            ).rowcount
+            if not moved:
+                continue
+            conn.execute(blobs.delete().where(blobs.c.strategy_id == strategy_id))
+            if digest:
+                # Keys nobody references any more are archived and deleted by archive.py, not here
+                conn.execute(update(keys).where(keys.c.digest == digest).values(refcount=keys.c.refcount - 1))
+            archived.append(strategy_id)
+    return archived
+
+def unreferenced(keys):
+    """No strategy points at the key, whatever its refcount says (counts from older releases may be low)"""
+    table = Strategy.__table__
+    return ~select(table.c.id).where(table.c.server_key_digest == keys.c.digest).exists()
+
+def orphaned_server_keys(limit):
+    """(digest, stored bytes) of server keys no strategy references any more"""
+    keys = ServerKey.__table__
+    stmt = (
+        select(keys.c.digest, type_coerce(keys.c.key_data, LargeBinary))
+        .where(keys.c.refcount <= 0, unreferenced(keys))
+        .limit(limit)
+    )
+    with db.engine.connect() as conn:
+        return conn.execute(stmt).all()
+
+def delete_orphaned_server_keys(digests):
+    """Delete these keys unless a strategy has taken a reference again meanwhile; returns how many"""
+    keys = ServerKey.__table__
+    with db.engine.begin() as conn:
+        return conn.execute(
+            keys.delete().where(keys.c.digest.in_(digests), keys.c.refcount <= 0, unreferenced(keys))
+        ).rowcount
+
+def release_blobs(strategy):
+    """Drop a strategy's decoded blobs so a long scan keeps only the current row's payload in memory"""
+    db.session.expire(strategy, ['blob_row'])
+
+def load_strategy(strategy):
+    """Decoded dict of a strategy about to be evaluated or sent; its blobs leave the session again"""
+    try:
+        with metrics.BLOB_DECODE_SECONDS.time():
+            return strategy.to_dict()
+    finally:
+        release_blobs(strategy)
+
+# --- Async access ---
+# Busy timeouts make any SQLite call a potential multi-second wait, so the scheduler's event loop hands
+# its database work to one dedicated thread. One thread also means a session is never used by two
+# threads at once.
+_db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scheduler-db")
+
+async def run_db(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs) run on the database thread, inside the caller's app context (and so its session)"""
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, call)
@@ -45,6 +45,27 @@ if response.lower() != 'yes':
     conn.close()
     exit(0)
 
+# Release the deleted strategies' references into the shared server key store
+cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='server_key'")
+if cursor.fetchone():
+    cursor.execute('''
+        UPDATE server_key SET refcount = refcount - (
+            SELECT COUNT(*) FROM strategy
+            WHERE strategy.server_key_digest = server_key.digest
+              AND (strategy.fhe_key_id IS NULL OR strategy.fhe_key_id = '')
+        )
+    ''')
+    cursor.execute('DELETE FROM server_key WHERE refcount <= 0')
+    print(f'🔑 Removed {cursor.rowcount} server keys no longer referenced')
+
+# Delete their payloads from the side table, then the strategies themselves
+cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='strategy_blob'")
+if cursor.fetchone():
+    cursor.execute('''
+        DELETE FROM strategy_blob
+        WHERE strategy_id IN (SELECT id FROM strategy WHERE fhe_key_id IS NULL OR fhe_key_id = '')
+    ''')
+
 # Delete legacy strategies
 cursor.execute('''
     DELETE FROM strategy 
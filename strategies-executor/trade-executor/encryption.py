@@ -4,37 +4,133 @@ Provides encryption at rest and compression for large data fields
 """
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
+import hashlib
+import hmac
 import os
+import re
 import zlib
 import gzip
 from dotenv import load_dotenv
+from threading import Lock
 
 # Load environment variables (local/dev convenience)
 load_dotenv()
 
+# --- Derived key cache ---
+# PBKDF2 is deliberately slow, and every process of a container start (prestart,
+# gunicorn workers) needs the same key. The derived key is cached in a
+# memory-backed directory, readable only by this user, next to a fingerprint of
+# the inputs so a changed DB_ENCRYPTION_KEY/SALT is never served a stale key.
+KDF_ITERATIONS = 100000
+KEY_CACHE_DIR = os.getenv('DB_KEY_CACHE_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else '')
+
+def _key_cache_path(salt: bytes):
+    if not KEY_CACHE_DIR or not os.path.isdir(KEY_CACHE_DIR):
+        return None
+    name = hashlib.sha256(salt + str(KDF_ITERATIONS).encode()).hexdigest()[:16]
+    return os.path.join(KEY_CACHE_DIR, f"siphon-dbkey-{name}")
+
+def _kdf_fingerprint(key_material: bytes, salt: bytes) -> bytes:
+    return hashlib.sha256(b'siphon-kdf-cache' + salt + str(KDF_ITERATIONS).encode() + key_material).digest()
+
+def _read_cached_key(path, fingerprint):
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW)
+    except OSError:
+        return None
+    try:
+        st = os.fstat(fd)
+        # Only trust a file this user wrote and nobody else can read or replace
+        if st.st_uid != os.geteuid() or st.st_mode & 0o077 or st.st_size != 64:
+            return None
+        data = os.read(fd, 64)
+    finally:
+        os.close(fd)
+    if len(data) == 64 and hmac.compare_digest(data[:32], fingerprint):
+        return data[32:]
+    return None
+
+def _write_cached_key(path, fingerprint, derived):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+        try:
+            os.write(fd, fingerprint + derived)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️  Could not cache derived database key: {e}")
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+def derive_database_key(key_material: bytes, salt: bytes) -> bytes:
+    """PBKDF2-SHA256 of the database key, served from the cross-process cache when possible"""
+    path = _key_cache_path(salt)
+    fingerprint = _kdf_fingerprint(key_material, salt)
+    if path:
+        cached = _read_cached_key(path, fingerprint)
+        if cached:
+            return cached
+
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=KDF_ITERATIONS,
+    )
+    derived = kdf.derive(key_material)
+    if path:
+        _write_cached_key(path, fingerprint, derived)
+    return derived
+
 class DatabaseEncryption:
-    """Handles encryption/decryption of sensitive database fields"""
+    """Handles encryption/decryption of sensitive database fields.
+
+    Keys are derived on first use, not at import, so processes that never
+    touch an encrypted column never pay for PBKDF2.
+    """
     
     def __init__(self):
-        # Get encryption key from environment (generate once and store securely)
-        key_material = os.getenv('DB_ENCRYPTION_KEY', '').encode()
-        if not key_material:
-            # Generate a default key for development (WARNING: Change in production!)
-            print("⚠️  WARNING: Using default encryption key. Set DB_ENCRYPTION_KEY in production!")
-            key_material = b'default-key-change-in-production-32-bytes!!'
-        
-        # Derive key using PBKDF2
-        salt = os.getenv('DB_ENCRYPTION_SALT', 'siphon_salt_2024').encode()
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(key_material))
-        self.cipher = Fernet(key)
+        self._lock = Lock()
+        self._cipher = None
+        self._aead = None
+
+    def _derive_keys(self):
+        with self._lock:
+            if self._cipher is not None:
+                return
+            # Get encryption key from environment (generate once and store securely)
+            key_material = os.getenv('DB_ENCRYPTION_KEY', '').encode()
+            if not key_material:
+                # Generate a default key for development (WARNING: Change in production!)
+                print("⚠️  WARNING: Using default encryption key. Set DB_ENCRYPTION_KEY in production!")
+                key_material = b'default-key-change-in-production-32-bytes!!'
+
+            # Derive key using PBKDF2
+            salt = os.getenv('DB_ENCRYPTION_SALT', 'siphon_salt_2024').encode()
+            derived = derive_database_key(key_material, salt)
+            # Separate key for binary envelopes, so Fernet and AES-GCM never share key bytes
+            self._aead = AESGCM(HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'siphon-blob-envelope-v1').derive(derived))
+            self._cipher = Fernet(base64.urlsafe_b64encode(derived))
+
+    @property
+    def cipher(self):
+        if self._cipher is None:
+            self._derive_keys()
+        return self._cipher
+
+    @property
+    def aead(self):
+        if self._cipher is None:
+            self._derive_keys()
+        return self._aead
     
     def encrypt(self, plaintext: str) -> str:
         """Encrypt sensitive data before storing in database"""
@@ -53,6 +149,15 @@ class DatabaseEncryption:
             print(f"⚠️  Decryption failed, assuming plaintext: {e}")
             return ciphertext
 
+    def encrypt_bytes(self, plaintext: bytes, associated_data: bytes) -> bytes:
+        """AES-GCM encrypt raw bytes; returns nonce + ciphertext (tag included)"""
+        nonce = os.urandom(12)
+        return nonce + self.aead.encrypt(nonce, plaintext, associated_data)
+
+    def decrypt_bytes(self, data: bytes, associated_data: bytes) -> bytes:
+        """Inverse of encrypt_bytes; raises InvalidTag if the data or associated data was altered"""
+        return self.aead.decrypt(data[:12], data[12:], associated_data)
+
 class DataCompression:
     """Handles compression/decompression of large data fields"""
     
@@ -92,6 +197,89 @@ class DataCompression:
             # If it's not base64, might be uncompressed
             return data
 
+class BlobEnvelope:
+    """Versioned binary at-rest format for large columns.
+
+    Layout: MAGIC (2 bytes) | version (1) | flags (1) | body. The body is the
+    payload, optionally zlib-compressed, and for encrypted columns sealed with
+    AES-GCM. The associated data is the 4 header bytes followed by the value's
+    context (e.g. its table and column), so a sealed value copied to another
+    column fails to open. Version 1 envelopes, written before the context was
+    bound, used the header alone. JSON-encoded hex strings (keys and
+    ciphertexts as the API receives them) are stored as their raw bytes and
+    re-wrapped on read, so callers still see the same text.
+
+    Legacy values (base64/gzip/Fernet text) never start with MAGIC, since they
+    are plain ASCII.
+    """
+    MAGIC = b"\x00\xf5"
+    VERSION = 2
+    READABLE_VERSIONS = (1, 2)
+    FLAG_COMPRESSED = 0x01
+    FLAG_HEX_JSON = 0x02
+    FLAG_ENCRYPTED = 0x04
+    # Ciphertexts and keys are near-random, so a fast level loses little and compression is skipped when it doesn't pay
+    COMPRESSION_LEVEL = 1
+    MIN_SAVING = 0.1
+    SAMPLE_BYTES = 64 * 1024
+    HEX_JSON = re.compile(r'"[0-9a-f]*"')
+
+    def __init__(self, encryption):
+        self.encryption = encryption
+
+    @classmethod
+    def is_envelope(cls, data) -> bool:
+        return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:2]) == cls.MAGIC
+
+    @classmethod
+    def is_current(cls, data) -> bool:
+        """An envelope of this version (older ones don't bind their context)"""
+        return cls.is_envelope(data) and data[2] == cls.VERSION
+
+    def _worth_compressing(self, payload: bytes) -> bool:
+        """Probe a sample first, so multi-megabyte random payloads aren't compressed for nothing"""
+        sample = payload[:self.SAMPLE_BYTES]
+        return len(zlib.compress(sample, self.COMPRESSION_LEVEL)) <= len(sample) * (1 - self.MIN_SAVING)
+
+    def seal(self, text: str, encrypt: bool, context: bytes = b"") -> bytes:
+        """Encode a column value into an envelope; an encrypted one only opens with the same `context`"""
+        flags = 0
+        if len(text) % 2 == 0 and self.HEX_JSON.fullmatch(text):
+            payload = bytes.fromhex(text[1:-1])
+            flags |= self.FLAG_HEX_JSON
+        else:
+            payload = text.encode()
+
+        if self._worth_compressing(payload):
+            compressed = zlib.compress(payload, self.COMPRESSION_LEVEL)
+            if len(compressed) <= len(payload) * (1 - self.MIN_SAVING):
+                payload = compressed
+                flags |= self.FLAG_COMPRESSED
+
+        if encrypt:
+            flags |= self.FLAG_ENCRYPTED
+        header = self.MAGIC + bytes((self.VERSION, flags))
+        if encrypt:
+            payload = self.encryption.encrypt_bytes(payload, header + context)
+        return header + payload
+
+    def open(self, data: bytes, context: bytes = b"") -> str:
+        """Decode an envelope back to the column value"""
+        data = bytes(data)
+        header, version, flags = data[:4], data[2], data[3]
+        if version not in self.READABLE_VERSIONS:
+            raise ValueError(f"Unsupported blob envelope version {version}")
+
+        payload = data[4:]
+        if flags & self.FLAG_ENCRYPTED:
+            payload = self.encryption.decrypt_bytes(payload, header + context if version >= 2 else header)
+        if flags & self.FLAG_COMPRESSED:
+            payload = zlib.decompress(payload)
+        if flags & self.FLAG_HEX_JSON:
+            return '"' + payload.hex() + '"'
+        return payload.decode()
+
 # Singleton instances
 db_encryption = DatabaseEncryption()
 data_compression = DataCompression()
+blob_envelope = BlobEnvelope(db_encryption)
@@ -5,22 +5,18 @@ set -e
 
 echo "🚀 Starting Siphon Trade Executor..."
 
-# Initialize database if needed
-echo "📦 Initializing database..."
-python3 init_db.py || {
-    echo "⚠️  Database initialization warning (may already exist)"
+# Initialize database and run migrations in a single process
+echo "📦 Initializing database and running migrations..."
+python3 prestart.py || {
+    echo "⚠️  Prestart warning (server will start anyway)"
 }
 
-# Run database migration if needed (only if database exists and has data)
-echo "🔄 Checking if migration is needed..."
-if [ -f "instance/strategies.db" ]; then
-    python3 migrate_database.py || {
-        echo "⚠️  Migration warning (may have already run or no data to migrate)"
-    }
-else
-    echo "   No existing database, migration will run on first data insertion"
+# SERVICE_ROLE=scheduler runs only the scheduler; start more of these to share the strategy book
+if [ "${SERVICE_ROLE:-web}" = "scheduler" ]; then
+    echo "✅ Starting standalone scheduler..."
+    exec python3 run_scheduler.py
 fi
 
-# Start the application
+# Start the application (each worker also runs a scheduler thread unless EMBEDDED_SCHEDULER=false)
 echo "✅ Starting Gunicorn server..."
-exec gunicorn --bind 0.0.0.0:5005 --workers 1 --timeout 3000 'app:app'
+exec gunicorn --bind 0.0.0.0:5005 --workers "${WEB_WORKERS:-1}" --timeout 3000 'app:app'
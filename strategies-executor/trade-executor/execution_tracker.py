@@ -0,0 +1,259 @@
+"""
+Execution Tracker
+Drives triggered strategies through TRIGGERED -> SUBMITTED -> CONFIRMED/FAILED.
+Sends run off the event loop, and receipts for every in-flight transaction are
+fetched in JSON-RPC batches by a background poller, so the evaluation loop
+never waits for a block.
+
+Nonces come from a counter in the database shared by every sending process.
+A transaction is recorded on its strategy (nonce and hash) before it is
+broadcast, so one whose broadcast errors or times out is never lost track of,
+and a nonce that ends up unused is filled with an empty transfer so the ones
+after it can still be mined.
+While a transaction has no receipt after TX_RECEIPT_TIMEOUT_SECONDS and its
+nonce is still unused, it is replaced at the same nonce with higher fees, so at
+most one swap per trigger can ever be mined; every hash sent is kept and any of
+them can confirm the strategy. Once MAX_EXECUTION_ATTEMPTS transactions have
+been sent, the nonce is cancelled instead (an empty transfer to ourselves) and
+the strategy FAILS when that is mined. Reverted swaps, and nonces another
+transaction took, go back to TRIGGERED and are retried with a new nonce after a
+backoff, up to MAX_EXECUTION_ATTEMPTS. Retries and replacements are claimed
+through work leases, so with several scheduler processes each one is sent by
+exactly one of them.
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+from database import (
+    db, Strategy, transition_strategy, record_attempt, submitted_executions, retryable_executions, load_strategy, run_db,
+)
+from trade_executor import prepare_trade, get_executor_client, can_replace, TradeRejected
+import leases
+import metrics
+from config import (
+    RECEIPT_POLL_INTERVAL_SECONDS, RECEIPT_BATCH_SIZE, TX_RECEIPT_TIMEOUT_SECONDS,
+    MAX_EXECUTION_ATTEMPTS, EXECUTION_RETRY_BACKOFF_SECONDS,
+)
+
+def retry_or_fail(strategy_id, from_status, attempts, error, **values):
+    """Send a failed attempt back to TRIGGERED, or to FAILED once the attempt budget is spent"""
+    if attempts >= MAX_EXECUTION_ATTEMPTS:
+        transition_strategy(strategy_id, [from_status], 'FAILED', execution_attempts=attempts, last_error=error, **values)
+        metrics.EXECUTIONS.inc(outcome="failed")
+        print(f"[Executions] ❌ Strategy {strategy_id} FAILED after {attempts} attempts: {error}")
+    else:
+        transition_strategy(strategy_id, [from_status], 'TRIGGERED', execution_attempts=attempts, last_error=error, **values)
+        metrics.EXECUTIONS.inc(outcome="retried")
+        print(f"[Executions] ⚠️  Strategy {strategy_id} attempt {attempts} failed ({error}), will retry")
+
+def load_strategy_by_id(strategy_id):
+    return load_strategy(db.session.get(Strategy, strategy_id))
+
+async def fill_nonce(client, nonce):
+    """Use up `nonce` with an empty transfer to ourselves, so the transactions after it can be mined. The
+    transfer is the same whoever signs it, so processes filling the same nonce don't compete."""
+    try:
+        tx_hash, raw_transaction = await asyncio.to_thread(client.sign, client.cancel_call(), nonce)
+        await asyncio.to_thread(client.broadcast, raw_transaction)
+        print(f"[Executions] Filled unused nonce {nonce} ({tx_hash}).")
+    except Exception as e:
+        print(f"[Executions] ⚠️  Couldn't fill unused nonce {nonce}: {e}")
+
+async def send_transaction(client, strategy_id, from_status, expected_tx_hash, attempts, call, kind, nonce=None, replacement=0):
+    """Sign `call`, record it on the strategy (SUBMITTED), then broadcast it; a new nonce is allocated when
+    `nonce` is None. Returns whether it was recorded: a strategy that moved on meanwhile is left alone."""
+    fresh_nonce = nonce is None
+    if fresh_nonce:
+        nonce = await asyncio.to_thread(client.nonces.allocate)
+    recorded = False
+    try:
+        tx_hash, raw_transaction = await asyncio.to_thread(client.sign, call, nonce, replacement)
+        recorded = await run_db(record_attempt, strategy_id, from_status, expected_tx_hash, nonce, tx_hash, kind, attempts)
+    finally:
+        if fresh_nonce and not recorded:
+            # Other processes may hold the nonces after it already, so it can't be handed back
+            await fill_nonce(client, nonce)
+    if not recorded:
+        return False
+
+    try:
+        await asyncio.to_thread(client.broadcast, raw_transaction)
+    except Exception as e:
+        # It may have reached the mempool anyway; the poller settles it, or replaces it at the same nonce
+        print(f"[Executions] ⚠️  Broadcast of {tx_hash} for strategy {strategy_id} failed: {e}")
+        await run_db(transition_strategy, strategy_id, ['SUBMITTED'], 'SUBMITTED', last_error=f"broadcast failed: {e}")
+        return True
+    metrics.EXECUTIONS.inc(outcome="submitted")
+    print(f"[Executions] Strategy {strategy_id} SUBMITTED ({kind} {tx_hash}, nonce {nonce}).")
+    return True
+
+async def submit_trade(strategy_dict, current_price):
+    """Send the swap for a TRIGGERED strategy at a new nonce and record it"""
+    strategy_id = strategy_dict['id']
+    attempts = (strategy_dict.get('execution_attempts') or 0) + 1
+    try:
+        # web3 calls block, so keep them off the event loop
+        call = await asyncio.to_thread(prepare_trade, strategy_dict)
+        client = await asyncio.to_thread(get_executor_client)
+        await send_transaction(client, strategy_id, 'TRIGGERED', None, attempts, call, "swap")
+    except TradeRejected as e:
+        await run_db(transition_strategy, strategy_id, ['TRIGGERED'], 'FAILED', execution_attempts=attempts,
+                     last_attempt_at=datetime.utcnow(), last_error=str(e))
+        metrics.EXECUTIONS.inc(outcome="failed")
+        print(f"[Executions] ❌ Strategy {strategy_id} FAILED: {e}")
+    except Exception as e:
+        # Nothing was recorded, so nothing can have been broadcast
+        await run_db(retry_or_fail, strategy_id, 'TRIGGERED', attempts, f"send failed: {e}", last_attempt_at=datetime.utcnow())
+
+def sent_at_nonce(row):
+    """[(hash, kind)] of the transactions sent at the row's current nonce (only the latest hash for rows
+    submitted before the history was kept)"""
+    if not row.tx_history:
+        return [(row.tx_hash, "swap")]
+    return [(tx_hash, kind) for nonce, tx_hash, kind in json.loads(row.tx_history) if nonce == row.tx_nonce]
+
+async def settle_receipt(row, tx_hash, kind, receipt):
+    """Act on the mined transaction at the row's nonce"""
+    if kind == "cancel":
+        if await run_db(transition_strategy, row.id, ['SUBMITTED'], 'FAILED', tx_hash=tx_hash, tx_nonce=None,
+                        last_error=f"cancelled after {row.execution_attempts} attempts without a receipt"):
+            metrics.EXECUTIONS.inc(outcome="failed")
+            print(f"[Executions] ❌ Strategy {row.id} FAILED: its nonce was cancelled by {tx_hash}.")
+    elif int(receipt.get('status', '0x1'), 16) == 1:
+        if await run_db(transition_strategy, row.id, ['SUBMITTED'], 'CONFIRMED', tx_hash=tx_hash, tx_nonce=None, last_error=None):
+            metrics.EXECUTIONS.inc(outcome="confirmed")
+            print(f"[Executions] ✅ Strategy {row.id} CONFIRMED in block {int(receipt['blockNumber'], 16)} ({tx_hash}).")
+    else:
+        await run_db(retry_or_fail, row.id, 'SUBMITTED', row.execution_attempts or 0, f"{tx_hash} reverted",
+                     tx_hash=tx_hash, tx_nonce=None)
+
+async def replace_stuck(client, row, sent):
+    """No transaction at the row's nonce has a receipt after TX_RECEIPT_TIMEOUT_SECONDS: settle it if the
+    nonce was used after all, else send a replacement at the same nonce (a cancellation once the attempt
+    budget is spent)"""
+    attempts = row.execution_attempts or 0
+    nonce = row.tx_nonce
+    if nonce is None:
+        # Submitted before nonces were recorded: ask the node
+        nonce = await asyncio.to_thread(client.transaction_nonce, row.tx_hash)
+        if nonce is None:
+            # Neither mined nor in the node's mempool, and it was never replaced: it can't be mined any more
+            await run_db(retry_or_fail, row.id, 'SUBMITTED', attempts, f"{row.tx_hash} was dropped")
+            return
+
+    if await asyncio.to_thread(client.nonce_consumed, nonce):
+        # Mined meanwhile, or the nonce went to another transaction
+        receipts = await asyncio.to_thread(client.get_receipts, [tx_hash for tx_hash, _ in sent])
+        for tx_hash, kind in sent:
+            if receipts.get(tx_hash) is not None:
+                await settle_receipt(row, tx_hash, kind, receipts[tx_hash])
+                return
+        await run_db(retry_or_fail, row.id, 'SUBMITTED', attempts, f"nonce {nonce} was used by another transaction",
+                     tx_nonce=None)
+        client.nonces.resync()  # Something else sends from the account; don't hand out nonces it used
+        return
+
+    replacement = len(sent)
+    if not can_replace(replacement):
+        print(f"[Executions] ⚠️  Strategy {row.id}: nonce {nonce} still unmined at the fee cap, waiting")
+        return
+    cancelling = attempts >= MAX_EXECUTION_ATTEMPTS or any(kind == "cancel" for _, kind in sent)
+
+    # Only one process replaces a given transaction
+    if not await run_db(leases.claim, [row.id]):
+        return
+    try:
+        call, kind = None, "swap"
+        if not cancelling:
+            try:
+                strategy_dict = await run_db(load_strategy_by_id, row.id)
+                call = await asyncio.to_thread(prepare_trade, strategy_dict)
+            except TradeRejected:
+                pass  # The swap can't be rebuilt any more: free the nonce instead
+        if call is None:
+            call, kind = client.cancel_call(), "cancel"
+        print(f"[Executions] ⚠️  Strategy {row.id}: no receipt at nonce {nonce}, sending {kind} replacement #{replacement}.")
+        await send_transaction(client, row.id, 'SUBMITTED', row.tx_hash, attempts + 1, call, kind, nonce, replacement)
+    finally:
+        await run_db(leases.release, [row.id])
+
+async def fill_nonce_gap(client, rows, stuck_before):
+    """A nonce allocated but never sent (its process died in between) holds back every later transaction of the
+    account. Once one has been stuck for TX_RECEIPT_TIMEOUT_SECONDS, fill the lowest unused nonce if no strategy
+    is waiting on it."""
+    if any(row.tx_nonce is None for row in rows):
+        return  # Submitted before nonces were recorded, so any of them might be the one waiting
+    stuck = [row.tx_nonce for row in rows if row.last_attempt_at is not None and row.last_attempt_at < stuck_before]
+    if not stuck:
+        return
+    lowest_unused = await asyncio.to_thread(client.mined_count)
+    if lowest_unused < min(stuck) and lowest_unused not in {row.tx_nonce for row in rows}:
+        await fill_nonce(client, lowest_unused)
+
+async def poll_receipts():
+    """Settle SUBMITTED strategies from their receipts, one RPC batch per RECEIPT_BATCH_SIZE strategies"""
+    rows = await run_db(submitted_executions)
+    if not rows:
+        return
+    client = await asyncio.to_thread(get_executor_client)
+    timeout = timedelta(seconds=TX_RECEIPT_TIMEOUT_SECONDS)
+    now = datetime.utcnow()
+
+    for start in range(0, len(rows), RECEIPT_BATCH_SIZE):
+        batch = rows[start:start + RECEIPT_BATCH_SIZE]
+        sent = {row.id: sent_at_nonce(row) for row in batch}
+        receipts = await asyncio.to_thread(client.get_receipts, [tx_hash for row in batch for tx_hash, _ in sent[row.id]])
+        for row in batch:
+            mined = [(tx_hash, kind) for tx_hash, kind in sent[row.id] if receipts.get(tx_hash) is not None]
+            try:
+                if mined:
+                    tx_hash, kind = mined[0]  # Only one transaction per nonce can be mined
+                    await settle_receipt(row, tx_hash, kind, receipts[tx_hash])
+                elif row.last_attempt_at is not None and now - row.last_attempt_at > timeout:
+                    await replace_stuck(client, row, sent[row.id])
+            except Exception as e:
+                print(f"[Executions] Error settling strategy {row.id}: {e}")
+    await fill_nonce_gap(client, rows, now - timeout)
+
+async def resubmit_claimed(strategy_dict):
+    try:
+        await submit_trade(strategy_dict, None)
+    finally:
+        await run_db(leases.release, [strategy_dict['id']])
+
+async def resubmit_triggered(in_flight):
+    """Start sends for TRIGGERED strategies whose backoff has passed (including ones left over from a restart)"""
+    retry_before = datetime.utcnow() - timedelta(seconds=EXECUTION_RETRY_BACKOFF_SECONDS)
+    candidates = await run_db(retryable_executions, retry_before, limit=RECEIPT_BATCH_SIZE)
+    claimed = await run_db(leases.claim, [strategy.id for strategy in candidates])
+    # Claimed strategies whose send hasn't started; a started send releases its own lease
+    unstarted = set(claimed)
+    try:
+        for strategy in candidates:
+            if strategy.id not in unstarted:
+                continue
+            try:
+                strategy_dict = await run_db(load_strategy, strategy)
+            except Exception as decode_err:
+                print(f"[Executions] Error loading strategy {strategy.id}: {decode_err}")
+                continue
+            print(f"[Executions] Retrying strategy {strategy.id} (attempt {strategy_dict['execution_attempts'] + 1}).")
+            task = asyncio.create_task(resubmit_claimed(strategy_dict))
+            unstarted.discard(strategy.id)
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+    finally:
+        if unstarted:
+            await run_db(leases.release, list(unstarted))
+
+async def track_executions(app):
+    """Background loop: poll receipts and retry failed attempts every RECEIPT_POLL_INTERVAL_SECONDS"""
+    in_flight = set()
+    while True:
+        try:
+            with app.app_context():
+                await poll_receipts()
+                await resubmit_triggered(in_flight)
+        except Exception as e:
+            print(f"[Executions] Tracker error: {e}")
+        await asyncio.sleep(RECEIPT_POLL_INTERVAL_SECONDS)
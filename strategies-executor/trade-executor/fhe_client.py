@@ -1,61 +1,272 @@
-import requests
+import asyncio
+import hashlib
 import json
+import msgpack
 import os
-from config import FHE_ENGINE_URL
+from config import (
+    FHE_ENGINE_URL, FHE_ENGINE_BATCH_URL, FHE_ENGINE_REGISTER_KEY_URL, FHE_BATCH_SIZE,
+    FHE_MAX_IN_FLIGHT, FHE_REQUEST_TIMEOUT_SECONDS, FHE_WIRE_FORMAT,
+)
 
 # Get API token from environment
 API_TOKEN = os.getenv('API_TOKEN', '')
 
-def is_condition_met(strategy, current_price):
-    print(f"   -> [FHE Client] Consulting REAL Rust FHE Engine for strategy '{strategy['id']}'...")
+def price_to_cents(price):
+    """Price in the integer cents the FHE engine compares against"""
+    return int(price * 100)
+
+# --- Wire format ---
+# Ciphertexts and keys are stored as JSON-encoded hex strings. JSON requests
+# carry them as-is; msgpack requests carry the raw bytes as `bin` fields,
+# which halves the payload and spares the engine the hex decoding.
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+JSON_CONTENT_TYPE = "application/json"
+
+def blob(stored, binary):
+    """A stored blob in the request's encoding: raw bytes for msgpack, the hex string for JSON"""
+    value = json.loads(stored)
+    if not binary:
+        return value
     try:
-        payload = {
-            "strategy_type": strategy["strategy_type"],
-            "encrypted_upper_bound": json.loads(strategy["encrypted_upper_bound"]),
-            "encrypted_lower_bound": json.loads(strategy["encrypted_lower_bound"]),
-            "server_key": json.loads(strategy["server_key"]),
-            "current_price_cents": int(current_price * 100),
-        }
-        
-        # Debug: Check what MPC fields are available
-        has_fhe_key_id = strategy.get('fhe_key_id') is not None
-        has_mpc_pubkey = strategy.get('mpc_public_key_set') is not None
-        has_client_key = strategy.get('encrypted_client_key') is not None
-        
-        print(f"   -> [FHE Client] Strategy MPC status:")
-        print(f"      - fhe_key_id: {'✅' if has_fhe_key_id else '❌'} ({strategy.get('fhe_key_id', 'None')})")
-        print(f"      - mpc_public_key_set: {'✅' if has_mpc_pubkey else '❌'}")
-        print(f"      - encrypted_client_key: {'✅' if has_client_key else '❌'} (legacy)")
-        
-        # Add client key only if NOT using MPC shares (legacy support)
-        if strategy.get('encrypted_client_key'):
-            payload["encrypted_client_key"] = json.loads(strategy['encrypted_client_key'])
-        
-        # Add MPC fields (preferred - uses threshold decryption)
-        if strategy.get('mpc_public_key_set'):
-            payload["mpc_public_key_set"] = strategy['mpc_public_key_set']
-        if strategy.get('mpc_share_indices'):
-            payload["mpc_share_indices"] = json.loads(strategy['mpc_share_indices']) if isinstance(strategy['mpc_share_indices'], str) else strategy['mpc_share_indices']
-        if strategy.get('fhe_key_id'):
-            payload["fhe_key_id"] = strategy['fhe_key_id']  # Key ID for threshold decryption
-            print(f"   -> [FHE Client] ✅ Using MPC threshold decryption (key_id: {strategy['fhe_key_id']})")
-        else:
-            print(f"   -> [FHE Client] ⚠️  No fhe_key_id found - will use legacy direct decryption")
-        
-        headers = {}
-        if API_TOKEN:
-            headers['X-API-TOKEN'] = API_TOKEN
-        
-        response = requests.post(FHE_ENGINE_URL, json=payload, headers=headers, timeout=3000)
-        response.raise_for_status()
-        result = response.json()
-        
-        if result.get("is_triggered", False):
-            print(f"   <- [FHE Client] Response from Rust: Condition MET.")
-            return True
-        else:
-            print(f"   <- [FHE Client] Response from Rust: Condition NOT met.")
-            return False
-    except Exception as e:
-        print(f"   <- [FHE Client] ❌ An error occurred: {e}")
-        return False
\ No newline at end of file
+        return bytes.fromhex(value)
+    except (TypeError, ValueError):
+        return value  # Not hex: pass it through and let the engine reject it, as it would over JSON
+
+def encode_body(payload, binary):
+    """(body bytes, content type) for a request payload"""
+    if binary:
+        return msgpack.packb(payload, use_bin_type=True), MSGPACK_CONTENT_TYPE
+    return json.dumps(payload).encode(), JSON_CONTENT_TYPE
+
+def strategy_fields(strategy, binary=False):
+    """Per-strategy part of an evaluation request (everything except the server key and price)"""
+    payload = {
+        "strategy_type": strategy["strategy_type"],
+        "encrypted_upper_bound": blob(strategy["encrypted_upper_bound"], binary),
+        "encrypted_lower_bound": blob(strategy["encrypted_lower_bound"], binary),
+    }
+
+    # Debug: Check what MPC fields are available
+    has_fhe_key_id = strategy.get('fhe_key_id') is not None
+    has_mpc_pubkey = strategy.get('mpc_public_key_set') is not None
+    has_client_key = strategy.get('encrypted_client_key') is not None
+
+    print(f"   -> [FHE Client] Strategy MPC status:")
+    print(f"      - fhe_key_id: {'✅' if has_fhe_key_id else '❌'} ({strategy.get('fhe_key_id', 'None')})")
+    print(f"      - mpc_public_key_set: {'✅' if has_mpc_pubkey else '❌'}")
+    print(f"      - encrypted_client_key: {'✅' if has_client_key else '❌'} (legacy)")
+
+    # Add client key only if NOT using MPC shares (legacy support)
+    if strategy.get('encrypted_client_key'):
+        payload["encrypted_client_key"] = blob(strategy['encrypted_client_key'], binary)
+
+    # Add MPC fields (preferred - uses threshold decryption)
+    if strategy.get('mpc_public_key_set'):
+        payload["mpc_public_key_set"] = strategy['mpc_public_key_set']
+    if strategy.get('mpc_share_indices'):
+        payload["mpc_share_indices"] = json.loads(strategy['mpc_share_indices']) if isinstance(strategy['mpc_share_indices'], str) else strategy['mpc_share_indices']
+    if strategy.get('fhe_key_id'):
+        payload["fhe_key_id"] = strategy['fhe_key_id']  # Key ID for threshold decryption
+        print(f"   -> [FHE Client] ✅ Using MPC threshold decryption (key_id: {strategy['fhe_key_id']})")
+    else:
+        print(f"   -> [FHE Client] ⚠️  No fhe_key_id found - will use legacy direct decryption")
+    return payload
+
+def key_fields(strategy, key_handle=None, binary=False):
+    """Server key part of a request: the registered handle if there is one, else the full key"""
+    if key_handle:
+        return {"server_key_handle": key_handle}
+    return {"server_key": blob(strategy["server_key"], binary)}
+
+def build_payload(strategy, current_price, key_handle=None, binary=False):
+    """Body for /evaluateStrategy"""
+    payload = strategy_fields(strategy, binary)
+    payload.update(key_fields(strategy, key_handle, binary))
+    payload["current_price_cents"] = price_to_cents(current_price)
+    return payload
+
+def build_batch_payload(strategies, current_price, key_handle=None, binary=False):
+    """Body for /evaluateBatch; all strategies must share the same server key"""
+    payload = key_fields(strategies[0], key_handle, binary)
+    payload["current_price_cents"] = price_to_cents(current_price)
+    payload["strategies"] = [strategy_fields(strategy, binary) for strategy in strategies]
+    return payload
+
+def key_digest(strategy):
+    """Local identity of a strategy's server key (the key-store digest, or a hash of an inline key)"""
+    return strategy.get("server_key_digest") or hashlib.sha256(strategy["server_key"].encode()).hexdigest()
+
+class EngineError(Exception):
+    """The engine answered with an error status"""
+
+class UnknownKeyError(EngineError):
+    """The engine no longer holds a key we registered (e.g. it restarted)"""
+
+def check_status(status, body):
+    """Raise for error answers, surfacing the engine's "unknown_key" as UnknownKeyError"""
+    if status == 422 and body.get("error") == "unknown_key":
+        raise UnknownKeyError()
+    if status >= 400:
+        raise EngineError(f"FHE engine answered {status}: {body}")
+
+def auth_headers():
+    headers = {}
+    if API_TOKEN:
+        headers['X-API-TOKEN'] = API_TOKEN
+    return headers
+
+class FheClient:
+    """Async client for the Rust FHE engine.
+
+    Keeps one pooled keep-alive session for the lifetime of the scheduler and
+    bounds the number of evaluations in flight with `slots`: callers acquire a
+    slot before preparing a request and release it once the result is handled.
+    """
+
+    def __init__(self, url=FHE_ENGINE_URL, max_in_flight=FHE_MAX_IN_FLIGHT, timeout_seconds=FHE_REQUEST_TIMEOUT_SECONDS,
+                 batch_url=FHE_ENGINE_BATCH_URL, batch_size=FHE_BATCH_SIZE, register_key_url=FHE_ENGINE_REGISTER_KEY_URL,
+                 wire_format=FHE_WIRE_FORMAT):
+        import aiohttp  # Deferred to construction: app.py imports this module through the scheduler without ever building a client
+        self.url = url
+        self.batch_url = batch_url
+        self.register_key_url = register_key_url
+        self.max_in_flight = max_in_flight
+        self.timeout_seconds = timeout_seconds
+        self.timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.session = None
+        self.max_batch_size = batch_size
+        # Cleared the first time the engine answers the batch endpoint with 404/405
+        self.batch_supported = True
+        # Key digest -> engine handle; cleared the first time /registerKey answers 404/405
+        self.key_handles = {}
+        self.registration_supported = True
+        self._registration_locks = {}
+        # Cleared the first time the engine rejects a msgpack body with 415
+        self.binary_supported = wire_format == "msgpack"
+
+    @property
+    def batch_size(self):
+        """How many strategies callers should group into one evaluate_batch call"""
+        return self.max_batch_size if self.batch_supported else 1
+
+    async def __aenter__(self):
+        import aiohttp
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(connector=connector, headers=auth_headers())
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def key_handle(self, strategy, refresh=False):
+        """Engine handle for the strategy's server key, uploading the key on first use (None if unsupported)"""
+        if not self.registration_supported:
+            return None
+        digest = key_digest(strategy)
+        lock = self._registration_locks.setdefault(digest, asyncio.Lock())
+        async with lock:  # Strategies sharing a key wait for one upload instead of each sending it
+            if refresh:
+                self.key_handles.pop(digest, None)
+            if digest in self.key_handles:
+                return self.key_handles[digest]
+
+            print(f"   -> [FHE Client] Registering server key {digest[:12]}... with the Rust FHE Engine")
+            status, body = await self._post(
+                self.register_key_url, lambda binary: key_fields(strategy, binary=binary), self.timeout
+            )
+            if status in (404, 405):
+                print("   <- [FHE Client] ⚠️  Engine has no key registration, sending keys inline")
+                self.registration_supported = False
+                return None
+            check_status(status, body)
+            self.key_handles[digest] = body["key_handle"]
+            return body["key_handle"]
+
+    async def _post(self, url, build, timeout):
+        """POST build(binary) in the negotiated encoding; returns (status, decoded JSON answer)"""
+        while True:
+            binary = self.binary_supported
+            data, content_type = encode_body(build(binary), binary)
+            async with self.session.post(url, data=data, headers={"Content-Type": content_type}, timeout=timeout) as response:
+                if binary and response.status == 415:
+                    print("   <- [FHE Client] ⚠️  Engine doesn't accept msgpack, falling back to JSON")
+                    self.binary_supported = False
+                    continue
+                try:
+                    body = await response.json(content_type=None) or {}
+                except ValueError:
+                    body = {}
+                return response.status, body
+
+    async def _post_with_key(self, url, strategy, build, timeout):
+        """POST a request that references the strategy's server key, re-uploading it once if the engine lost it"""
+        for attempt in range(2):
+            handle = await self.key_handle(strategy, refresh=attempt > 0)
+            status, body = await self._post(url, lambda binary: build(handle, binary), timeout)
+            if url == self.batch_url and status in (404, 405):
+                return None
+            try:
+                check_status(status, body)
+                return body
+            except UnknownKeyError:
+                print(f"   <- [FHE Client] ⚠️  Engine doesn't know key {key_digest(strategy)[:12]}..., re-uploading")
+        raise UnknownKeyError()
+
+    async def is_condition_met(self, strategy, current_price):
+        """True/False from the FHE engine, or None if the evaluation failed or missed its deadline"""
+        print(f"   -> [FHE Client] Consulting REAL Rust FHE Engine for strategy '{strategy['id']}'...")
+        try:
+            result = await self._post_with_key(
+                self.url, strategy, lambda handle, binary: build_payload(strategy, current_price, handle, binary), self.timeout
+            )
+
+            if result.get("is_triggered", False):
+                print(f"   <- [FHE Client] Response from Rust: Condition MET.")
+                return True
+            else:
+                print(f"   <- [FHE Client] Response from Rust: Condition NOT met.")
+                return False
+        except asyncio.TimeoutError:
+            print(f"   <- [FHE Client] ❌ Deadline exceeded for strategy '{strategy['id']}'")
+            return None
+        except Exception as e:
+            print(f"   <- [FHE Client] ❌ An error occurred: {e}")
+            return None
+
+    async def evaluate_batch(self, strategies, current_price):
+        """Results (True/False/None) for strategies sharing one server key, in request order.
+
+        Uses a single /evaluateBatch request so the engine deserializes the key
+        once; falls back to one /evaluateStrategy call per strategy when the
+        engine doesn't support batching.
+        """
+        if len(strategies) == 1 or not self.batch_supported:
+            return [await self.is_condition_met(strategy, current_price) for strategy in strategies]
+
+        print(f"   -> [FHE Client] Sending batch of {len(strategies)} strategies to the Rust FHE Engine...")
+        try:
+            import aiohttp
+            # The deadline covers every evaluation in the batch
+            timeout = aiohttp.ClientTimeout(total=self.timeout_seconds * len(strategies))
+            result = await self._post_with_key(
+                self.batch_url, strategies[0],
+                lambda handle, binary: build_batch_payload(strategies, current_price, handle, binary), timeout,
+            )
+
+            if result is None:
+                self.batch_supported = False
+                print("   <- [FHE Client] ⚠️  Engine has no batch endpoint, falling back to per-strategy evaluation")
+                return [await self.is_condition_met(strategy, current_price) for strategy in strategies]
+
+            results = result.get("results", [])
+            if len(results) != len(strategies):
+                raise ValueError(f"expected {len(strategies)} results, got {len(results)}")
+            print(f"   <- [FHE Client] Batch response from Rust: {sum(1 for r in results if r)} of {len(results)} MET.")
+            return [None if r is None else bool(r) for r in results]
+        except asyncio.TimeoutError:
+            print(f"   <- [FHE Client] ❌ Deadline exceeded for batch of {len(strategies)} strategies")
+            return [None] * len(strategies)
+        except Exception as e:
+            print(f"   <- [FHE Client] ❌ Batch evaluation failed: {e}")
+            return [None] * len(strategies)
@@ -0,0 +1,295 @@
+"""
+Strategy Ingest
+Turns a /createStrategy payload into a Strategy row. Validation is cheap and
+always runs in the request. Encoding (compressing and encrypting the
+multi-MB server key and ciphertexts) and the insert happen either inline
+(INGEST_MODE=sync) or in a process pool (INGEST_MODE=async). In async mode
+the request only spools the raw body to disk and answers 202.
+
+Spool files are written atomically (tmp + fsync + rename), so an accepted
+strategy survives a crash: prestart replays whatever is left in the spool.
+The body holds the server key and client ciphertexts, so it is sealed like
+the blob columns (an encrypted BlobEnvelope) and readable by this user only.
+"""
+import io
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from config import PYTH_PRICE_FEED_IDS, INGEST_SPOOL_DIR, INGEST_WORKERS, INGEST_MAX_ATTEMPTS, INGEST_RETRY_BACKOFF_SECONDS
+from database import db, Strategy
+from encryption import blob_envelope
+from oracle import normalize_feed_id
+from trade_executor import build_swap_template, TradeRejected
+
+REQUIRED_FIELDS = ('user_id', 'asset_in', 'asset_out', 'amount', 'recipient_address')
+
+class InvalidStrategy(ValueError):
+    """The payload can't become a strategy; reported to the client as 400"""
+
+def validate_payload(data):
+    """Check a payload and precompile its swap; returns the swap template (None without a proof)"""
+    missing = [field for field in REQUIRED_FIELDS if data.get(field) in (None, '')]
+    if missing:
+        raise InvalidStrategy(f"Missing fields: {', '.join(missing)}")
+
+    # Validate the trade and precompile its calldata now, so a trigger only has to sign and send
+    zkp_data = data.get('zkp_data') or data.get('zk_proof')
+    if not zkp_data:
+        return None
+    try:
+        return build_swap_template({
+            'zkp_data': zkp_data,
+            'asset_out': data['asset_out'],
+            'recipient_address': data['recipient_address'],
+            'pool_address': data.get('pool_address'),
+        })
+    except TradeRejected as e:
+        raise InvalidStrategy(f"Invalid trade: {e}")
+
+def new_strategy(data, swap_template, strategy_id=None):
+    """Strategy row for a validated payload (blobs are compressed and encrypted when it is flushed)"""
+    strategy_type = data.get("strategy_type", "")
+    token_symbol = data.get('asset_in') if "LONG" in strategy_type or "SELL" in strategy_type else data.get('asset_out')
+    price_feed_id = normalize_feed_id(data.get('price_feed_id') or PYTH_PRICE_FEED_IDS.get(token_symbol))
+    zkp_data = data.get('zkp_data') or data.get('zk_proof')
+
+    return Strategy(
+        id=strategy_id,
+        user_id=data['user_id'],
+        strategy_type=strategy_type,
+        asset_in=data['asset_in'],
+        asset_out=data['asset_out'],
+        amount=data['amount'],
+        price_feed_id=price_feed_id,
+        recipient_address=data['recipient_address'],
+        pool_address=data.get('pool_address'),
+        encrypted_upper_bound=json.dumps(data.get('encrypted_upper_bound')),
+        encrypted_lower_bound=json.dumps(data.get('encrypted_lower_bound')),
+        server_key=json.dumps(data.get('server_key')),  # Will be compressed + encrypted
+        encrypted_client_key=json.dumps(data.get('encrypted_client_key')) if data.get('encrypted_client_key') else None,  # Optional - None if using MPC shares
+        mpc_public_key_set=data.get('mpc_public_key_set'),
+        mpc_share_indices=json.dumps(data.get('mpc_share_indices')) if data.get('mpc_share_indices') else None,
+        fhe_key_id=data.get('fhe_key_id'),  # Key ID when shares stored on MPC
+        zkp_data=json.dumps(zkp_data) if zkp_data else None,
+        swap_template=json.dumps(swap_template) if swap_template else None
+    )
+
+# --- Bulk (NDJSON) ---
+READ_BUFFER_BYTES = 1024 * 1024
+
+def iter_ndjson(stream, max_line_bytes):
+    """(line number, raw line) for each non-blank line of a stream, reading one line at a time.
+    Lines longer than max_line_bytes are skipped to their end and yielded as None."""
+    if isinstance(stream, io.RawIOBase):
+        # Raw streams (werkzeug's LimitedStream) read lines a byte at a time
+        stream = io.BufferedReader(stream, READ_BUFFER_BYTES)
+    line_no = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        line_no += 1
+        if len(line) > max_line_bytes and not line.endswith(b'\n'):
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_line_bytes + 1)
+            yield line_no, None
+        elif line.strip():
+            yield line_no, line
+
+def commit_batch(batch, results):
+    """Insert a batch of (line, strategy id, data, swap template) in one transaction.
+    If it fails, retry row by row so only the bad lines are reported."""
+    try:
+        for _, strategy_id, data, swap_template in batch:
+            db.session.add(new_strategy(data, swap_template, strategy_id))
+        db.session.commit()
+        results.extend({"line": line_no, "strategy_id": strategy_id} for line_no, strategy_id, _, _ in batch)
+        return
+    except Exception as e:
+        db.session.rollback()
+        if len(batch) == 1:
+            # The driver's message only: the full statement would echo the row's parameters
+            results.append({"line": batch[0][0], "error": f"Insert failed: {getattr(e, 'orig', e)}"})
+            return
+    for row in batch:
+        commit_batch([row], results)
+
+def ingest_ndjson(stream, batch_size, max_batch_bytes, max_line_bytes):
+    """Validate, encode and insert one strategy per NDJSON line, committing every `batch_size`
+    rows or `max_batch_bytes` of input; returns per-line results in line order"""
+    results = []
+    batch = []
+    batch_bytes = 0
+    for line_no, line in iter_ndjson(stream, max_line_bytes):
+        if line is None:
+            results.append({"line": line_no, "error": f"Line longer than {max_line_bytes} bytes"})
+            continue
+        try:
+            data = json.loads(line)
+            if not isinstance(data, dict):
+                raise InvalidStrategy("Expected a JSON object")
+            swap_template = validate_payload(data)
+        except (ValueError, InvalidStrategy) as e:  # json.JSONDecodeError is a ValueError
+            results.append({"line": line_no, "error": str(e)})
+            continue
+
+        batch.append((line_no, str(uuid.uuid4()), data, swap_template))
+        batch_bytes += len(line)
+        del data, line  # Only the batch keeps payloads alive
+        if len(batch) >= batch_size or batch_bytes >= max_batch_bytes:
+            commit_batch(batch, results)
+            batch, batch_bytes = [], 0
+    if batch:
+        commit_batch(batch, results)
+    results.sort(key=lambda result: result["line"])
+    return results
+
+# --- Spool ---
+# <id>.json holds an accepted payload until its row is committed; <id>.rejected
+# holds the error for one that was invalid or couldn't be inserted, for the status endpoint.
+
+def spool_path(strategy_id, suffix='.json'):
+    return os.path.join(INGEST_SPOOL_DIR, strategy_id + suffix)
+
+def spool_payload(strategy_id, body):
+    """Durably store a request body, sealed, before the request is acknowledged"""
+    os.makedirs(INGEST_SPOOL_DIR, mode=0o700, exist_ok=True)
+    path = spool_path(strategy_id)
+    tmp_path = path + '.tmp'
+    sealed = blob_envelope.seal(body.decode(), encrypt=True, context=f"spool/{strategy_id}".encode())
+    with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+        f.write(sealed)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    dir_fd = os.open(INGEST_SPOOL_DIR, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)  # Make the rename itself durable
+    finally:
+        os.close(dir_fd)
+    return path
+
+def read_spooled(strategy_id):
+    """Payload of a spooled strategy; files spooled before sealing hold the plain body"""
+    with open(spool_path(strategy_id), 'rb') as f:
+        raw = f.read()
+    if blob_envelope.is_envelope(raw):
+        raw = blob_envelope.open(raw, context=f"spool/{strategy_id}".encode())
+    return json.loads(raw)
+
+def spool_status(strategy_id):
+    """("INGESTING", None) while spooled, ("REJECTED", error) if the pool rejected it, else None"""
+    if os.path.exists(spool_path(strategy_id)):
+        return "INGESTING", None
+    try:
+        with open(spool_path(strategy_id, '.rejected')) as f:
+            return "REJECTED", f.read()
+    except FileNotFoundError:
+        return None
+
+def reject_spooled(strategy_id, error):
+    """Replace a spooled strategy with its .rejected marker"""
+    with open(spool_path(strategy_id, '.rejected'), 'w') as f:
+        f.write(error)
+    os.remove(spool_path(strategy_id))
+    return "rejected"
+
+def ingest_spooled(strategy_id):
+    """Encode and insert one spooled strategy, then drop its spool file; returns the outcome.
+    Failed inserts are retried with backoff, and rejected after INGEST_MAX_ATTEMPTS."""
+    path = spool_path(strategy_id)
+    try:
+        data = read_spooled(strategy_id)
+    except FileNotFoundError:
+        return "gone"  # Another process (or an earlier replay) already ingested it
+
+    for attempt in range(1, INGEST_MAX_ATTEMPTS + 1):
+        try:
+            # Checked each time: a failed commit may still have landed, or another process got there first
+            if db.session.get(Strategy, strategy_id) is None:
+                swap_template = validate_payload(data)
+                db.session.add(new_strategy(data, swap_template, strategy_id))
+                db.session.commit()
+            break
+        except InvalidStrategy as e:
+            db.session.rollback()
+            return reject_spooled(strategy_id, str(e))
+        except Exception as e:
+            db.session.rollback()
+            error = getattr(e, 'orig', e)  # The driver's message only, not the statement and its parameters
+            if attempt == INGEST_MAX_ATTEMPTS:
+                return reject_spooled(strategy_id, f"Insert failed after {attempt} attempts: {error}")
+            delay = INGEST_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            print(f"[Ingest] ⚠️  Strategy {strategy_id} attempt {attempt} failed ({error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+    # Committed (now or by an earlier attempt that crashed before cleanup)
+    os.remove(path)
+    return "ingested"
+
+def replay_spool():
+    """Ingest everything left in the spool, e.g. after a crash; run before workers start"""
+    if not os.path.isdir(INGEST_SPOOL_DIR):
+        print("✅ Ingest spool: nothing to replay")
+        return
+    strategy_ids = [name[:-len('.json')] for name in sorted(os.listdir(INGEST_SPOOL_DIR)) if name.endswith('.json')]
+    from app import app
+    with app.app_context():
+        for strategy_id in strategy_ids:
+            try:
+                print(f"   {strategy_id}: {ingest_spooled(strategy_id)}")
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️  {strategy_id}: replay failed, left in the spool: {e}")
+    print(f"✅ Ingest spool: {len(strategy_ids)} replayed")
+
+# --- Process pool ---
+_app = None
+
+def _init_worker():
+    global _app
+    import config
+    config.EMBEDDED_SCHEDULER = False  # Pool workers only ingest
+    from app import app
+    _app = app
+
+def _ingest_in_worker(strategy_id):
+    with _app.app_context():
+        try:
+            return ingest_spooled(strategy_id)
+        finally:
+            db.session.remove()
+
+_pool = None
+_pool_lock = Lock()
+
+def _get_pool(broken=None):
+    """The shared pool, replaced if it is the `broken` one (a worker died)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool is broken:
+            import multiprocessing
+            # spawn: forking the web process would copy its threads and open database connections
+            _pool = ProcessPoolExecutor(INGEST_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+        return _pool
+
+def _report(strategy_id):
+    def done(future):
+        try:
+            print(f"[Ingest] Strategy {strategy_id}: {future.result()}")
+        except Exception as e:
+            print(f"[Ingest] ❌ Strategy {strategy_id} failed in the pool, left in the spool for replay: {e}")
+    return done
+
+def submit(strategy_id):
+    """Queue a spooled strategy for encoding and insertion in the process pool"""
+    pool = _get_pool()
+    try:
+        future = pool.submit(_ingest_in_worker, strategy_id)
+    except BrokenProcessPool:
+        future = _get_pool(broken=pool).submit(_ingest_in_worker, strategy_id)
+    future.add_done_callback(_report(strategy_id))
+    return future
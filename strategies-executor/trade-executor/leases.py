@@ -0,0 +1,43 @@
+"""
+Work Leases
+Lets any number of scheduler processes (threads of web workers, or standalone
+run_scheduler.py processes on other hosts) share the strategy book. A process
+claims strategies before evaluating or sending them, keeps its leases alive
+while it works, and releases them when done. A strategy whose process died
+becomes claimable again once its lease expires.
+"""
+import asyncio
+import os
+import socket
+import uuid
+from database import claim_strategies, renew_leases, release_leases
+from config import LEASE_TTL_SECONDS, LEASE_RENEW_INTERVAL_SECONDS
+
+# Random part keeps owners unique across container restarts that reuse a hostname and pid
+_INSTANCE = uuid.uuid4().hex[:8]
+
+def owner_id():
+    """This process's lease owner name (pid read each time, so forked workers differ)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{_INSTANCE}"
+
+def claim(strategy_ids):
+    """Ids from `strategy_ids` this process now holds; the rest belong to other processes"""
+    if not strategy_ids:
+        return set()
+    return claim_strategies(strategy_ids, owner_id(), LEASE_TTL_SECONDS)
+
+def release(strategy_ids, hold_seconds=0):
+    """Hand leases back; no process claims the strategies again for `hold_seconds`"""
+    if strategy_ids:
+        release_leases(strategy_ids, owner_id(), hold_seconds)
+
+async def keep_alive(app):
+    """Background loop: renew this process's leases every LEASE_RENEW_INTERVAL_SECONDS"""
+    while True:
+        await asyncio.sleep(LEASE_RENEW_INTERVAL_SECONDS)
+        try:
+            with app.app_context():
+                # Its own thread, not the database thread: renewals mustn't queue behind a busy scheduler
+                await asyncio.to_thread(renew_leases, owner_id(), LEASE_TTL_SECONDS)
+        except Exception as e:
+            print(f"[Leases] Renewal error: {e}")
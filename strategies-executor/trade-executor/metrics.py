@@ -0,0 +1,204 @@
+"""
+Metrics
+Counters, gauges and histograms for each stage of the pipeline (cycle, oracle,
+blob decode, FHE evaluation, trigger, transaction), rendered in the Prometheus
+text format by GET /metrics, and by run_scheduler.py on METRICS_PORT. Values
+belong to this process, and nothing aggregates them across processes: scrape
+a standalone scheduler on its METRICS_PORT, or the web app only when it runs a
+single worker (WEB_WORKERS=1), since otherwise each scrape reads whichever
+worker answers.
+
+    with FHE_EVALUATION_SECONDS.time(strategy_type=strategy_type_label(strategy_type)):
+        ...
+    TRIGGERS.inc(strategy_type=strategy_type_label(strategy_type))
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from pruning import UPPER_BOUND_TYPES, LOWER_BOUND_TYPES, DUAL_BOUND_TYPES
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Every metric in this process, in registration order (the order they are rendered in)
+_registry = []
+_lock = Lock()
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Values of strategy_type labels. Strategy types come from clients, and every new label value starts new series,
+# so anything the evaluator doesn't know is counted as "other".
+STRATEGY_TYPES = UPPER_BOUND_TYPES | LOWER_BOUND_TYPES | DUAL_BOUND_TYPES
+
+def strategy_type_label(strategy_type):
+    return strategy_type if strategy_type in STRATEGY_TYPES else "other"
+
+def format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+class Metric:
+    """A named family of values, one per combination of label values"""
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}  # label values -> value
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        """(name suffix, [(label, value)], value) for every series"""
+        return [("", list(zip(self.label_names, key)), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {escape(self.help)}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, pairs, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(pairs)} {format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))  # Upper bounds; +Inf is implied
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]  # Counts per bucket, sum, count
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        for key, (counts, total, count) in self._values.items():
+            pairs = list(zip(self.label_names, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", pairs + [("le", format_value(float(bound)))], cumulative))
+            samples.append(("_sum", pairs, total))
+            samples.append(("_count", pairs, count))
+        return samples
+
+def render():
+    """Every metric in the Prometheus text exposition format"""
+    with _lock:
+        lines = [line for metric in _registry for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+def serve(port):
+    """Serve /metrics on `port` from a daemon thread (for processes without the web app)"""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # Scrapes every few seconds would drown the log
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[Metrics] Serving /metrics on port {port}")
+    return server
+
+# --- Scheduler ---
+CYCLE_SECONDS = Histogram(
+    "trade_executor_cycle_duration_seconds", "Time from the start of a cycle until its last evaluation is handled",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60, 120, 300),
+)
+CYCLES = Counter("trade_executor_cycles_total", "Scheduler cycles by outcome", ["outcome"])
+PENDING_STRATEGIES = Gauge("trade_executor_pending_strategies", "PENDING strategies at the start of the last cycle")
+LAST_CYCLE_TIMESTAMP = Gauge("trade_executor_last_cycle_timestamp_seconds", "Unix time the last cycle finished")
+
+# --- Oracle ---
+ORACLE_REQUEST_SECONDS = Histogram(
+    "trade_executor_oracle_request_duration_seconds", "Hermes latest_price_feeds requests that completed or failed",
+    ["endpoint"], buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+ORACLE_FAILURES = Counter(
+    "trade_executor_oracle_failures_total", "Hermes requests that failed (error) or were unanswered at the deadline (timeout), and unusable quotes (rejected)",
+    ["endpoint", "reason"],
+)
+
+# --- Evaluation ---
+BLOB_DECODE_SECONDS = Histogram(
+    "trade_executor_blob_decode_duration_seconds", "Loading a strategy's payloads for evaluation or sending, cache hits included",
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+FHE_EVALUATION_SECONDS = Histogram(
+    "trade_executor_fhe_evaluation_duration_seconds", "Time each strategy waited for its FHE engine result",
+    ["strategy_type"], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+FHE_BATCH_SIZE = Histogram(
+    "trade_executor_fhe_batch_size", "Strategies per FHE engine request", buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+FHE_EVALUATIONS = Counter(
+    "trade_executor_fhe_evaluations_total", "FHE evaluations by result (triggered, not_triggered, failed)",
+    ["strategy_type", "result"],
+)
+TRIGGERS = Counter("trade_executor_triggers_total", "Strategies moved from PENDING to TRIGGERED", ["strategy_type"])
+
+# --- Execution ---
+TX_STAGE_SECONDS = Histogram(
+    "trade_executor_transaction_stage_duration_seconds", "Swap transactions by stage (build, gas, sign, broadcast)",
+    ["stage"], buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+EXECUTIONS = Counter(
+    "trade_executor_executions_total", "Execution outcomes (submitted, confirmed, retried, failed)", ["outcome"],
+)
@@ -0,0 +1,106 @@
+"""
+Migration script for the binary blob envelope
+Re-encodes large columns still in the legacy gzip + base64 (+ Fernet) text
+format into the versioned binary envelope (see encryption.BlobEnvelope), and
+reseals encrypted envelopes of older versions so they are bound to their column.
+
+Rows are streamed a page at a time, and each value is only replaced if it
+still holds the legacy bytes that were read, so the converter can run while
+the service keeps reading and writing. Already converted rows are skipped in
+SQL, so re-running it is cheap.
+"""
+import argparse
+from sqlalchemy import LargeBinary, and_, func, literal, or_, select, type_coerce, update
+from database import db, CompressedEncryptedText, CompressedText, ServerKey, Strategy, StrategyBlob
+from encryption import BlobEnvelope
+
+BATCH_SIZE = 10
+
+def envelope_columns(table):
+    return [column for column in table.columns if isinstance(column.type, (CompressedEncryptedText, CompressedText))]
+
+def current_prefix(column):
+    """Leading bytes of a value already in the current format: an envelope, and for an encrypted column
+    one of this version (older ones weren't bound to their column)"""
+    if isinstance(column.type, CompressedEncryptedText):
+        return BlobEnvelope.MAGIC + bytes((BlobEnvelope.VERSION,))
+    return BlobEnvelope.MAGIC
+
+def is_legacy(column):
+    """SQL condition: the column holds a value that isn't in the current format yet"""
+    raw = type_coerce(column, LargeBinary)
+    prefix = current_prefix(column)
+    return and_(raw.isnot(None), func.substr(raw, 1, len(prefix)) != literal(prefix, LargeBinary))
+
+def convert_table(table, batch_size, dry_run=False):
+    """Convert every legacy value in `table`; returns (values converted, bytes before, bytes after)"""
+    pk = table.primary_key.columns.values()[0]
+    columns = envelope_columns(table)
+    prefixes = [current_prefix(column) for column in columns]
+    raw_columns = [type_coerce(column, LargeBinary) for column in columns]
+    dialect = db.engine.dialect
+    converted = bytes_before = bytes_after = 0
+    last_pk = None
+
+    while True:
+        query = select(pk, *raw_columns).where(or_(*[is_legacy(column) for column in columns])).order_by(pk).limit(batch_size)
+        if last_pk is not None:
+            query = query.where(pk > last_pk)
+        with db.engine.connect() as conn:
+            page = conn.execute(query).all()
+        if not page:
+            break
+        last_pk = page[-1][0]
+
+        with db.engine.begin() as conn:
+            for row in page:
+                for column, prefix, raw in zip(columns, prefixes, row[1:]):
+                    if raw is None or bytes(raw[:len(prefix)]) == prefix:
+                        continue
+                    value = column.type.process_result_value(raw, dialect)
+                    sealed = column.type.process_bind_param(value, dialect)
+                    converted += 1
+                    bytes_before += len(raw)
+                    bytes_after += len(sealed)
+                    if dry_run:
+                        continue
+                    values = {column.name: literal(sealed, LargeBinary)}
+                    if 'updated_at' in table.c:
+                        # Same logical value, so cached decodes keyed by the row version stay valid
+                        values['updated_at'] = table.c.updated_at
+                    # Compare-and-swap: skip the value if a writer replaced it since we read it
+                    conn.execute(
+                        update(table)
+                        .where(pk == row[0], type_coerce(column, LargeBinary) == literal(raw, LargeBinary))
+                        .values(**values)
+                    )
+        print(f"  {table.name}: {converted} values converted so far")
+
+    return converted, bytes_before, bytes_after
+
+def migrate_blob_envelope(batch_size=BATCH_SIZE, dry_run=False):
+    from app import app  # Here, so convert_table can run (and be tested) in any app context
+    with app.app_context():
+        for table in (ServerKey.__table__, Strategy.__table__, StrategyBlob.__table__):
+            converted, before, after = convert_table(table, batch_size, dry_run)
+            if converted:
+                saved = 100 * (1 - after / before) if before else 0
+                print(f"✅ {table.name}: {converted} values, {before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB ({saved:.0f}% smaller)")
+            else:
+                print(f"✅ {table.name}: nothing to convert")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert legacy encoded blob columns to the binary envelope format")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows read and rewritten per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Migration: Binary blob envelope")
+    print("=" * 60)
+    print()
+
+    migrate_blob_envelope(args.batch_size, args.dry_run)
+
+    print()
+    print("✅ Migration script complete!")
@@ -2,6 +2,10 @@
 Database Migration Script
 Migrates existing database to use compression and encryption
 Also optimizes database size
+
+Schema changes (new tables, columns and indexes) are applied on every start.
+Re-encoding every strategy and the full VACUUM run once per data format
+version, recorded in SQLite's user_version, so a normal restart skips them.
 """
 import os
 import sys
@@ -9,9 +13,54 @@ from app import app, db
 from database import Strategy
 from encryption import db_encryption, data_compression
 import json
-from sqlalchemy import text
+from sqlalchemy import text, inspect
 from datetime import datetime
 
+def add_missing_columns():
+    """Add columns (and their indexes) that exist on the models but not yet in the database tables"""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=db.engine.dialect)}"
+            if column.default is not None and column.default.is_scalar:
+                ddl += f" DEFAULT {column.default.arg!r}"
+            db.session.execute(text(ddl))
+            print(f"➕ Added column {table.name}.{column.name}")
+        db.session.commit()
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+# Indexes whose definition changed under a new name; the old ones would only slow down writes
+REPLACED_INDEXES = ('ix_strategy_unarchived',)  # Now ix_strategy_unarchived_terminal, which covers EXECUTED rows
+
+def drop_replaced_indexes():
+    for name in REPLACED_INDEXES:
+        db.session.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    db.session.commit()
+
+# Bump when existing rows must be re-encoded (and the file vacuumed) once more; stored as PRAGMA user_version
+DATA_FORMAT_VERSION = 1
+# Rows sampled per index by the ANALYZE of a normal restart (SQLite's approximate ANALYZE)
+RESTART_ANALYSIS_LIMIT = 1000
+
+def data_format_version():
+    return db.session.execute(text("PRAGMA user_version")).scalar()
+
+def set_data_format_version(version):
+    db.session.execute(text(f"PRAGMA user_version = {int(version)}"))
+    db.session.commit()
+
+def refresh_statistics():
+    """Cheap planner statistics, so indexes added since the last full ANALYZE are used"""
+    db.session.execute(text(f"PRAGMA analysis_limit = {RESTART_ANALYSIS_LIMIT}"))
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
 def migrate_database():
     """Migrate existing database to new compressed/encrypted format"""
     with app.app_context():
@@ -26,15 +75,23 @@ def migrate_database():
             print(f"📁 Ensured instance directory exists: {instance_dir}")
         
         try:
-            # Create tables if they don't exist
+            # Create tables if they don't exist, and add columns introduced since the last run
             db.create_all()
-            
+            add_missing_columns()
+            drop_replaced_indexes()
+
+            if data_format_version() >= DATA_FORMAT_VERSION:
+                refresh_statistics()
+                print(f"✅ Data format version {DATA_FORMAT_VERSION} already applied, nothing to re-encode")
+                return
+
             # Get all strategies
             strategies = Strategy.query.all()
             total = len(strategies)
             print(f"📊 Found {total} strategies to migrate")
             
             if total == 0:
+                set_data_format_version(DATA_FORMAT_VERSION)
                 print("✅ No strategies to migrate")
                 return
         except Exception as e:
@@ -98,10 +155,15 @@ def migrate_database():
         try:
             # Vacuum SQLite database to reclaim space
             db.session.execute(text("VACUUM"))
+            # Refresh the planner's statistics; without them SQLite pages through pending strategies via
+            # ix_strategy_status and a sort instead of the partial ix_strategy_pending index
+            db.session.execute(text("ANALYZE"))
             db.session.commit()
             print("✅ Database optimized")
         except Exception as e:
             print(f"⚠️  Could not optimize database: {e}")
+        if not errors:
+            set_data_format_version(DATA_FORMAT_VERSION)  # Rows that failed are retried on the next start
 
 def check_database_size():
     """Check database size before and after migration"""
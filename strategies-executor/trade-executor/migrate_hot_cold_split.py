@@ -0,0 +1,123 @@
+"""
+Migration script for the hot/cold strategy split
+Moves the large payload columns (server_key, encrypted_client_key, the
+bounds, zkp_data, swap_template) out of `strategy` into `strategy_blob`,
+then rebuilds `strategy` without them so scheduler scans only read small
+rows, and reclaims the freed pages.
+"""
+import os
+import sqlite3
+from sqlalchemy import text
+from app import app, db
+from database import Strategy, StrategyBlob
+from migrate_database import add_missing_columns
+
+# Physical column names of the payloads, in `strategy` before the split and in `strategy_blob` after it
+COLD_COLUMNS = [column.name for column in StrategyBlob.__table__.columns if column.name != 'strategy_id']
+
+def split_strategy_table(db_path):
+    """Copy the payload columns into strategy_blob and recreate the strategy table without them;
+    returns whether anything was moved"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("PRAGMA table_info(strategy)")
+        column_names = [col[1] for col in cursor.fetchall()]
+
+        if not column_names:
+            print("   No strategy table yet, creating schema...")
+            db.create_all()
+            return False
+
+        cold = [name for name in COLD_COLUMNS if name in column_names]
+        if not cold:
+            print("✅ strategy payloads already live in strategy_blob")
+            db.create_all()  # Make sure the strategy_blob table exists
+            add_missing_columns()
+            return False
+
+        print(f"📋 Moving {', '.join(cold)} into strategy_blob...")
+        db.create_all()
+
+        # Rows copied by an interrupted earlier run are kept as they are
+        cold_list = ','.join(cold)
+        cursor.execute(f'''
+            INSERT INTO strategy_blob (strategy_id, {cold_list})
+            SELECT id, {cold_list} FROM strategy
+            WHERE id NOT IN (SELECT strategy_id FROM strategy_blob)
+        ''')
+        print(f"   {cursor.rowcount} payload rows copied")
+        conn.commit()
+
+        # SQLite can't DROP a column with a NOT NULL constraint, so copy the small columns aside and
+        # recreate the table. The payloads are already committed to strategy_blob, so the backup skips them.
+        print("📋 Rebuilding strategy table without the payload columns...")
+        hot = [name for name in column_names if name not in cold]
+        hot_list = ','.join(hot)
+        cursor.execute("DROP TABLE IF EXISTS strategy_backup")
+        cursor.execute(f"CREATE TABLE strategy_backup AS SELECT {hot_list} FROM strategy")
+        cursor.execute("DROP TABLE strategy")
+        conn.commit()
+
+        db.create_all()
+
+        model_columns = set(Strategy.__table__.columns.keys())
+        column_list = ','.join(name for name in hot if name in model_columns)
+        cursor.execute(f"INSERT INTO strategy ({column_list}) SELECT {column_list} FROM strategy_backup")
+        cursor.execute("DROP TABLE strategy_backup")
+        conn.commit()
+        add_missing_columns()
+        print("✅ strategy table rebuilt")
+        return True
+
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Split failed: {e}")
+        print("   Attempting to restore from backup...")
+        try:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='strategy_backup'")
+            if cursor.fetchone():
+                cursor.execute("DROP TABLE IF EXISTS strategy")
+                cursor.execute("ALTER TABLE strategy_backup RENAME TO strategy")
+                conn.commit()
+                print("✅ Restored from backup (payloads are in strategy_blob)")
+        except Exception as restore_error:
+            print(f"❌ Could not restore from backup: {restore_error}")
+        raise
+    finally:
+        conn.close()
+
+def migrate_hot_cold_split():
+    with app.app_context():
+        db_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '').split('?')[0]
+
+        if not os.path.exists(db_path):
+            print(f"⚠️  Database file not found: {db_path}")
+            print("   Creating new database with the split schema...")
+            db.create_all()
+            return
+
+        print(f"🔄 Migrating database: {db_path}")
+        if not split_strategy_table(db_path):
+            return
+
+        # The dropped payload pages are free but still in the file until it is vacuumed
+        print("🔧 Reclaiming space...")
+        try:
+            db.session.execute(text("VACUUM"))
+            db.session.commit()
+            print("✅ Database optimized")
+        except Exception as e:
+            print(f"⚠️  Could not optimize database: {e}")
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Migration: Hot/cold strategy split")
+    print("=" * 60)
+    print()
+
+    migrate_hot_cold_split()
+
+    print()
+    print("✅ Migration script complete!")
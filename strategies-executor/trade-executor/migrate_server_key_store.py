@@ -0,0 +1,73 @@
+"""
+Migration script for the content-addressed server key store
+Moves per-strategy copies of server_key into the shared `server_key` table,
+so each distinct key is stored (and decrypted/decompressed) only once
+"""
+import os
+from sqlalchemy import func, select, update
+from app import app, db
+from database import Strategy, ServerKey
+from migrate_hot_cold_split import split_strategy_table
+
+BATCH_SIZE = 10
+
+def move_keys_to_store():
+    """Intern every inline server_key and clear the per-strategy copy"""
+    query = Strategy.query.join(Strategy.blob_row).filter(
+        Strategy.server_key_digest.is_(None),
+        Strategy.inline_server_key.isnot(None),
+    )
+    total = query.count()
+    print(f"📊 Found {total} strategies with inline server keys")
+
+    moved = 0
+    while True:
+        batch = query.limit(BATCH_SIZE).all()
+        if not batch:
+            break
+        for strategy in batch:
+            strategy.server_key = strategy.inline_server_key
+            moved += 1
+        db.session.commit()
+        print(f"  Progress: {moved}/{total}")
+
+    print(f"✅ Moved {moved} server keys into the key store")
+
+def recount_server_keys():
+    """Set every key's refcount to the number of strategies referencing it. Older releases undercounted
+    keys shared by strategies committed together, and compaction deletes keys whose count reaches zero."""
+    keys, strategies = ServerKey.__table__, Strategy.__table__
+    references = (
+        select(func.count()).where(strategies.c.server_key_digest == keys.c.digest).scalar_subquery()
+    )
+    with db.engine.begin() as conn:
+        fixed = conn.execute(update(keys).where(keys.c.refcount != references).values(refcount=references)).rowcount
+    if fixed:
+        print(f"🔧 Corrected the refcount of {fixed} server keys")
+
+def migrate_server_key_store():
+    with app.app_context():
+        db_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '').split('?')[0]
+
+        if not os.path.exists(db_path):
+            print(f"⚠️  Database file not found: {db_path}")
+            print("   Creating new database with the key store schema...")
+            db.create_all()
+            return
+
+        print(f"🔄 Migrating database: {db_path}")
+        # Rebuilding the strategy table in the current schema also adds server_key_digest
+        split_strategy_table(db_path)
+        move_keys_to_store()
+        recount_server_keys()
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Migration: Content-addressed server key store")
+    print("=" * 60)
+    print()
+
+    migrate_server_key_store()
+
+    print()
+    print("✅ Migration script complete!")
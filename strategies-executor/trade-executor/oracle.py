@@ -1,27 +1,165 @@
-import requests
-from config import PYTH_HERMES_URL
-
-def get_live_prices(price_feed_ids):
-    price_data = {}
-    if not price_feed_ids: return {}
-    try:
-        ids_query = "&".join([f"ids[]={id}" for id in price_feed_ids])
-        url = f"{PYTH_HERMES_URL}/api/latest_price_feeds?{ids_query}"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        
-        for feed in data:
-            feed_id_from_api = feed.get("id")
-            if feed_id_from_api:
-                price_info = feed.get("price", {})
-                price_val = int(price_info.get("price", 0))
-                expo = int(price_info.get("expo", 0))
-                full_feed_id = "0x" + feed_id_from_api
-                price_data[full_feed_id] = price_val * (10 ** expo)
-        
-        print(f"[Oracle] Fetched prices from Pyth: {price_data}")
-        return price_data
-    except Exception as e:
-        print(f"[Oracle] Warning: Pyth Oracle failed: {e}.")
-        return {}
\ No newline at end of file
+"""
+Oracle
+Pyth prices for the scheduler. OracleClient asks the first Hermes endpoint in
+PYTH_HERMES_URLS and, if it hasn't answered well within the hedge delay (or
+has failed), the next one too; the first usable answer for each feed wins and
+the slower requests are cancelled. A quote is usable when it is recent and its
+confidence interval is narrow. The last usable quote per feed is kept, and
+served with its age, while every endpoint is failing and it is still recent.
+"""
+import asyncio
+import time
+from collections import namedtuple
+from urllib.parse import urlencode
+from config import (
+    PYTH_HERMES_URLS, ORACLE_TIMEOUT_SECONDS, ORACLE_HEDGE_DELAY_SECONDS, ORACLE_MAX_PRICE_AGE_SECONDS,
+    ORACLE_MAX_CONFIDENCE_RATIO,
+)
+import metrics
+
+def normalize_feed_id(feed_id):
+    """Canonical form of a Pyth feed id ('0x' + lowercase hex), as used for quote keys"""
+    if not feed_id:
+        return feed_id
+    feed_id = feed_id.strip().lower()
+    return feed_id if feed_id.startswith("0x") else "0x" + feed_id
+
+class Quote(namedtuple("Quote", "price conf publish_time cached")):
+    """A price with its confidence interval, Hermes publish time (unix seconds), and whether it came from the cache"""
+    __slots__ = ()
+
+    @property
+    def age(self):
+        return time.time() - self.publish_time
+
+def parse_quote(feed):
+    """(feed id, Quote) from a Hermes price feed object (same shape in latest_price_feeds and stream updates)"""
+    price_info = feed.get("price", {})
+    scale = 10 ** int(price_info.get("expo", 0))
+    return normalize_feed_id(feed["id"]), Quote(
+        int(price_info.get("price", 0)) * scale,
+        int(price_info.get("conf", 0)) * scale,
+        int(price_info.get("publish_time", 0)),
+        False,
+    )
+
+def quote_problem(quote):
+    """Why a quote can't be traded on, or None if it can"""
+    if quote.price <= 0:
+        return f"non-positive price {quote.price}"
+    if quote.age > ORACLE_MAX_PRICE_AGE_SECONDS:
+        return f"stale ({quote.age:.0f}s old)"
+    if quote.conf > quote.price * ORACLE_MAX_CONFIDENCE_RATIO:
+        return f"confidence interval too wide (±{quote.conf / quote.price:.2%})"
+    return None
+
+class OracleClient:
+    """Async Hermes client with hedged requests, quote checks and a last-good cache; use as `async with`"""
+
+    def __init__(self, urls=PYTH_HERMES_URLS, timeout_seconds=ORACLE_TIMEOUT_SECONDS,
+                 hedge_delay_seconds=ORACLE_HEDGE_DELAY_SECONDS):
+        import aiohttp  # Here, not at the top: request handlers import this module for normalize_feed_id and never build a client
+        self.urls = list(urls)
+        self.timeout_seconds = timeout_seconds
+        self.timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+        self.hedge_delay_seconds = hedge_delay_seconds
+        self.session = None
+        self.last_good = {}  # Feed id -> last usable Quote
+        self.counters = {"requests": 0, "hedged": 0, "errors": 0, "rejected": 0, "cache_hits": 0}
+
+    async def __aenter__(self):
+        import aiohttp
+        self.session = aiohttp.ClientSession()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def stats(self):
+        """Requests, hedged requests, errors, rejected quotes and cache hits so far"""
+        return dict(self.counters)
+
+    async def _fetch(self, url, feed_ids):
+        """{feed id: Quote} from one endpoint's /api/latest_price_feeds"""
+        query = urlencode([("ids[]", feed_id) for feed_id in feed_ids])
+        started = time.perf_counter()
+        try:
+            async with self.session.get(f"{url}/api/latest_price_feeds?{query}", timeout=self.timeout) as response:
+                if response.status != 200:
+                    raise ConnectionError(f"answered {response.status}")
+                data = await response.json(content_type=None)
+        except Exception:
+            metrics.ORACLE_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=url)
+            raise
+        # Requests cancelled because another endpoint answered first aren't observed
+        metrics.ORACLE_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=url)
+        return dict(parse_quote(feed) for feed in data if feed.get("id"))
+
+    async def quotes(self, feed_ids):
+        """Usable quotes for `feed_ids`; feeds with neither a fresh nor a recent cached quote are left out"""
+        wanted = set(feed_ids)
+        found = {}
+        if not wanted:
+            return found
+
+        endpoints = iter(self.urls)
+        tasks = {}  # In-flight request -> endpoint
+
+        def ask_next():
+            url = next(endpoints, None)
+            if url is None:
+                return
+            if tasks:
+                self.counters["hedged"] += 1
+            self.counters["requests"] += 1
+            tasks[asyncio.create_task(self._fetch(url, sorted(wanted - found.keys())))] = url
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout_seconds
+        ask_next()
+        try:
+            while tasks and wanted - found.keys():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, _ = await asyncio.wait(tasks, timeout=min(self.hedge_delay_seconds, remaining),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    ask_next()  # Slow: the pending request may still win, but ask the next endpoint too
+                    continue
+                for task in done:
+                    url = tasks.pop(task)
+                    try:
+                        answer = task.result()
+                    except Exception as e:
+                        self.counters["errors"] += 1
+                        metrics.ORACLE_FAILURES.inc(endpoint=url, reason="error")
+                        print(f"[Oracle] Warning: {url} failed: {str(e) or type(e).__name__}")
+                        continue
+                    for feed_id, quote in answer.items():
+                        if feed_id not in wanted or feed_id in found:
+                            continue
+                        problem = quote_problem(quote)
+                        if problem:
+                            self.counters["rejected"] += 1
+                            metrics.ORACLE_FAILURES.inc(endpoint=url, reason="rejected")
+                            print(f"[Oracle] Warning: {url} price for {feed_id[:10]} rejected: {problem}")
+                        else:
+                            found[feed_id] = quote
+                if not tasks and wanted - found.keys():
+                    ask_next()  # Failed or incomplete: the next endpoint right away
+        finally:
+            for task, url in tasks.items():
+                task.cancel()
+                if wanted - found.keys():
+                    metrics.ORACLE_FAILURES.inc(endpoint=url, reason="timeout")  # Still unanswered at the deadline
+
+        self.last_good.update(found)
+        for feed_id in wanted - found.keys():
+            cached = self.last_good.get(feed_id)
+            if cached is not None and quote_problem(cached) is None:
+                self.counters["cache_hits"] += 1
+                print(f"[Oracle] Warning: no fresh price for {feed_id[:10]}, using the last good one ({cached.age:.0f}s old)")
+                found[feed_id] = cached._replace(cached=True)
+        print(f"[Oracle] Fetched prices from Pyth: { {feed_id: quote.price for feed_id, quote in found.items()} }")
+        return found
@@ -0,0 +1,43 @@
+"""
+Container prestart
+Runs database initialization and every migration in one Python process, so
+the imports, app setup and key derivation they share are paid once per
+container start instead of once per script. A failing step is reported and
+the remaining steps still run, like the `|| echo` guards it replaces.
+"""
+import os
+import time
+from init_db import init_db
+from migrate_hot_cold_split import migrate_hot_cold_split
+from migrate_server_key_store import migrate_server_key_store
+from migrate_database import migrate_database
+from migrate_blob_envelope import migrate_blob_envelope
+from ingest import replay_spool
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'strategies.db')
+
+def run_step(name, step, warning):
+    started = time.perf_counter()
+    print(f"▶️  {name}")
+    try:
+        step()
+    except Exception as e:
+        print(f"⚠️  {warning}: {e}")
+    print(f"   ({time.perf_counter() - started:.2f}s)")
+
+def prestart():
+    run_step("Initializing database", init_db, "Database initialization warning (may already exist)")
+
+    # Only existing databases need migrating
+    if not os.path.exists(DB_FILE):
+        print("   No existing database, migration will run on first data insertion")
+        return
+
+    run_step("Hot/cold split migration", migrate_hot_cold_split, "Hot/cold split warning (may have already run)")
+    run_step("Key store migration", migrate_server_key_store, "Key store migration warning (may have already run)")
+    run_step("Database migration", migrate_database, "Migration warning (may have already run or no data to migrate)")
+    run_step("Blob envelope migration", migrate_blob_envelope, "Blob envelope migration warning (legacy rows stay readable)")
+    run_step("Ingest spool replay", replay_spool, "Spool replay warning (unreplayed strategies stay in the spool)")
+
+if __name__ == '__main__':
+    prestart()
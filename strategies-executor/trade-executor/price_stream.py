@@ -0,0 +1,150 @@
+"""
+Price Stream
+Follows Hermes' server-sent event stream (/v2/updates/price/stream) so the
+scheduler can start a cycle as soon as a price moves instead of on a fixed
+poll. The latest quote of each subscribed feed is kept in memory. The
+scheduler falls back to polling the oracle for any feed without a usable
+streamed quote (see oracle.quote_problem), and for every feed while the stream
+is disconnected; reconnects back off exponentially.
+"""
+import asyncio
+import json
+from urllib.parse import urlencode
+from oracle import parse_quote, quote_problem
+from config import PRICE_STREAM_URL, PRICE_STREAM_IDLE_TIMEOUT_SECONDS, PRICE_STREAM_RECONNECT_SECONDS
+
+MAX_RECONNECT_SECONDS = 60
+
+class PriceStream:
+    """Latest streamed price per feed, and a wake-up for the scheduler when one changes"""
+
+    def __init__(self, url=PRICE_STREAM_URL, idle_timeout_seconds=PRICE_STREAM_IDLE_TIMEOUT_SECONDS,
+                 reconnect_seconds=PRICE_STREAM_RECONNECT_SECONDS):
+        self.url = url
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.reconnect_seconds = reconnect_seconds
+        self.feed_ids = frozenset()
+        self.quotes = {}  # Feed id -> latest streamed Quote
+        self.connected = False
+        self.counters = {"connects": 0, "drops": 0, "events": 0, "changes": 0}
+        # Created in run(), on the scheduler's own event loop
+        self._updated = None
+        self._resubscribe = None
+
+    def subscribe(self, feed_ids):
+        """Make sure the stream covers `feed_ids`; reconnects only when a new feed is added"""
+        feed_ids = frozenset(feed_ids)
+        if feed_ids <= self.feed_ids:
+            return
+        self.feed_ids |= feed_ids
+        if self._resubscribe is not None:
+            self._resubscribe.set()
+
+    def latest(self, feed_ids):
+        """Usable streamed quotes for `feed_ids`; other feeds are left out"""
+        if not self.connected:
+            return {}
+        quotes = {}
+        for feed_id in feed_ids:
+            quote = self.quotes.get(feed_id)
+            if quote is not None and quote_problem(quote) is None:
+                quotes[feed_id] = quote
+        return quotes
+
+    async def wait_for_update(self, timeout, debounce_seconds=0):
+        """True once a price has changed since the last call, False after `timeout` seconds without one.
+        After the first change it waits `debounce_seconds` more, so a burst of updates wakes the caller once."""
+        if self._updated is None:
+            await asyncio.sleep(timeout)
+            return False
+        try:
+            await asyncio.wait_for(self._updated.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        await asyncio.sleep(debounce_seconds)
+        self._updated.clear()  # Changes up to now are covered by the caller's next read of the prices
+        return True
+
+    def stats(self):
+        """Events, price changes, connects and drops so far, whether the stream is up, and the feeds it covers"""
+        return dict(self.counters, connected=self.connected, feeds=len(self.feed_ids))
+
+    def apply(self, data):
+        """Record the quotes in one event's data; returns True if any price changed"""
+        try:
+            parsed = json.loads(data).get("parsed") or []
+        except (ValueError, AttributeError):
+            return False
+        changed = False
+        for feed in parsed:
+            feed_id, quote = parse_quote(feed)
+            previous = self.quotes.get(feed_id)
+            self.quotes[feed_id] = quote
+            changed = changed or previous is None or previous.price != quote.price
+        self.counters["events"] += 1
+        if changed:
+            self.counters["changes"] += 1
+            if self._updated is not None:
+                self._updated.set()
+        return changed
+
+    async def _listen(self, session):
+        """Read events until the stream ends or the subscription changes; returns the number of events read"""
+        query = urlencode([("ids[]", feed_id) for feed_id in sorted(self.feed_ids)] + [("parsed", "true")])
+        events = 0
+        async with session.get(f"{self.url}?{query}", headers={"Accept": "text/event-stream"}) as response:
+            if response.status != 200:
+                raise ConnectionError(f"Hermes answered {response.status}")
+            self.connected = True
+            self.counters["connects"] += 1
+            print(f"[Price Stream] Connected, following {len(self.feed_ids)} feeds.")
+
+            data_lines = []
+            async for raw_line in response.content:
+                line = raw_line.decode().rstrip("\r\n")
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].lstrip(" "))
+                elif not line and data_lines:  # A blank line ends the event
+                    self.apply("\n".join(data_lines))
+                    data_lines = []
+                    events += 1
+                if self._resubscribe.is_set():
+                    break
+        return events
+
+    async def run(self):
+        """Background loop: stay subscribed to every feed passed to subscribe(), reconnecting as needed"""
+        import aiohttp  # Imported when the stream starts: run_scheduler.py and the embedded scheduler, never request handlers
+        self._updated = asyncio.Event()
+        self._resubscribe = asyncio.Event()
+        # No overall deadline: the response is endless. A silent stream counts as dropped.
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=self.idle_timeout_seconds)
+        backoff = self.reconnect_seconds
+
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                if not self.feed_ids:
+                    await self._resubscribe.wait()
+                self._resubscribe.clear()
+
+                events = 0
+                try:
+                    events = await self._listen(session)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"[Price Stream] ⚠️  Stream error: {str(e) or type(e).__name__}")
+                finally:
+                    if self.connected and not self._resubscribe.is_set():
+                        self.counters["drops"] += 1
+                    self.connected = False
+
+                if self._resubscribe.is_set():
+                    continue  # New feeds: reconnect right away
+                if events:
+                    backoff = self.reconnect_seconds  # It was healthy, so start backing off afresh
+                print(f"[Price Stream] Disconnected, polling until it reconnects in {backoff:.0f}s.")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RECONNECT_SECONDS)
+
+price_stream = PriceStream()
@@ -0,0 +1,43 @@
+"""
+Monotone Watermark Pruning
+A GTE (upper bound) check that failed at price p also fails at any price <= p,
+and an LTE (lower bound) check that failed at p also fails at any price >= p.
+Each strategy keeps the highest and lowest prices (in cents) at which the FHE
+engine answered "not triggered", so the scheduler can skip evaluations whose
+outcome is already known.
+"""
+from threading import Lock
+
+# Strategy types by which bound(s) the FHE engine checks
+UPPER_BOUND_TYPES = {"LIMIT_SELL_RALLY"}                      # current >= upper
+LOWER_BOUND_TYPES = {"LIMIT_BUY_DIP"}                         # current <= lower
+DUAL_BOUND_TYPES = {"LIMIT_ORDER", "BRACKET_ORDER_SHORT"}     # either of the above
+
+_stats_lock = Lock()
+prune_stats = {"evaluated": 0, "skipped": 0}
+
+def can_skip(strategy_type, price_cents, high_cents, low_cents):
+    """True if the watermarks prove the strategy cannot trigger at `price_cents`"""
+    if strategy_type in UPPER_BOUND_TYPES:
+        return high_cents is not None and price_cents <= high_cents
+    if strategy_type in LOWER_BOUND_TYPES:
+        return low_cents is not None and price_cents >= low_cents
+    if strategy_type in DUAL_BOUND_TYPES:
+        # Not triggered at low and at high means lower < low and upper > high
+        return (high_cents is not None and low_cents is not None
+                and low_cents <= price_cents <= high_cents)
+    return False
+
+def widen(price_cents, high_cents, low_cents):
+    """Watermarks after the engine reported "not triggered" at `price_cents`"""
+    high = price_cents if high_cents is None else max(high_cents, price_cents)
+    low = price_cents if low_cents is None else min(low_cents, price_cents)
+    return high, low
+
+def count(outcome):
+    with _stats_lock:
+        prune_stats[outcome] += 1
+
+def stats():
+    with _stats_lock:
+        return dict(prune_stats)
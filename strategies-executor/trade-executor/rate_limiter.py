@@ -0,0 +1,132 @@
+"""
+Rate Limiter
+Token buckets for auth.rate_limit: each (endpoint, client) pair holds up to
+`capacity` tokens, refilled at capacity / window tokens per second, and every
+request takes one. A bucket that has refilled completely is the same as no
+bucket, so idle clients are evicted; each check is O(1) however busy a client is.
+
+Backends (RATE_LIMIT_BACKEND):
+  memory  per-process buckets, at most RATE_LIMIT_MAX_CLIENTS of them (least
+          recently used evicted first)
+  sqlite  buckets in a small SQLite file (RATE_LIMIT_DB_PATH) shared by every
+          worker process on the host, so gunicorn workers share one budget
+Other backends only need take(key, capacity, rate); register them in BACKENDS.
+While the configured backend errors, requests are limited by a memory backend
+instead (per process), never let through unlimited.
+"""
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import RATE_LIMIT_BACKEND, RATE_LIMIT_MAX_CLIENTS, RATE_LIMIT_DB_PATH
+
+# Idle buckets are swept from the SQLite backend once every this many checks
+SWEEP_EVERY = 1000
+
+def refill_and_take(tokens, updated_at, capacity, rate, now):
+    """Token bucket step: (tokens left, allowed, seconds until a token is available, time the bucket is full)"""
+    tokens = min(capacity, tokens + (now - updated_at) * rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    retry_after = 0.0 if allowed else (1 - tokens) / rate
+    return tokens, allowed, retry_after, now + (capacity - tokens) / rate
+
+class MemoryBackend:
+    """Buckets in this process, bounded to `max_clients` entries"""
+
+    def __init__(self, max_clients):
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at, full_at), least recently used first
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def take(self, key, capacity, rate):
+        """(allowed, retry after seconds) for one request"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.pop(key, (capacity, now, now))
+            tokens, allowed, retry_after, full_at = refill_and_take(tokens, updated_at, capacity, rate, now)
+            self._buckets[key] = (tokens, now, full_at)
+            # Full buckets carry no state; beyond max_clients the least recently used goes too
+            while self._buckets:
+                oldest_key, (_, _, oldest_full_at) = next(iter(self._buckets.items()))
+                if oldest_full_at > now and len(self._buckets) <= self.max_clients:
+                    break
+                del self._buckets[oldest_key]
+                if oldest_full_at > now:
+                    self.evictions += 1
+            return allowed, retry_after
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "clients": len(self._buckets), "evictions": self.evictions}
+
+class SQLiteBackend:
+    """Buckets in a SQLite file shared by every process that opens it"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()  # One connection per thread (and per forked worker)
+        self._checks = itertools.count(1)  # next() on it is atomic, unlike += on an int shared by threads
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # Losing a few buckets in a crash only resets those clients
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bucket (
+                    key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_bucket_full_at ON bucket (full_at)")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, capacity, rate):
+        """(allowed, retry after seconds) for one request"""
+        conn = self._connection()
+        now = time.time()  # Wall clock: shared between processes
+        sweep = next(self._checks) % SWEEP_EVERY == 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM bucket WHERE key = ?", (key,)).fetchone()
+            tokens, updated_at = row if row is not None else (capacity, now)
+            tokens, allowed, retry_after, full_at = refill_and_take(tokens, updated_at, capacity, rate, now)
+            conn.execute(
+                "INSERT INTO bucket (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at, full_at = excluded.full_at",
+                (key, tokens, now, full_at),
+            )
+            if sweep:
+                conn.execute("DELETE FROM bucket WHERE full_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+    def stats(self):
+        clients = self._connection().execute("SELECT COUNT(*) FROM bucket WHERE full_at > ?", (time.time(),)).fetchone()[0]
+        return {"backend": "sqlite", "clients": clients}
+
+BACKENDS = {
+    "memory": lambda: MemoryBackend(RATE_LIMIT_MAX_CLIENTS),
+    "sqlite": lambda: SQLiteBackend(RATE_LIMIT_DB_PATH),
+}
+
+def make_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND {name!r}; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+# Singleton instance
+limiter = make_backend(RATE_LIMIT_BACKEND)
+# Takes over while `limiter` errors (say its SQLite file is locked or unwritable), so limits narrow to one
+# process instead of lapsing
+fallback = limiter if isinstance(limiter, MemoryBackend) else MemoryBackend(RATE_LIMIT_MAX_CLIENTS)
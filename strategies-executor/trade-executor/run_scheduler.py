@@ -0,0 +1,25 @@
+"""
+Standalone scheduler
+Runs the evaluation loop and execution tracker without the web server. Start as
+many as needed, on one host or several sharing the database: strategies are
+claimed through work leases (see leases.py), so each one is evaluated and
+executed by a single process at a time.
+
+    EMBEDDED_SCHEDULER=false gunicorn --workers 4 'app:app'   # API only
+    python3 run_scheduler.py                                  # one per process
+
+With METRICS_PORT set, this process serves its own /metrics on that port.
+"""
+import config
+
+# This process runs the loop in its main thread, not as a thread of the web app
+config.EMBEDDED_SCHEDULER = False
+
+from app import app
+from scheduler import worker_loop
+import metrics
+
+if __name__ == '__main__':
+    if config.METRICS_PORT:
+        metrics.serve(config.METRICS_PORT)
+    worker_loop(app)
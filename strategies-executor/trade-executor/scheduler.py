@@ -1,57 +1,312 @@
+import asyncio
 import time
-from database import db, Strategy
-from oracle import get_live_prices
-from fhe_client import is_condition_met
-from trade_executor import execute_trade
-from config import CHECK_INTERVAL_SECONDS, PYTH_PRICE_FEED_IDS
+from datetime import datetime
+from database import (
+    iter_pending_pages, pending_count, pending_price_feed_ids, record_untriggered, transition_strategy, load_strategy, run_db,
+    feed_rounds, start_feed_round,
+)
+from blob_cache import blob_cache
+from oracle import OracleClient
+from price_stream import price_stream
+from fhe_client import FheClient, price_to_cents
+from execution_tracker import submit_trade, track_executions
+from config import (
+    CHECK_INTERVAL_SECONDS, PYTH_PRICE_FEED_IDS, PENDING_BATCH_SIZE, PRICE_STREAM_ENABLED, PRICE_STREAM_URL,
+    PRICE_DEBOUNCE_SECONDS, CYCLE_TIME_BUDGET_SECONDS, CADENCE_MIN_INTERVAL_SECONDS, ARCHIVE_ENABLED,
+)
+import archive
+import cadence
+import metrics
+import pruning
+import leases
 
-def worker_loop(app):
-    print("[Scheduler] Starting worker loop")
-    
+# Reverse lookup for readable log lines
+FEED_SYMBOLS = {feed_id: symbol for symbol, feed_id in PYTH_PRICE_FEED_IDS.items()}
+
+class Cycle:
+    """Time budget of one pass over the pending book, and what the pass saw"""
+
+    def __init__(self, budget_seconds=CYCLE_TIME_BUDGET_SECONDS):
+        self.started = time.monotonic()
+        self.deadline = self.started + budget_seconds
+        self.stopped_at = None  # (feed id, last strategy id reached) if the budget ran out
+        self.evaluations = 0
+        self.max_price_age = 0.0
+
+    def out_of_time(self):
+        return time.monotonic() >= self.deadline
+
+    def record(self, evaluations, price_age):
+        self.evaluations += evaluations
+        self.max_price_age = max(self.max_price_age, price_age)
+
+    def stats(self):
+        """Summary for the cycle log"""
+        return {
+            "seconds": round(time.monotonic() - self.started, 2),
+            "evaluations": self.evaluations,
+            "max_price_age": round(self.max_price_age, 2),
+            "carried_over": self.stopped_at is not None,
+        }
+
+# Where the last cycle ran out of time; the next one starts there, so strategies it didn't reach go first
+resume_from = None
+
+def cycle_segments(feed_ids, resume):
+    """(feed id, after id, up to id) ranges that cover the book once, starting at `resume` when set"""
+    feed_ids = sorted(feed_ids)
+    if resume is None or resume[0] not in feed_ids:
+        return [(feed_id, None, None) for feed_id in feed_ids]
+    resume_feed, last_id = resume
+    index = feed_ids.index(resume_feed)
+    segments = [(resume_feed, last_id, None)]
+    segments += [(feed_id, None, None) for feed_id in feed_ids[index + 1:] + feed_ids[:index]]
+    if last_id is not None:
+        segments.append((resume_feed, None, last_id))  # Wrap around to the start of the feed
+    return segments
+
+def lease_hold_seconds():
+    """How long an evaluated strategy stays unclaimable. Feed rounds keep it from being evaluated twice in one
+    interval; the hold only spaces out retries of evaluations that failed."""
+    return PRICE_DEBOUNCE_SECONDS if price_stream.connected else CADENCE_MIN_INTERVAL_SECONDS
+
+def cadence_report():
+    """This process's evaluation interval and price speed per feed, keyed by symbol where known"""
+    return {FEED_SYMBOLS.get(feed_id, feed_id): feed_stats for feed_id, feed_stats in cadence.stats().items()}
+
+def feed_round_report():
+    """Latest round of every feed, whichever scheduler process started it, keyed by symbol where known"""
+    return {
+        FEED_SYMBOLS.get(feed_id, feed_id): {
+            "round_started_at": feed_round.started_at.isoformat(),
+            "round_price": feed_round.price,
+            "started_by": feed_round.started_by,
+            "interval_seconds": None if feed_round.interval_seconds is None else round(feed_round.interval_seconds, 2),
+            "speed_pct_per_min": None if feed_round.speed is None else round(feed_round.speed * 6000, 4),
+        }
+        for feed_id, feed_round in feed_rounds().items()
+    }
+
+def wall_time(utc):
+    """Unix time of a naive UTC datetime"""
+    return (utc - datetime(1970, 1, 1)).total_seconds()
+
+async def current_quotes(oracle, feed_ids):
+    """Quotes for `feed_ids`: streamed where the stream has a usable one, polled from Hermes for the rest"""
+    price_stream.subscribe(feed_ids)
+    quotes = price_stream.latest(feed_ids)
+    missing = [feed_id for feed_id in feed_ids if feed_id not in quotes]
+    if missing:
+        quotes.update(await oracle.quotes(missing))
+    return quotes
+
+async def handle_result(strategy_dict, triggered, current_price, high, low, **evaluation):
+    """Act on one evaluation result as soon as it arrives; `evaluation` is recorded on the row with it"""
+    strategy_id = strategy_dict['id']
+    try:
+        if triggered:
+            print(f"[Scheduler] Condition met for Strategy ID {strategy_id}. Executing...")
+
+            # Leave PENDING first, so the strategy is never evaluated (or sent) twice
+            if await run_db(transition_strategy, strategy_id, ['PENDING'], 'TRIGGERED', **evaluation):
+                metrics.TRIGGERS.inc(strategy_type=metrics.strategy_type_label(strategy_dict['strategy_type']))
+                await submit_trade(strategy_dict, current_price)
+        elif triggered is False:
+            # Only a definite "not triggered" moves the watermarks; failed evaluations prove nothing
+            await run_db(record_untriggered, strategy_id, *pruning.widen(price_to_cents(current_price), high, low), **evaluation)
+    except Exception as strategy_err:
+        print(f"[Scheduler] Error processing individual strategy {strategy_id}: {strategy_err}")
+
+def observe_evaluations(batch, results, seconds):
+    """Every strategy in a batch waited `seconds` for its result"""
+    metrics.FHE_BATCH_SIZE.observe(len(batch))
+    for (strategy_dict, _, _), triggered in zip(batch, results):
+        strategy_type = metrics.strategy_type_label(strategy_dict['strategy_type'])
+        metrics.FHE_EVALUATION_SECONDS.observe(seconds, strategy_type=strategy_type)
+        result = "failed" if triggered is None else "triggered" if triggered else "not_triggered"
+        metrics.FHE_EVALUATIONS.inc(strategy_type=strategy_type, result=result)
+
+async def evaluate_batch(fhe, batch, quote, cycle):
+    """Evaluate strategies sharing a server key in one engine request, then handle each result"""
+    try:
+        price_age = quote.age  # How stale the price is as the engine gets it
+        cycle.record(len(batch), price_age)
+        started = time.perf_counter()
+        results = await fhe.evaluate_batch([strategy_dict for strategy_dict, _, _ in batch], quote.price)
+        observe_evaluations(batch, results, time.perf_counter() - started)
+        evaluation = {"last_evaluated_at": datetime.utcnow(), "last_price_age_seconds": round(price_age, 3)}
+        for (strategy_dict, high, low), triggered in zip(batch, results):
+            await handle_result(strategy_dict, triggered, quote.price, high, low, **evaluation)
+    finally:
+        fhe.slots.release()
+        # Not due again until the next cycle, whichever process runs it
+        await run_db(leases.release, [strategy_dict['id'] for strategy_dict, _, _ in batch], hold_seconds=lease_hold_seconds())
+
+async def evaluate_feed_group(fhe, price_feed_id, quote, in_flight, cycle, after_id=None, up_to_id=None, round_started_at=None):
+    """Start evaluations for the pending strategies on one feed with ids in (after_id, up_to_id] that haven't
+    been evaluated in the round started at `round_started_at`, at most `fhe.max_in_flight` requests at a time.
+    Stops at a page boundary once the cycle is out of time."""
+    symbol = FEED_SYMBOLS.get(price_feed_id, price_feed_id[:10])
+    current_price = quote.price
+    source = "cached, " if quote.cached else ""
+    print(f"[Scheduler] Evaluating {symbol} strategies. Current {symbol} price: ${current_price:,.2f} ({source}{quote.age:.1f}s old)")
+
+    price_cents = price_to_cents(current_price)
+    # Decoded strategies waiting for a batch, keyed by the server key they share
+    buffers = {}
+
+    async def flush(group_key):
+        batch = buffers.pop(group_key)
+        await fhe.slots.acquire()
+        task = asyncio.create_task(evaluate_batch(fhe, batch, quote, cycle))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    last_reached = after_id
+    pages = iter_pending_pages(PENDING_BATCH_SIZE, price_feed_id, after_id, up_to_id, round_started_at)
     while True:
-        try:
-            with app.app_context():
-                pending_strategies = Strategy.query.filter_by(status='PENDING').all()
-                
-                if not pending_strategies:
-                    time.sleep(CHECK_INTERVAL_SECONDS)
-                    continue
-
-                strategies_to_process = [s.to_dict() for s in pending_strategies]
-                
-                eth_feed_id = PYTH_PRICE_FEED_IDS.get("ETH")
-                if not eth_feed_id:
-                    print("[Scheduler] Error: ETH Price Feed ID not found in config.")
-                    time.sleep(CHECK_INTERVAL_SECONDS)
-                    continue
-
-                live_prices = get_live_prices([eth_feed_id])
-                
-                if eth_feed_id not in live_prices:
-                    print("[Scheduler] Warning: ETH price not available from oracle this cycle. Retrying.")
-                    continue
-
-                current_eth_price = live_prices[eth_feed_id]
-                print(f"[Scheduler] Processing {len(strategies_to_process)} strategies. Current ETH price: ${current_eth_price:,.2f}")
-
-                for strategy_dict in strategies_to_process:
-                    try:
-                        if is_condition_met(strategy_dict, current_eth_price):
-                            print(f"[Scheduler] Condition met for Strategy ID {strategy_dict.get('id')}. Executing...")
-                            
-                            execute_trade(strategy_dict, current_eth_price)
-                            
-                            strategy_to_update = Strategy.query.get(strategy_dict['id'])
-                            if strategy_to_update:
-                                strategy_to_update.status = 'EXECUTED'
-                                db.session.commit()
-                                print(f"[Scheduler] Strategy {strategy_dict.get('id')} marked as EXECUTED.")
-                                
-                    except Exception as strategy_err:
-                        print(f"[Scheduler] Error processing individual strategy {strategy_dict.get('id')}: {strategy_err}")
-                        continue
-
-        except Exception as e:
-            print(f"[Scheduler] Global loop error: {e}")
-            
-        time.sleep(CHECK_INTERVAL_SECONDS)
\ No newline at end of file
+        page = await run_db(next, pages, None)
+        if page is None:
+            break
+        if cycle.out_of_time():
+            cycle.stopped_at = (price_feed_id, last_reached)
+            break
+        last_reached = page[-1].id
+        candidates = []
+        for strategy in page:
+            if pruning.can_skip(strategy.strategy_type, price_cents, strategy.untriggered_high_cents, strategy.untriggered_low_cents):
+                pruning.count("skipped")
+            else:
+                candidates.append(strategy)
+
+        # One claim per page; strategies another process won are its to evaluate
+        claimed = await run_db(leases.claim, [strategy.id for strategy in candidates])
+        for strategy in candidates:
+            strategy_id = strategy.id
+            if strategy_id not in claimed:
+                continue
+            high, low = strategy.untriggered_high_cents, strategy.untriggered_low_cents
+
+            # Blobs are decoded here, right before this strategy is evaluated
+            try:
+                strategy_dict = await run_db(load_strategy, strategy)
+            except Exception as decode_err:
+                print(f"[Scheduler] Error loading strategy {strategy_id}: {decode_err}")
+                await run_db(leases.release, [strategy_id], hold_seconds=lease_hold_seconds())
+                continue
+
+            pruning.count("evaluated")
+            group_key = strategy.server_key_digest or strategy_id
+            buffers.setdefault(group_key, []).append((strategy_dict, high, low))
+            if len(buffers[group_key]) >= fhe.batch_size:
+                await flush(group_key)
+            elif sum(len(batch) for batch in buffers.values()) >= fhe.batch_size:
+                # Cap decoded-but-unsent strategies at one batch worth: send the fullest buffer early
+                await flush(max(buffers, key=lambda key: len(buffers[key])))
+
+    for group_key in list(buffers):
+        await flush(group_key)
+
+async def run_cycle(fhe, oracle):
+    """One pass over the strategies of the feeds that are due; returns once every evaluation started in it
+    has finished, with the number of seconds until the next cycle is due"""
+    # Cheap index-only count; the strategies themselves are streamed below
+    pending = await run_db(pending_count)
+    metrics.PENDING_STRATEGIES.set(pending)
+    if not pending:
+        return CHECK_INTERVAL_SECONDS
+
+    # Streamed prices, plus one (hedged) oracle request for whatever feeds the stream doesn't cover
+    feed_ids = await run_db(pending_price_feed_ids)
+    live_quotes = await current_quotes(oracle, feed_ids)
+
+    if not live_quotes:
+        print("[Scheduler] Warning: No prices available from oracle this cycle. Retrying next cycle.")
+        metrics.CYCLES.inc(outcome="no_prices")
+        return CHECK_INTERVAL_SECONDS
+
+    global resume_from
+    for price_feed_id in feed_ids:
+        if price_feed_id not in live_quotes:
+            print(f"[Scheduler] Warning: No price for feed {price_feed_id} this cycle. Skipping its strategies.")
+    # Rounds started by any process count: a feed another process has just evaluated isn't due here either
+    rounds = await run_db(feed_rounds, list(live_quotes))
+    for price_feed_id, feed_round in rounds.items():
+        cadence.evaluated(price_feed_id, feed_round.price, wall_time(feed_round.started_at))
+
+    # Feeds whose interval has passed or whose price has gapped get a new round (or join the one another process
+    # started first); the feed the last cycle ran out of time in finishes its round
+    round_starts = {}
+    for price_feed_id, quote in live_quotes.items():
+        cadence.observe(price_feed_id, quote)
+        seen = rounds.get(price_feed_id)
+        if cadence.is_due(price_feed_id, quote.price):
+            round_starts[price_feed_id] = await run_db(
+                start_feed_round, price_feed_id, seen.started_at if seen else None, quote.price, leases.owner_id(),
+                interval_seconds=cadence.interval(price_feed_id), speed=cadence.speed(price_feed_id),
+            )
+            cadence.evaluated(price_feed_id, quote.price, wall_time(round_starts[price_feed_id]))
+        elif resume_from is not None and resume_from[0] == price_feed_id and seen is not None:
+            round_starts[price_feed_id] = seen.started_at
+    due_feed_ids = list(round_starts)
+    if not due_feed_ids:
+        return max(CADENCE_MIN_INTERVAL_SECONDS, cadence.seconds_until_due(feed_ids))
+
+    print(f"[Scheduler] Processing {pending} strategies: {len(due_feed_ids)} of {len(feed_ids)} price feeds due.")
+
+    cycle = Cycle()
+    in_flight = set()
+    for price_feed_id, after_id, up_to_id in cycle_segments(due_feed_ids, resume_from):
+        # A fresher streamed quote may have arrived since the cycle started
+        quote = price_stream.latest([price_feed_id]).get(price_feed_id, live_quotes[price_feed_id])
+        await evaluate_feed_group(fhe, price_feed_id, quote, in_flight, cycle, after_id, up_to_id, round_starts[price_feed_id])
+        if cycle.stopped_at is not None:
+            break
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    resume_from = cycle.stopped_at
+    metrics.CYCLE_SECONDS.observe(time.monotonic() - cycle.started)
+    metrics.CYCLES.inc(outcome="completed" if cycle.stopped_at is None else "carried_over")
+    metrics.LAST_CYCLE_TIMESTAMP.set(time.time())
+
+    if cycle.stopped_at is not None:
+        print(f"[Scheduler] ⚠️  Cycle budget of {CYCLE_TIME_BUDGET_SECONDS:.0f}s used up; the rest of the book goes first next cycle.")
+    print(f"[Scheduler] Cycle: {cycle.stats()}")
+
+    print(f"[Scheduler] Blob cache: {blob_cache.stats()}")
+    print(f"[Scheduler] Watermark pruning: {pruning.stats()}")
+    print(f"[Scheduler] Price stream: {price_stream.stats()}")
+    print(f"[Scheduler] Oracle: {oracle.stats()}")
+    print(f"[Scheduler] Cadence: {cadence_report()}")
+
+    if cycle.stopped_at is not None:
+        return CADENCE_MIN_INTERVAL_SECONDS
+    return max(CADENCE_MIN_INTERVAL_SECONDS, cadence.seconds_until_due(feed_ids))
+
+async def wait_for_next_cycle(seconds):
+    """Until a streamed price moves (plus PRICE_DEBOUNCE_SECONDS to coalesce a burst), or `seconds`.
+    Prices are checked for gaps at least every CHECK_INTERVAL_SECONDS, even when no feed is due sooner."""
+    await price_stream.wait_for_update(min(seconds, CHECK_INTERVAL_SECONDS), PRICE_DEBOUNCE_SECONDS)
+
+async def run_worker(app):
+    background = [asyncio.create_task(track_executions(app)), asyncio.create_task(leases.keep_alive(app))]
+    if PRICE_STREAM_ENABLED and PRICE_STREAM_URL:
+        background.append(asyncio.create_task(price_stream.run()))
+    if ARCHIVE_ENABLED:
+        background.append(asyncio.create_task(archive.run(app)))
+    async with FheClient() as fhe, OracleClient() as oracle:
+        while True:
+            next_cycle_in = CHECK_INTERVAL_SECONDS
+            try:
+                with app.app_context():
+                    next_cycle_in = await run_cycle(fhe, oracle)
+            except Exception as e:
+                print(f"[Scheduler] Global loop error: {e}")
+
+            # Also after errors and oracle outages, so a failing dependency isn't retried in a tight loop
+            await wait_for_next_cycle(next_cycle_in)
+
+def worker_loop(app):
+    print(f"[Scheduler] Starting worker loop as {leases.owner_id()}")
+    asyncio.run(run_worker(app))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Stub FHE Engine
+Stand-in for the Rust FHE engine in local tests and benchmarks. It speaks the
+same HTTP protocol (/registerKey, /evaluateStrategy, /evaluateBatch) but does
+no FHE work: "ciphertexts" are hex-encoded decimal cents (see encode_bound) and
+every request sleeps for a configurable latency instead. Requests that send
+the server key inline pay `key_latency` each time; registered keys pay it once.
+Bodies may be JSON (hex blobs) or msgpack (raw bytes), like the real engine.
+
+    python stub_fhe_engine.py --port 5001 --latency 0.5 --key-latency 0.2
+"""
+import argparse
+import hashlib
+import json
+import msgpack
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def encode_bound(price_cents):
+    """Stub "ciphertext" for a bound, in the hex form the payload generator produces"""
+    return str(int(price_cents)).encode().hex()
+
+def blob_bytes(value):
+    """Raw bytes of a blob field, which is hex in JSON bodies and bytes in msgpack bodies"""
+    return value if isinstance(value, bytes) else bytes.fromhex(value)
+
+def decode_bound(ciphertext):
+    """Bound in cents, or None for anything that isn't a stub ciphertext"""
+    try:
+        return int(blob_bytes(ciphertext).decode())
+    except (TypeError, ValueError):
+        return None
+
+def is_triggered(strategy_type, upper_hex, lower_hex, price_cents):
+    """Plaintext version of the engine's comparison logic"""
+    upper, lower = decode_bound(upper_hex), decode_bound(lower_hex)
+    above = upper is not None and price_cents >= upper
+    below = lower is not None and price_cents <= lower
+    if strategy_type in ("LIMIT_ORDER", "BRACKET_ORDER_SHORT"):
+        return above or below
+    if strategy_type == "LIMIT_BUY_DIP":
+        return below
+    if strategy_type == "LIMIT_SELL_RALLY":
+        return above
+    raise ValueError(f"Unknown strategy type '{strategy_type}'")
+
+class StubEngineHandler(BaseHTTPRequestHandler):
+    # Set per server by make_server()
+    latency = 0.0
+    key_latency = 0.0
+    batch_enabled = True
+    registration_enabled = True
+    msgpack_enabled = True
+    stats = None
+    keys = None  # Registered handles; clear it to simulate an engine restart
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        """Decoded request body, or None (after answering 415) for an encoding this engine doesn't take"""
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.stats["bytes_in"] += len(data)
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/msgpack") and self.msgpack_enabled:
+            return msgpack.unpackb(data, raw=False)
+        if content_type.startswith("application/json"):
+            return json.loads(data)
+        self._reply(415, {"error": "unsupported_media_type"})
+        return None
+
+    def _load_key(self, payload):
+        """Seconds spent getting the server key ready, or None for an unknown handle"""
+        handle = payload.get("server_key_handle")
+        if handle is None:
+            return self.key_latency
+        return 0.0 if handle in self.keys else None
+
+    def do_POST(self):
+        self.stats["requests"] += 1
+        if self.path == "/registerKey" and self.registration_enabled:
+            payload = self._read_body()
+            if payload is None:
+                return
+            time.sleep(self.key_latency)
+            handle = hashlib.sha256(blob_bytes(payload["server_key"])).hexdigest()
+            self.keys.add(handle)
+            self.stats["registrations"] += 1
+            return self._reply(200, {"key_handle": handle})
+
+        if self.path == "/evaluateStrategy":
+            payload = self._read_body()
+            if payload is None:
+                return
+            key_seconds = self._load_key(payload)
+            if key_seconds is None:
+                return self._reply(422, {"is_triggered": False, "error": "unknown_key"})
+            time.sleep(key_seconds + self.latency)
+            self.stats["evaluations"] += 1
+            try:
+                triggered = is_triggered(payload["strategy_type"], payload["encrypted_upper_bound"],
+                                         payload["encrypted_lower_bound"], payload["current_price_cents"])
+            except ValueError:
+                return self._reply(400, {"is_triggered": False})
+            return self._reply(200, {"is_triggered": triggered})
+
+        if self.path == "/evaluateBatch" and self.batch_enabled:
+            payload = self._read_body()
+            if payload is None:
+                return
+            key_seconds = self._load_key(payload)
+            if key_seconds is None:
+                return self._reply(422, {"results": [], "error": "unknown_key"})
+            # The key is loaded once per batch, each strategy still costs one evaluation
+            time.sleep(key_seconds + self.latency * len(payload["strategies"]))
+            results = []
+            for item in payload["strategies"]:
+                self.stats["evaluations"] += 1
+                try:
+                    results.append(is_triggered(item["strategy_type"], item["encrypted_upper_bound"],
+                                                item["encrypted_lower_bound"], payload["current_price_cents"]))
+                except ValueError:
+                    results.append(None)
+            return self._reply(200, {"results": results})
+
+        self._reply(404, {"error": "not found"})
+
+def make_server(port=0, latency=0.0, key_latency=0.0, batch=True, registration=True, msgpack_bodies=True):
+    """Build a stub engine server; port 0 picks a free port (see server.server_address)"""
+    handler = type("ConfiguredStubEngineHandler", (StubEngineHandler,), {
+        "latency": latency,
+        "key_latency": key_latency,
+        "batch_enabled": batch,
+        "registration_enabled": registration,
+        "msgpack_enabled": msgpack_bodies,
+        "stats": {"requests": 0, "evaluations": 0, "registrations": 0, "bytes_in": 0},
+        "keys": set(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.stats = handler.stats
+    server.keys = handler.keys
+    return server
+
+def serve_in_background(**kwargs):
+    """Start a stub engine on a daemon thread and return (server, base_url)"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub FHE engine for local tests and benchmarks")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per strategy evaluation")
+    parser.add_argument("--key-latency", type=float, default=0.0, help="Seconds per request to load the server key")
+    parser.add_argument("--no-batch", action="store_true", help="Answer /evaluateBatch with 404 like an older engine")
+    parser.add_argument("--no-register", action="store_true", help="Answer /registerKey with 404 like an older engine")
+    parser.add_argument("--json-only", action="store_true", help="Answer msgpack bodies with 415 like an older engine")
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.latency, args.key_latency, batch=not args.no_batch,
+                         registration=not args.no_register, msgpack_bodies=not args.json_only)
+    print(f"--- Stub FHE Engine listening on http://127.0.0.1:{args.port} (latency {args.latency}s) ---")
+    server.serve_forever()
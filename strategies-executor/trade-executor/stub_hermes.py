@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Stub Hermes
+Stand-in for Pyth's Hermes price service in local tests and benchmarks. It
+answers the polling endpoint (/api/latest_price_feeds) and the server-sent
+event stream (/v2/updates/price/stream?parsed=true) from an in-memory price
+table. Streams send an event whenever set_price() changes a subscribed feed,
+and repeat the current prices every `interval` seconds like Hermes' regular
+publishes. Quotes are published "now" unless set_price() pins a publish time.
+drop_streams() cuts every open stream and `streaming = False` refuses new
+ones, to exercise the scheduler's polling fallback; `poll_latency` and
+`poll_status` slow down or fail the polling endpoint, for the oracle's hedging.
+
+    PYTH_HERMES_URL=http://127.0.0.1:5002 ...
+    python stub_hermes.py --port 5002 --interval 1 --walk 0.002
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+EXPO = -8
+
+# ETH, BTC, SOL as in config.PYTH_PRICE_FEED_IDS
+DEFAULT_PRICES = {
+    "ff61491a931112ddf1bd8147cd1b641375f79f5825126d665480874634fd0ace": 3000.0,
+    "e62df6c8b4a85fe1a67db44dc12de5db330f7ac66b72dc658afedf0f4a415b43": 60000.0,
+    "ef0d8b612d455ac6463494a99859f5b220de1b000b2b8d5423867332c525164d": 150.0,
+}
+
+def bare_id(feed_id):
+    """Feed id as Hermes reports it: lowercase hex without 0x"""
+    feed_id = feed_id.strip().lower()
+    return feed_id[2:] if feed_id.startswith("0x") else feed_id
+
+class PriceBoard:
+    """Shared price table; streams wait on `changed` for updates"""
+
+    def __init__(self, prices):
+        self.changed = threading.Condition()
+        self.prices = {}
+        self.version = 0  # Bumped by every set_price
+        self.generation = 0  # Bumped by drop_streams; streams of older generations end
+        self.streaming = True
+        self.poll_latency = 0.0
+        self.poll_status = 200
+        self.stats = {"polls": 0, "streams": 0, "events": 0}
+        for feed_id, price in prices.items():
+            self.set_price(feed_id, price)
+
+    def set_price(self, feed_id, price, conf=None, publish_time=None):
+        """Publish a price; `conf` defaults to 0.05% of it, `publish_time` to the time of each answer"""
+        conf = price * 0.0005 if conf is None else conf
+        with self.changed:
+            self.prices[bare_id(feed_id)] = (int(round(price * 10 ** -EXPO)), int(round(conf * 10 ** -EXPO)), publish_time)
+            self.version += 1
+            self.changed.notify_all()
+
+    def drop_streams(self):
+        with self.changed:
+            self.generation += 1
+            self.changed.notify_all()
+
+    def feeds(self, ids):
+        """Hermes price feed objects for the known feeds among `ids`"""
+        feeds = []
+        for feed_id in ids:
+            if feed_id not in self.prices:
+                continue
+            price, conf, publish_time = self.prices[feed_id]
+            price_info = {"price": str(price), "conf": str(conf), "expo": EXPO,
+                          "publish_time": int(time.time()) if publish_time is None else publish_time}
+            feeds.append({"id": feed_id, "price": price_info, "ema_price": price_info})
+        return feeds
+
+class StubHermesHandler(BaseHTTPRequestHandler):
+    board = None
+    interval = 1.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        ids = [bare_id(feed_id) for feed_id in parse_qs(url.query).get("ids[]", [])]
+        if url.path == "/api/latest_price_feeds":
+            self.board.stats["polls"] += 1
+            time.sleep(self.board.poll_latency)
+            if self.board.poll_status != 200:
+                return self._reply(self.board.poll_status, {"error": "stub failure"})
+            with self.board.changed:
+                return self._reply(200, self.board.feeds(ids))
+        if url.path == "/v2/updates/price/stream":
+            if not self.board.streaming:
+                return self._reply(503, {"error": "streaming disabled"})
+            return self._stream(ids)
+        self._reply(404, {"error": "not found"})
+
+    def _stream(self, ids):
+        """Server-sent events until the client goes away or drop_streams() is called"""
+        board = self.board
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        board.stats["streams"] += 1
+
+        with board.changed:
+            generation, version = board.generation, -1
+        while True:
+            with board.changed:
+                if board.version == version:
+                    board.changed.wait(self.interval)
+                if board.generation != generation:
+                    return
+                version = board.version
+                event = {"binary": {"encoding": "hex", "data": []}, "parsed": board.feeds(ids)}
+            try:
+                self.wfile.write(f"data:{json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+            except OSError:
+                return  # The client disconnected
+            board.stats["events"] += 1
+
+def make_server(port=0, interval=1.0, prices=None):
+    """Build a stub Hermes server; port 0 picks a free port. `server.board` holds the prices."""
+    board = PriceBoard(DEFAULT_PRICES if prices is None else prices)
+    handler = type("ConfiguredStubHermesHandler", (StubHermesHandler,), {"board": board, "interval": interval})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.board = board
+    return server
+
+def serve_in_background(**kwargs):
+    """Start a stub Hermes on a daemon thread and return (server, base_url)"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+def random_walk(board, step, interval):
+    """Move every price by up to ±step (a fraction) each interval"""
+    while True:
+        time.sleep(interval)
+        for feed_id, (price, _, _) in list(board.prices.items()):
+            board.set_price(feed_id, price * 10 ** EXPO * (1 + random.uniform(-step, step)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Pyth Hermes for local tests and benchmarks")
+    parser.add_argument("--port", type=int, default=5002)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between repeated stream events")
+    parser.add_argument("--walk", type=float, default=0.0, help="Random-walk step per interval, as a fraction of the price")
+    parser.add_argument("--no-stream", action="store_true", help="Refuse the stream so clients have to poll")
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.interval)
+    server.board.streaming = not args.no_stream
+    if args.walk:
+        threading.Thread(target=random_walk, args=(server.board, args.walk, args.interval), daemon=True).start()
+    print(f"--- Stub Hermes listening on http://127.0.0.1:{args.port} ---")
+    server.serve_forever()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The service modules import each other by bare name (`from config import ...`), as they do when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Never cache the derived database key outside the test run
+os.environ.setdefault("DB_KEY_CACHE_DIR", "")
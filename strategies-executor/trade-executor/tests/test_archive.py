@@ -0,0 +1,51 @@
+import io
+
+import pytest
+
+import archive
+from archive import encode_record, _read_at
+from database import TERMINAL_STATUSES, UNARCHIVED_TERMINAL
+
+COLUMNS = {"server_key": b"key bytes", "encrypted_client_key": None, "zkp_data": b"", "swap_template": b"{}"}
+
+def test_record_round_trip():
+    record = encode_record({"strategy_id": "s1"}, COLUMNS)
+    assert _read_at(io.BytesIO(record), 0) == ({"strategy_id": "s1"}, COLUMNS)
+
+def test_records_are_read_at_their_offsets():
+    first = encode_record({"strategy_id": "s1"}, {"zkp_data": b"a" * 10})
+    second = encode_record({"strategy_id": "s2"}, {"zkp_data": b"b" * 20})
+    segment = io.BytesIO(first + second)
+    assert _read_at(segment, len(first)) == ({"strategy_id": "s2"}, {"zkp_data": b"b" * 20})
+    assert _read_at(segment, 0)[0] == {"strategy_id": "s1"}
+
+@pytest.mark.parametrize("cut", [0, 3, archive.RECORD_HEAD.size, -1])
+def test_torn_record_reads_as_none(cut):
+    record = encode_record({"strategy_id": "s1"}, COLUMNS)
+    assert _read_at(io.BytesIO(record[:cut]), 0) is None
+
+def test_corrupt_record_reads_as_none():
+    record = bytearray(encode_record({"strategy_id": "s1"}, COLUMNS))
+    record[-1] ^= 0xFF
+    assert _read_at(io.BytesIO(bytes(record)), 0) is None
+
+def test_bad_magic_reads_as_none():
+    record = encode_record({"strategy_id": "s1"}, COLUMNS)
+    assert _read_at(io.BytesIO(b"XXXX" + record[4:]), 0) is None
+
+def test_iter_records_stops_at_a_torn_tail(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    records = [encode_record({"strategy_id": f"s{i}"}, {"zkp_data": bytes([i]) * 5}) for i in range(3)]
+    locations = archive.append_records(records)
+    segment = locations[0][0]
+    with open(tmp_path / segment, "ab") as f:
+        f.write(records[0][:7])  # A crash mid-append
+    assert [(offset, header["strategy_id"]) for offset, header, _ in archive.iter_records(segment)] == [
+        (offset, f"s{i}") for i, (_, offset) in enumerate(locations)
+    ]
+    assert archive.read_record(segment, locations[2][1])[1] == {"zkp_data": bytes([2]) * 5}
+
+def test_unarchived_condition_covers_every_terminal_status():
+    for status in TERMINAL_STATUSES:
+        assert f"'{status}'" in UNARCHIVED_TERMINAL
+    assert "'EXECUTED'" in UNARCHIVED_TERMINAL  # Left by the scheduler before execution was tracked
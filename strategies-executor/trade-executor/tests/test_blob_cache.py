@@ -0,0 +1,108 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+import database
+from blob_cache import DecodedBlobCache, MISSING, blob_cache
+from database import db, Strategy, StrategyBlob, load_strategy
+from ingest import new_strategy
+
+# --- LRU ---
+def test_least_recently_used_entry_is_evicted_at_capacity():
+    cache = DecodedBlobCache(max_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    assert cache.get("a") == "aaaa"  # Now "b" is the least recently used
+    cache.put("c", "cccc")
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cccc"
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 8
+
+def test_large_value_evicts_as_many_entries_as_it_needs():
+    cache = DecodedBlobCache(max_bytes=10)
+    for key in "abc":
+        cache.put(key, key * 3)
+    cache.put("big", "x" * 8)
+    assert [key for key in "abc" if cache.get(key) is not MISSING] == []
+    assert cache.stats()["entries"] == 1 and cache.stats()["evictions"] == 3
+
+def test_oversized_value_is_not_cached():
+    cache = DecodedBlobCache(max_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("huge", "x" * 11)
+    assert cache.get("huge") is MISSING
+    assert cache.get("a") == "aaaa"
+
+def test_replacing_a_key_keeps_the_byte_count():
+    cache = DecodedBlobCache(max_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("a", "aa")
+    assert cache.get("a") == "aa"
+    assert cache.stats()["bytes"] == 2
+
+def test_cached_none_is_a_hit():
+    cache = DecodedBlobCache(max_bytes=100)
+    cache.put("a", None)
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 0
+
+# --- Row versions ---
+PAYLOAD = {'user_id': 'u', 'asset_in': 'ETH', 'asset_out': 'USDC', 'amount': 1, 'recipient_address': '0x' + '22' * 20}
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'cache.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(new_strategy(PAYLOAD, {"call": "old"}, "s1"))
+        db.session.commit()
+        db.session.remove()
+        blob_cache.clear()
+        yield app
+    blob_cache.clear()
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Blob columns decoded from the database so far"""
+    columns = []
+    load_decoded = database.load_decoded
+
+    def counting_load_decoded(wanted, condition):
+        columns.extend(column.name for column in wanted)
+        return load_decoded(wanted, condition)
+    monkeypatch.setattr(database, "load_decoded", counting_load_decoded)
+    return columns
+
+def swap_template():
+    value = load_strategy(db.session.get(Strategy, "s1"))['swap_template']
+    db.session.remove()  # Each read starts from a fresh row, as the scheduler's pages do
+    return value
+
+def test_unchanged_row_is_served_from_the_cache(app, decodes):
+    assert swap_template() == {"call": "old"}
+    decoded = len(decodes)
+    assert swap_template() == {"call": "old"}
+    assert len(decodes) == decoded
+
+def test_write_through_the_model_invalidates_the_entry(app, decodes):
+    assert swap_template() == {"call": "old"}
+    db.session.get(Strategy, "s1").swap_template = json.dumps({"call": "new"})
+    db.session.commit()
+    db.session.remove()
+    decoded = len(decodes)
+    assert swap_template() == {"call": "new"}
+    assert "swap_template" in decodes[decoded:]
+
+def test_write_from_another_process_invalidates_the_entry(app):
+    assert swap_template() == {"call": "old"}
+    blobs, strategies = StrategyBlob.__table__, Strategy.__table__
+    with db.engine.begin() as conn:
+        conn.execute(blobs.update().where(blobs.c.strategy_id == "s1").values(swap_template=json.dumps({"call": "new"})))
+        conn.execute(strategies.update().where(strategies.c.id == "s1")
+                     .values(updated_at=datetime.utcnow() + timedelta(seconds=1)))
+    assert swap_template() == {"call": "new"}
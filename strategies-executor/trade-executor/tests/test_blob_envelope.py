@@ -0,0 +1,114 @@
+import pytest
+from cryptography.exceptions import InvalidTag
+from flask import Flask
+from sqlalchemy import LargeBinary, select, type_coerce
+
+from database import db, ServerKey, StrategyBlob
+from encryption import BlobEnvelope, blob_envelope, data_compression, db_encryption
+from migrate_blob_envelope import convert_table
+
+KEY_TEXT = '"' + "ab12" * 64 + '"'  # A hex key as the API sends it
+TEMPLATE = '{"to": "0x' + "33" * 20 + '", "data": "0x"}'
+
+key_column = StrategyBlob.__table__.c.server_key
+template_column = StrategyBlob.__table__.c.swap_template
+
+def legacy_encrypted(text):
+    return db_encryption.encrypt(data_compression.compress_to_base64(text)).encode()
+
+def legacy_compressed(text):
+    return data_compression.compress_to_base64(text).encode()
+
+def version_1_encrypted(text):
+    header = BlobEnvelope.MAGIC + bytes((1, BlobEnvelope.FLAG_ENCRYPTED))
+    return header + db_encryption.encrypt_bytes(text.encode(), header)
+
+# --- Formats ---
+def test_legacy_fernet_value_decodes():
+    assert key_column.type.process_result_value(legacy_encrypted(KEY_TEXT), None) == KEY_TEXT
+
+def test_legacy_compressed_value_decodes():
+    assert template_column.type.process_result_value(legacy_compressed(TEMPLATE), None) == TEMPLATE
+
+@pytest.mark.parametrize("column", [key_column, template_column])
+@pytest.mark.parametrize("text", [KEY_TEXT, TEMPLATE, '""'])
+def test_envelope_round_trip(column, text):
+    sealed = column.type.process_bind_param(text, None)
+    assert BlobEnvelope.is_current(sealed)
+    assert column.type.process_result_value(sealed, None) == text
+
+def test_hex_values_are_stored_as_bytes():
+    assert len(key_column.type.process_bind_param(KEY_TEXT, None)) < len(KEY_TEXT)
+
+def test_encrypted_envelope_only_opens_in_its_column():
+    sealed = key_column.type.process_bind_param(KEY_TEXT, None)
+    with pytest.raises(InvalidTag):
+        ServerKey.__table__.c.key_data.type.process_result_value(sealed, None)
+
+def test_altered_header_is_rejected():
+    sealed = blob_envelope.seal(TEMPLATE, encrypt=True, context=b"t.c")
+    with pytest.raises(InvalidTag):
+        blob_envelope.open(sealed[:3] + bytes((sealed[3] ^ BlobEnvelope.FLAG_COMPRESSED,)) + sealed[4:], context=b"t.c")
+
+def test_version_1_envelope_still_decodes():
+    assert key_column.type.process_result_value(version_1_encrypted(KEY_TEXT), None) == KEY_TEXT
+
+# --- Migration ---
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'blobs.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+def insert_raw(strategy_id, server_key, swap_template):
+    table = StrategyBlob.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.insert().values(strategy_id=strategy_id, server_key=server_key, swap_template=swap_template))
+
+def raw_values(strategy_id):
+    table = StrategyBlob.__table__
+    stmt = select(type_coerce(key_column, LargeBinary), type_coerce(template_column, LargeBinary)).where(
+        table.c.strategy_id == strategy_id)
+    with db.engine.connect() as conn:
+        return tuple(conn.execute(stmt).one())
+
+def decoded(strategy_id):
+    return tuple(column.type.process_result_value(raw, None)
+                 for column, raw in zip((key_column, template_column), raw_values(strategy_id)))
+
+def test_convert_table_round_trips_every_format(app):
+    insert_raw("legacy", legacy_encrypted(KEY_TEXT), legacy_compressed(TEMPLATE))
+    insert_raw("v1", version_1_encrypted(KEY_TEXT), None)
+    insert_raw("current", key_column.type.process_bind_param(KEY_TEXT, None), None)
+    current = raw_values("current")
+
+    converted, _, _ = convert_table(StrategyBlob.__table__, batch_size=2)
+    assert converted == 3
+    assert decoded("legacy") == (KEY_TEXT, TEMPLATE)
+    assert decoded("v1") == (KEY_TEXT, None)
+    assert all(BlobEnvelope.is_current(raw) for raw in raw_values("legacy") + raw_values("v1")[:1])
+    assert raw_values("current") == current  # Left alone
+    assert convert_table(StrategyBlob.__table__, batch_size=2)[0] == 0
+
+def test_convert_table_dry_run_writes_nothing(app):
+    legacy = legacy_encrypted(KEY_TEXT)
+    insert_raw("legacy", legacy, None)
+    assert convert_table(StrategyBlob.__table__, batch_size=2, dry_run=True)[0] == 1
+    assert raw_values("legacy")[0] == legacy
+
+def test_convert_table_skips_values_rewritten_meanwhile(app, monkeypatch):
+    insert_raw("s1", legacy_encrypted(KEY_TEXT), None)
+    rewritten = key_column.type.process_bind_param('"ffff"', None)
+    decode = type(key_column.type).process_result_value
+
+    def decode_while_a_writer_replaces_it(self, value, dialect):
+        with db.engine.begin() as conn:
+            conn.execute(StrategyBlob.__table__.update().values(server_key=rewritten))
+        return decode(self, value, dialect)
+    monkeypatch.setattr(type(key_column.type), "process_result_value", decode_while_a_writer_replaces_it)
+
+    convert_table(StrategyBlob.__table__, batch_size=2)
+    assert raw_values("s1")[0] == rewritten
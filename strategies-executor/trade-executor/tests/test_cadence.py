@@ -0,0 +1,58 @@
+import math
+
+import pytest
+
+import cadence
+from config import (
+    CHECK_INTERVAL_SECONDS, CADENCE_MIN_INTERVAL_SECONDS, CADENCE_MAX_INTERVAL_SECONDS, CADENCE_TARGET_MOVE,
+)
+from oracle import Quote
+
+FEED = "0xfeed"
+
+@pytest.fixture(autouse=True)
+def fresh_feeds():
+    cadence._feeds.clear()
+    yield
+    cadence._feeds.clear()
+
+def observe(price, publish_time):
+    cadence.observe(FEED, Quote(price, 0.0, publish_time, False))
+
+def test_unmoved_feed_uses_the_check_interval():
+    observe(100.0, 1000)
+    assert cadence.interval(FEED) == CHECK_INTERVAL_SECONDS
+
+def test_flat_feed_backs_off_to_the_maximum():
+    observe(100.0, 1000)
+    observe(100.0, 1010)
+    assert cadence.interval(FEED) == CADENCE_MAX_INTERVAL_SECONDS
+
+def test_interval_is_target_move_over_speed():
+    observe(100.0, 1000)
+    observe(100.0 * math.exp(CADENCE_TARGET_MOVE), 1010)  # The target move in 10 s
+    assert cadence.interval(FEED) == pytest.approx(10)
+
+def test_fast_feed_tightens_to_the_minimum():
+    observe(100.0, 1000)
+    observe(110.0, 1001)
+    assert cadence.interval(FEED) == CADENCE_MIN_INTERVAL_SECONDS
+
+def test_repeated_publish_times_are_ignored():
+    observe(100.0, 1000)
+    observe(150.0, 1000)
+    assert cadence.speed(FEED) is None
+
+def test_due_after_the_interval_or_a_gap():
+    assert cadence.is_due(FEED, 100.0, now=0)  # Never evaluated
+    cadence.evaluated(FEED, 100.0, at=1000)
+    assert not cadence.is_due(FEED, 100.0, now=1000 + CHECK_INTERVAL_SECONDS - 1)
+    assert cadence.is_due(FEED, 100.0, now=1000 + CHECK_INTERVAL_SECONDS)
+    assert cadence.is_due(FEED, 100.0 * (1 + 2 * CADENCE_TARGET_MOVE), now=1001)
+    assert not cadence.is_due(FEED, 100.0 * (1 + CADENCE_TARGET_MOVE / 2), now=1001)
+
+def test_seconds_until_due():
+    cadence.evaluated(FEED, 100.0, at=1000)
+    assert cadence.seconds_until_due([FEED], now=1004) == pytest.approx(CHECK_INTERVAL_SECONDS - 4)
+    assert cadence.seconds_until_due([FEED, "0xnew"], now=1004) == 0.0
+    assert cadence.seconds_until_due([], now=1004) == CHECK_INTERVAL_SECONDS
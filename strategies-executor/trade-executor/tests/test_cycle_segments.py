@@ -0,0 +1,21 @@
+from scheduler import cycle_segments
+
+def test_fresh_cycle_covers_every_feed_in_order():
+    assert cycle_segments(["b", "a", "c"], None) == [("a", None, None), ("b", None, None), ("c", None, None)]
+
+def test_resume_starts_after_the_last_id_and_wraps_around():
+    assert cycle_segments(["a", "b", "c"], ("b", "s42")) == [
+        ("b", "s42", None),
+        ("c", None, None),
+        ("a", None, None),
+        ("b", None, "s42"),
+    ]
+
+def test_resume_at_the_start_of_a_feed_needs_no_wrap():
+    assert cycle_segments(["a", "b"], ("b", None)) == [("b", None, None), ("a", None, None)]
+
+def test_resume_on_a_feed_that_is_gone_starts_over():
+    assert cycle_segments(["a", "b"], ("z", "s1")) == [("a", None, None), ("b", None, None)]
+
+def test_no_feeds():
+    assert cycle_segments([], ("a", "s1")) == []
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+import execution_tracker
+import leases
+from database import db, Strategy
+from ingest import new_strategy
+
+PAYLOAD = {'user_id': 'u', 'asset_in': 'ETH', 'asset_out': 'USDC', 'amount': 1, 'recipient_address': '0x' + '22' * 20}
+IDS = ["s1", "s2", "s3"]
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'executions.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        for day, strategy_id in enumerate(IDS, 1):
+            strategy = new_strategy(PAYLOAD, None, strategy_id)
+            strategy.status = 'TRIGGERED'
+            strategy.last_attempt_at = datetime(2024, 1, day)  # Retried in id order
+            db.session.add(strategy)
+        db.session.commit()
+        yield app
+
+@pytest.fixture
+def started(monkeypatch):
+    """Ids whose resubmission started; the fake send keeps its lease, as a send still running would"""
+    ids = []
+
+    async def resubmit_claimed(strategy_dict):
+        ids.append(strategy_dict['id'])
+    monkeypatch.setattr(execution_tracker, "resubmit_claimed", resubmit_claimed)
+    return ids
+
+def failing_load(monkeypatch, strategy_id, error):
+    load_strategy = execution_tracker.load_strategy
+
+    def load(strategy):
+        if strategy.id == strategy_id:
+            raise error
+        return load_strategy(strategy)
+    monkeypatch.setattr(execution_tracker, "load_strategy", load)
+
+def owners():
+    db.session.expire_all()
+    return {strategy.id: strategy.lease_owner for strategy in Strategy.query.all()}
+
+async def resubmit():
+    in_flight = set()
+    await execution_tracker.resubmit_triggered(in_flight)
+    await asyncio.gather(*in_flight)
+
+def test_unloadable_strategy_is_released_and_the_rest_start(app, monkeypatch, started):
+    failing_load(monkeypatch, "s2", ValueError("bad blob"))
+    asyncio.run(resubmit())
+    assert sorted(started) == ["s1", "s3"]
+    assert owners() == {"s1": leases.owner_id(), "s2": None, "s3": leases.owner_id()}
+
+def test_interrupted_pass_releases_every_unstarted_claim(app, monkeypatch, started):
+    failing_load(monkeypatch, "s2", asyncio.CancelledError())
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(resubmit())
+    assert started == ["s1"]
+    assert owners() == {"s1": leases.owner_id(), "s2": None, "s3": None}
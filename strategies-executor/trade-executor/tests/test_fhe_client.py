@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import pytest
+
+import stub_fhe_engine
+from fhe_client import FheClient
+
+UPPER_CENTS = 100_000  # Triggers at $1000 and above
+
+def strategy(i, key="00ff" * 256):
+    return {
+        "id": f"s{i}",
+        "strategy_type": "LIMIT_SELL_RALLY",
+        "encrypted_upper_bound": json.dumps(stub_fhe_engine.encode_bound(UPPER_CENTS + i * 100)),
+        "encrypted_lower_bound": json.dumps(stub_fhe_engine.encode_bound(0)),
+        "server_key": json.dumps(key),
+    }
+
+STRATEGIES = [strategy(i) for i in range(3)]  # Upper bounds $1000, $1001, $1002
+
+@pytest.fixture
+def engine():
+    """Start a stub engine with make_server() options; returns (server, FheClient keyword arguments)"""
+    servers = []
+
+    def start(**options):
+        server, url = stub_fhe_engine.serve_in_background(**options)
+        servers.append(server)
+        return server, {"url": f"{url}/evaluateStrategy", "batch_url": f"{url}/evaluateBatch",
+                        "register_key_url": f"{url}/registerKey", "timeout_seconds": 5}
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def evaluate(client_options, *rounds, wire_format="msgpack", between=None):
+    """evaluate_batch(STRATEGIES, price) for each price in `rounds` on one client; returns (results, client)"""
+    async def run():
+        results = []
+        async with FheClient(**client_options, wire_format=wire_format) as fhe:
+            for i, price in enumerate(rounds):
+                if i and between:
+                    between()
+                results.append(await fhe.evaluate_batch(STRATEGIES, price))
+        return results, fhe
+    return asyncio.run(run())
+
+def test_batch_with_a_registered_key(engine):
+    server, options = engine()
+    (results,), fhe = evaluate(options, 1001.0)
+    assert results == [True, True, False]
+    assert fhe.binary_supported and fhe.batch_supported
+    assert server.stats["registrations"] == 1
+    assert server.stats["requests"] == 2  # One upload, one batch
+
+def test_msgpack_rejected_falls_back_to_json(engine):
+    server, options = engine(msgpack_bodies=False)
+    (first, second), fhe = evaluate(options, 1001.0, 999.0)
+    assert first == [True, True, False] and second == [False, False, False]
+    assert not fhe.binary_supported
+    # Only the first request is refused; the rest go out as JSON straight away
+    assert server.stats["requests"] == 1 + 3
+
+def test_json_wire_format_never_sends_msgpack(engine):
+    server, options = engine(msgpack_bodies=False)
+    (results,), fhe = evaluate(options, 1001.0, wire_format="json")
+    assert results == [True, True, False]
+    assert server.stats["requests"] == 2
+
+def refuse_batches_with_405(server):
+    class Handler(server.RequestHandlerClass):
+        def do_POST(self):
+            if self.path == "/evaluateBatch":
+                self.stats["requests"] += 1
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                return self._reply(405, {"error": "method not allowed"})
+            super().do_POST()
+    server.RequestHandlerClass = Handler
+
+@pytest.mark.parametrize("status", [404, 405])
+def test_missing_batch_endpoint_falls_back_to_single_calls(engine, status):
+    server, options = engine(batch=status != 404)
+    if status == 405:
+        refuse_batches_with_405(server)
+    (first, second), fhe = evaluate(options, 1001.0, 1002.0)
+    assert first == [True, True, False] and second == [True, True, True]
+    assert not fhe.batch_supported and fhe.batch_size == 1
+    assert server.stats["evaluations"] == 6
+    # One upload, one refused batch, then per-strategy calls only
+    assert server.stats["requests"] == 1 + 1 + 6
+
+def test_lost_key_is_uploaded_again(engine):
+    server, options = engine()
+    (first, second), fhe = evaluate(options, 1001.0, 1001.0, between=server.keys.clear)  # The engine restarted
+    assert first == second == [True, True, False]
+    assert server.stats["registrations"] == 2
+    assert len(fhe.key_handles) == 1
+
+def test_missing_key_registration_sends_keys_inline(engine):
+    server, options = engine(registration=False)
+    (results,), fhe = evaluate(options, 1001.0)
+    assert results == [True, True, False]
+    assert not fhe.registration_supported
+    assert server.stats["registrations"] == 0
@@ -0,0 +1,106 @@
+import io
+import json
+import os
+
+import pytest
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+import ingest
+from database import db, Strategy
+from ingest import iter_ndjson
+
+def lines(body, max_line_bytes=64):
+    return list(iter_ndjson(io.BytesIO(body), max_line_bytes))
+
+def test_yields_numbered_non_blank_lines():
+    assert lines(b'{"a": 1}\n\n  \n{"b": 2}\n') == [(1, b'{"a": 1}\n'), (4, b'{"b": 2}\n')]
+
+def test_last_line_without_newline():
+    assert lines(b'{"a": 1}\n{"b": 2}') == [(1, b'{"a": 1}\n'), (2, b'{"b": 2}')]
+
+def test_overlong_line_is_skipped_to_its_end():
+    body = b'{"a": 1}\n' + b'x' * 200 + b'\n{"b": 2}\n'
+    assert lines(body, max_line_bytes=16) == [(1, b'{"a": 1}\n'), (2, None), (3, b'{"b": 2}\n')]
+
+def test_line_of_exactly_the_limit_is_kept():
+    line = b'x' * 15 + b'\n'
+    assert lines(line, max_line_bytes=16) == [(1, line)]
+
+def test_raw_streams_are_buffered():
+    class Raw(io.RawIOBase):
+        def __init__(self, data):
+            self.data = io.BytesIO(data)
+
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            chunk = self.data.read(len(buffer))
+            buffer[:len(chunk)] = chunk
+            return len(chunk)
+
+    assert list(iter_ndjson(Raw(b'{"a": 1}\n{"b": 2}\n'), 64)) == [(1, b'{"a": 1}\n'), (2, b'{"b": 2}\n')]
+
+# --- Spool ---
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_SPOOL_DIR", str(tmp_path / "spool"))
+    monkeypatch.setattr(ingest, "INGEST_RETRY_BACKOFF_SECONDS", 0)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'ingest.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+PAYLOAD = {'user_id': 'u', 'asset_in': 'ETH', 'asset_out': 'USDC', 'amount': 1, 'recipient_address': '0x' + '22' * 20}
+
+def failing_commits(monkeypatch, failures):
+    commit = db.session.commit
+    calls = []
+
+    def flaky_commit():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        commit()
+    monkeypatch.setattr(db.session, "commit", flaky_commit)
+    return calls
+
+def test_spooled_insert_is_retried(app, monkeypatch):
+    ingest.spool_payload("s1", json.dumps(PAYLOAD).encode())
+    calls = failing_commits(monkeypatch, 2)
+    assert ingest.ingest_spooled("s1") == "ingested"
+    assert len(calls) == 3
+    assert db.session.get(Strategy, "s1") is not None
+    assert ingest.spool_status("s1") is None
+
+def test_spooled_insert_is_rejected_after_the_last_attempt(app, monkeypatch):
+    ingest.spool_payload("s1", json.dumps(PAYLOAD).encode())
+    calls = failing_commits(monkeypatch, ingest.INGEST_MAX_ATTEMPTS)
+    assert ingest.ingest_spooled("s1") == "rejected"
+    assert len(calls) == ingest.INGEST_MAX_ATTEMPTS
+    status, error = ingest.spool_status("s1")
+    assert status == "REJECTED" and "database is locked" in error
+
+def test_invalid_spooled_payload_is_rejected_at_once(app):
+    ingest.spool_payload("s1", json.dumps(dict(PAYLOAD, user_id='')).encode())
+    assert ingest.ingest_spooled("s1") == "rejected"
+    assert ingest.spool_status("s1") == ("REJECTED", "Missing fields: user_id")
+
+def test_spool_file_is_sealed_and_private(app):
+    body = json.dumps(dict(PAYLOAD, server_key="deadbeef" * 8)).encode()
+    path = ingest.spool_payload("s1", body)
+    with open(path, 'rb') as f:
+        assert b"deadbeef" not in f.read()
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert ingest.ingest_spooled("s1") == "ingested"
+    assert db.session.get(Strategy, "s1").server_key == json.dumps("deadbeef" * 8)
+
+def test_plain_spool_file_from_before_sealing_is_ingested(app):
+    os.makedirs(ingest.INGEST_SPOOL_DIR)
+    with open(ingest.spool_path("s1"), 'w') as f:
+        json.dump(PAYLOAD, f)
+    assert ingest.ingest_spooled("s1") == "ingested"
+    assert db.session.get(Strategy, "s1") is not None
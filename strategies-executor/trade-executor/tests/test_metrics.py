@@ -0,0 +1,12 @@
+import metrics
+
+def test_unknown_strategy_types_share_one_label():
+    assert metrics.strategy_type_label("LIMIT_ORDER") == "LIMIT_ORDER"
+    assert metrics.strategy_type_label("x" * 500) == "other"
+    assert metrics.strategy_type_label("") == "other"
+    assert metrics.strategy_type_label(None) == "other"
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("test_escaped_total", "Escaping", ["value"])
+    counter.inc(value='a"b\\c\nd')
+    assert counter.render()[-1] == 'test_escaped_total{value="a\\"b\\\\c\\nd"} 1'
@@ -0,0 +1,77 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from database import db, allocate_nonce
+from trade_executor import NonceManager
+
+class FakeEth:
+    def __init__(self, count):
+        self.count = count
+        self.calls = []
+
+    def get_transaction_count(self, address, block_identifier):
+        self.calls.append((address, block_identifier))
+        return self.count
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'nonces.db'}?timeout=30"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+def manager(count=7):
+    eth = FakeEth(count)
+    return NonceManager(SimpleNamespace(eth=eth), "0xabc"), eth
+
+def test_first_allocation_reads_the_pending_count_once(app):
+    nonces, eth = manager(7)
+    assert [nonces.allocate() for _ in range(3)] == [7, 8, 9]
+    assert eth.calls == [("0xabc", "pending")]
+
+def test_counter_is_shared_between_managers(app):
+    # Two processes sending from the same account
+    first, _ = manager(7)
+    second, _ = manager(7)
+    assert [first.allocate(), second.allocate(), first.allocate(), second.allocate()] == [7, 8, 9, 10]
+
+def test_resync_only_moves_the_counter_forward(app):
+    nonces, eth = manager(7)
+    nonces.allocate()
+    nonces.allocate()
+    eth.count = 8  # Behind the counter: nonce 8 is still someone's to send
+    nonces.resync()
+    assert nonces.allocate() == 9
+    eth.count = 20  # Something else sent from the account
+    nonces.resync()
+    assert nonces.allocate() == 20
+
+def test_allocate_without_a_counter_returns_none(app):
+    assert allocate_nonce("0xabc") is None
+    assert allocate_nonce("0xabc", 3) == 3
+    assert allocate_nonce("0xabc") == 4
+
+def test_concurrent_allocations_are_unique(app):
+    allocated = []
+    lock = threading.Lock()
+
+    def worker():
+        # A manager per thread, like separate processes sharing the database
+        with app.app_context():
+            nonces, _ = manager(0)
+            for _ in range(50):
+                nonce = nonces.allocate()
+                with lock:
+                    allocated.append(nonce)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(allocated) == list(range(400))
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+
+import stub_hermes
+from oracle import OracleClient
+
+FEED = "0xff61491a931112ddf1bd8147cd1b641375f79f5825126d665480874634fd0ace"
+
+@pytest.fixture
+def hermes():
+    """Start stub Hermes servers on demand; returns (board, base url) for each"""
+    servers = []
+
+    def start(price=3000.0):
+        server, url = stub_hermes.serve_in_background(prices={FEED: price})
+        servers.append(server)
+        return server.board, url
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def quotes(urls, hedge_delay_seconds=0.05, rounds=1, between=None):
+    """Quotes from `rounds` calls to one client, and its counters; `between` runs before every call after the first"""
+    async def run():
+        answers = []
+        async with OracleClient(urls, timeout_seconds=2, hedge_delay_seconds=hedge_delay_seconds) as oracle:
+            for i in range(rounds):
+                if i and between:
+                    between()
+                answers.append(await oracle.quotes([FEED]))
+            return answers, oracle.stats()
+    return asyncio.run(run())
+
+def test_fresh_quote(hermes):
+    _, url = hermes()
+    (found,), stats = quotes([url])
+    assert found[FEED].price == pytest.approx(3000.0)
+    assert not found[FEED].cached
+    assert stats["requests"] == 1 and stats["hedged"] == 0
+
+def test_stale_quote_is_rejected(hermes):
+    board, url = hermes()
+    board.set_price(FEED, 3000.0, publish_time=int(time.time()) - 3600)
+    (found,), stats = quotes([url])
+    assert found == {}
+    assert stats["rejected"] == 1
+
+def test_stale_quote_falls_through_to_the_next_endpoint(hermes):
+    stale, stale_url = hermes(3000.0)
+    stale.set_price(FEED, 3000.0, publish_time=int(time.time()) - 3600)
+    _, fresh_url = hermes(3001.0)
+    (found,), stats = quotes([stale_url, fresh_url])
+    assert found[FEED].price == pytest.approx(3001.0)
+    assert stats["rejected"] == 1
+
+def test_hedged_request_wins_over_a_slow_endpoint(hermes):
+    slow, slow_url = hermes(3000.0)
+    slow.poll_latency = 1.0
+    _, fast_url = hermes(3001.0)
+    started = time.perf_counter()
+    (found,), stats = quotes([slow_url, fast_url])
+    assert found[FEED].price == pytest.approx(3001.0)
+    assert time.perf_counter() - started < slow.poll_latency
+    assert stats["requests"] == 2 and stats["hedged"] == 1
+
+def test_failed_endpoint_is_followed_at_once(hermes):
+    failing, failing_url = hermes(3000.0)
+    failing.poll_status = 500
+    _, url = hermes(3001.0)
+    (found,), stats = quotes([failing_url, url], hedge_delay_seconds=1.0)
+    assert found[FEED].price == pytest.approx(3001.0)
+    assert stats["errors"] == 1 and stats["hedged"] == 0
+
+def test_last_good_quote_is_served_while_every_endpoint_fails(hermes):
+    board, url = hermes()
+
+    def fail():
+        board.poll_status = 500
+    (first, second), stats = quotes([url], rounds=2, between=fail)
+    assert not first[FEED].cached
+    assert second[FEED].cached and second[FEED].price == first[FEED].price
+    assert stats["cache_hits"] == 1
+
+def test_stale_last_good_quote_is_not_served(hermes, monkeypatch):
+    board, url = hermes()
+    board.set_price(FEED, 3000.0, publish_time=int(time.time()) - 20)
+
+    def fail_and_age():
+        board.poll_status = 500
+        monkeypatch.setattr("oracle.ORACLE_MAX_PRICE_AGE_SECONDS", 10)
+    (first, second), _ = quotes([url], rounds=2, between=fail_and_age)
+    assert FEED in first
+    assert second == {}
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+import stub_hermes
+from price_stream import PriceStream
+
+FEED = "0xff61491a931112ddf1bd8147cd1b641375f79f5825126d665480874634fd0ace"
+
+@pytest.fixture
+def hermes():
+    server, url = stub_hermes.serve_in_background(interval=0.1, prices={FEED: 3000.0})
+    yield server.board, url
+    server.shutdown()
+    server.server_close()
+
+async def until(condition, timeout=5):
+    """Wait for `condition()` to hold, polling"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def price(stream):
+    quote = stream.latest([FEED]).get(FEED)
+    return quote.price if quote is not None else None
+
+def follow(url, scenario):
+    """Run a PriceStream subscribed to FEED against `url` while `scenario(stream)` plays out"""
+    async def run():
+        stream = PriceStream(f"{url}/v2/updates/price/stream", idle_timeout_seconds=5, reconnect_seconds=0.05)
+        stream.subscribe([FEED])
+        task = asyncio.create_task(stream.run())
+        try:
+            await scenario(stream)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return stream.stats()
+    return asyncio.run(run())
+
+def test_streamed_price_changes_are_applied(hermes):
+    board, url = hermes
+
+    async def scenario(stream):
+        await until(lambda: price(stream) is not None)
+        assert price(stream) == pytest.approx(3000.0)
+        assert await stream.wait_for_update(timeout=5)  # Set by the first event
+        board.set_price(FEED, 3100.0)
+        assert await stream.wait_for_update(timeout=5)
+        assert price(stream) == pytest.approx(3100.0)
+    stats = follow(url, scenario)
+    assert stats["changes"] >= 2
+
+def test_dropped_stream_reconnects(hermes):
+    board, url = hermes
+
+    async def scenario(stream):
+        await until(lambda: stream.connected)
+        board.drop_streams()
+        await until(lambda: stream.counters["connects"] == 2 and stream.connected)
+        board.set_price(FEED, 3200.0)
+        await until(lambda: price(stream) == pytest.approx(3200.0))
+    stats = follow(url, scenario)
+    assert stats["drops"] >= 1
+
+def test_no_quotes_while_disconnected(hermes):
+    board, url = hermes
+
+    async def scenario(stream):
+        await until(lambda: price(stream) is not None)
+        board.streaming = False
+        board.drop_streams()
+        await until(lambda: not stream.connected)
+        assert price(stream) is None  # The scheduler polls the oracle instead
+        board.streaming = True
+        await until(lambda: price(stream) is not None, timeout=10)
+    stats = follow(url, scenario)
+    assert stats["connects"] == 2
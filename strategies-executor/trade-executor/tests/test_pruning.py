@@ -0,0 +1,63 @@
+import pytest
+import pruning
+from pruning import can_skip, widen
+
+@pytest.mark.parametrize("price, high, expected", [
+    (100, None, False),   # Never evaluated
+    (99, 100, True),      # Below the highest "not triggered" price
+    (100, 100, True),     # At it: same answer
+    (101, 100, False),    # Above it: could trigger now
+])
+def test_upper_bound_type_skips_at_or_below_high_watermark(price, high, expected):
+    assert can_skip("LIMIT_SELL_RALLY", price, high, None) is expected
+
+@pytest.mark.parametrize("price, low, expected", [
+    (100, None, False),
+    (101, 100, True),
+    (100, 100, True),
+    (99, 100, False),
+])
+def test_lower_bound_type_skips_at_or_above_low_watermark(price, low, expected):
+    assert can_skip("LIMIT_BUY_DIP", price, None, low) is expected
+
+def test_upper_and_lower_types_ignore_the_other_watermark():
+    assert can_skip("LIMIT_SELL_RALLY", 50, None, 10) is False
+    assert can_skip("LIMIT_BUY_DIP", 50, 100, None) is False
+
+@pytest.mark.parametrize("strategy_type", ["LIMIT_ORDER", "BRACKET_ORDER_SHORT"])
+@pytest.mark.parametrize("price, high, low, expected", [
+    (100, None, None, False),
+    (100, 120, None, False),   # Only one side known
+    (100, None, 80, False),
+    (100, 120, 80, True),      # Inside the band
+    (120, 120, 80, True),      # On its edges
+    (80, 120, 80, True),
+    (121, 120, 80, False),     # Outside: either bound may trigger
+    (79, 120, 80, False),
+])
+def test_dual_bound_types_skip_only_inside_the_band(strategy_type, price, high, low, expected):
+    assert can_skip(strategy_type, price, high, low) is expected
+
+def test_unknown_type_is_never_skipped():
+    assert can_skip("SOMETHING_NEW", 100, 200, 50) is False
+
+def test_widen_starts_both_watermarks_at_the_first_price():
+    assert widen(100, None, None) == (100, 100)
+
+def test_widen_only_moves_watermarks_outwards():
+    assert widen(150, 120, 80) == (150, 80)
+    assert widen(50, 120, 80) == (120, 50)
+    assert widen(100, 120, 80) == (120, 80)
+
+def test_widened_watermarks_skip_the_price_they_were_widened_with():
+    for strategy_type in ("LIMIT_SELL_RALLY", "LIMIT_BUY_DIP", "LIMIT_ORDER"):
+        high, low = widen(100, None, None)
+        assert can_skip(strategy_type, 100, high, low)
+
+def test_count_updates_stats():
+    before = pruning.stats()
+    pruning.count("skipped")
+    pruning.count("evaluated")
+    after = pruning.stats()
+    assert after["skipped"] == before["skipped"] + 1
+    assert after["evaluated"] == before["evaluated"] + 1
@@ -0,0 +1,73 @@
+import pytest
+from flask import Flask
+
+import auth
+import rate_limiter
+from rate_limiter import MemoryBackend, SQLiteBackend, refill_and_take
+
+def test_take_from_a_full_bucket():
+    assert refill_and_take(10, 0, 10, 1.0, 0) == (9, True, 0.0, 1.0)
+
+def test_empty_bucket_is_denied_until_a_token_refills():
+    tokens, allowed, retry_after, full_at = refill_and_take(0.25, 0, 10, 0.5, 0)
+    assert (tokens, allowed) == (0.25, False)
+    assert retry_after == pytest.approx(1.5)
+    assert full_at == pytest.approx(19.5)
+
+def test_refill_is_capped_at_capacity():
+    tokens, allowed, _, full_at = refill_and_take(0, 0, 5, 1.0, 1000)
+    assert (tokens, allowed, full_at) == (4, True, 1001)
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: now[0])
+    return now
+
+def test_memory_backend_limits_each_key(clock):
+    backend = MemoryBackend(max_clients=10)
+    assert [backend.take("a", 2, 1.0)[0] for _ in range(3)] == [True, True, False]
+    assert backend.take("b", 2, 1.0)[0]
+    clock[0] += 1
+    assert backend.take("a", 2, 1.0) == (True, 0.0)
+
+def test_memory_backend_drops_refilled_buckets(clock):
+    backend = MemoryBackend(max_clients=10)
+    backend.take("a", 2, 1.0)
+    clock[0] += 5  # "a" is full again
+    backend.take("b", 2, 1.0)
+    assert list(backend._buckets) == ["b"]
+    assert backend.evictions == 0
+
+def test_memory_backend_evicts_the_least_recently_used(clock):
+    backend = MemoryBackend(max_clients=2)
+    for key in ("a", "b", "a", "c"):
+        backend.take(key, 5, 0.1)
+    assert list(backend._buckets) == ["a", "c"]
+    assert backend.evictions == 1
+
+def test_sqlite_backend_shares_buckets_between_instances(tmp_path, clock):
+    path = str(tmp_path / "buckets.db")
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+    assert first.take("a", 2, 1.0)[0]
+    assert second.take("a", 2, 1.0)[0]
+    allowed, retry_after = first.take("a", 2, 1.0)
+    assert not allowed and retry_after == pytest.approx(1.0)
+
+class BrokenBackend:
+    def take(self, key, capacity, rate):
+        raise OSError("database is locked")
+
+def test_failing_backend_falls_back_to_memory_limits(monkeypatch):
+    monkeypatch.setattr(auth, "limiter", BrokenBackend())
+    monkeypatch.setattr(auth, "fallback", MemoryBackend(max_clients=10))
+    app = Flask(__name__)
+
+    @app.route("/limited")
+    @auth.rate_limit(max_requests=2, window_seconds=60)
+    def limited():
+        return "ok"
+
+    client = app.test_client()
+    assert [client.get("/limited").status_code for _ in range(3)] == [200, 200, 429]
@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+from flask import Flask
+
+import archive
+import ingest
+from database import db, Strategy, ServerKey, intern_server_key, load_strategy, server_key_digest
+
+KEY = {"key": "shared server key"}
+PAYLOAD = {'user_id': 'u', 'asset_in': 'ETH', 'asset_out': 'USDC', 'amount': 1,
+           'recipient_address': '0x' + '22' * 20, 'server_key': KEY}
+DIGEST = server_key_digest(json.dumps(KEY))
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(archive, "ARCHIVE_AFTER_SECONDS", -60)
+    monkeypatch.setattr(archive, "ARCHIVE_BATCH_PAUSE_SECONDS", 0)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'keys.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+def ingest_shared_key(count):
+    body = b"".join(json.dumps(PAYLOAD).encode() + b"\n" for _ in range(count))
+    results = ingest.ingest_ndjson(io.BytesIO(body), batch_size=count, max_batch_bytes=1 << 20, max_line_bytes=1 << 16)
+    return [result["strategy_id"] for result in results]
+
+def refcount():
+    key = db.session.get(ServerKey, DIGEST, populate_existing=True)
+    return key.refcount if key is not None else None
+
+def test_every_strategy_in_a_batch_counts(app):
+    ingest_shared_key(3)
+    assert refcount() == 3
+
+def test_interning_an_existing_key_in_a_fresh_session(app):
+    ingest_shared_key(1)
+    db.session.remove()
+    intern_server_key(json.dumps(KEY))
+    db.session.commit()
+    assert refcount() == 2
+
+def test_compaction_keeps_keys_still_in_use(app):
+    first, second, pending = ingest_shared_key(3)
+    Strategy.query.filter(Strategy.id.in_([first, second])).update({"status": "CONFIRMED"})
+    db.session.commit()
+
+    archive.compact()
+    db.session.remove()
+    assert refcount() == 1
+    assert load_strategy(db.session.get(Strategy, pending))["server_key"] == json.dumps(KEY)
+
+    db.session.get(Strategy, pending).status = "FAILED"
+    db.session.commit()
+    archive.compact()
+    assert refcount() is None
+
+def test_compaction_ignores_undercounted_keys(app):
+    pending, = ingest_shared_key(1)
+    ServerKey.query.update({"refcount": 0})  # As left by releases that lost increments
+    db.session.commit()
+
+    archive.compact()
+    db.session.remove()
+    assert db.session.get(ServerKey, DIGEST) is not None
+    assert load_strategy(db.session.get(Strategy, pending))["server_key"] == json.dumps(KEY)
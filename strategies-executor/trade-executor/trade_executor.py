@@ -1,9 +1,13 @@
 import os
 import json
+import math
 import sys
+import threading
+import time
+from functools import lru_cache
 from dotenv import load_dotenv
-from web3 import Web3
-from web3.middleware import geth_poa_middleware
+import metrics
+from database import allocate_nonce
 
 # --- LOAD ENVIRONMENT VARIABLES ---
 load_dotenv(override=True)
@@ -12,13 +16,36 @@ SEPOLIA_RPC_URL = os.getenv("SEPOLIA_RPC_URL")
 ENTRYPOINT_CONTRACT_ADDRESS = os.getenv("ENTRYPOINT_CONTRACT_ADDRESS")
 EXECUTOR_PRIVATE_KEY = os.getenv("EXECUTOR_PRIVATE_KEY")
 ABI_PATH = os.getenv("ABI_PATH", "Entrypoint.abi.json") # Default to local file if not set
+# Pooled keep-alive connections to the RPC node, shared by concurrent trades
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", 8))
+RPC_TIMEOUT_SECONDS = float(os.getenv("RPC_TIMEOUT_SECONDS", 10))
+# Gas estimates are reused per (pool, token pair) for this long
+GAS_ESTIMATE_TTL_SECONDS = float(os.getenv("GAS_ESTIMATE_TTL_SECONDS", 600))
+# EIP-1559 fees of a first send. A transaction stuck at a nonce is replaced with both fees bumped by
+# REPLACEMENT_FEE_BUMP each time (nodes need at least +10%), up to MAX_FEE_CAP_GWEI
+MAX_FEE_GWEI = float(os.getenv("MAX_FEE_GWEI", 50))
+PRIORITY_FEE_GWEI = float(os.getenv("PRIORITY_FEE_GWEI", 2))
+MAX_FEE_CAP_GWEI = float(os.getenv("MAX_FEE_CAP_GWEI", 500))
+REPLACEMENT_FEE_BUMP = 1.125
+CANCEL_GAS_LIMIT = 21000
+CHAIN_ID = 11155111 # Sepolia
+
+# Fallback WETH/USDC Pool on Sepolia (Example)
+FALLBACK_POOL_ADDRESS = "0x3289680dD4d6C10bb19b899729cda5eEF58AEfF1"
+SWAP_FEE_TIER = 500  # 0.05% fee tier
+DEFAULT_GAS_LIMIT = 3000000
+
+# web3 takes seconds to import, so it (and everything built with it) is loaded on the first trade, not at startup
 
 # --- TOKEN ADDRESSES (Sepolia) ---
-TOKEN_ADDRESSES = {
-    "ETH": Web3.to_checksum_address("0xEeeeeEeeeEeEeeEeEeEeeEEEeeeeEeeeeeeeEEeE"),
-    "USDC": Web3.to_checksum_address("0x1c7D4B196Cb0C7B01d743Fbc6116a902379C7238"),
-    "WETH": Web3.to_checksum_address("0x7b79995e5f793A07Bc00c21412e50Eaae098E7f9")
-}
+@lru_cache(maxsize=None)
+def token_addresses():
+    from web3 import Web3
+    return {
+        "ETH": Web3.to_checksum_address("0xEeeeeEeeeEeEeeEeEeEeeEEEeeeeEeeeeeeeEEeE"),
+        "USDC": Web3.to_checksum_address("0x1c7D4B196Cb0C7B01d743Fbc6116a902379C7238"),
+        "WETH": Web3.to_checksum_address("0x7b79995e5f793A07Bc00c21412e50Eaae098E7f9")
+    }
 
 # --- LOAD ABI FUNCTION ---
 def load_contract_abi(path):
@@ -41,8 +68,10 @@ def load_contract_abi(path):
         print(f"❌ [Executor] Error loading ABI from {path}: {e}")
         return None
 
-# Load ABI globally once
-CONTRACT_ABI = load_contract_abi(ABI_PATH)
+# Load ABI once, on first use
+@lru_cache(maxsize=None)
+def contract_abi():
+    return load_contract_abi(ABI_PATH)
 
 # --- HELPERS ---
 def safe_int(val):
@@ -71,130 +100,298 @@ def format_proof_to_uint_array(proof_list):
             continue
     return formatted
 
-def execute_trade(strategy, current_price):
-    print("\n" + "="*60)
-    print(f"✅ EXECUTION: Trigger met for strategy '{strategy['id']}'")
+class TradeRejected(Exception):
+    """The trade can't be built from this strategy/config; retrying won't help"""
 
-    # 1. Validation Checks
-    missing_vars = []
-    if not SEPOLIA_RPC_URL: missing_vars.append("SEPOLIA_RPC_URL")
-    if not ENTRYPOINT_CONTRACT_ADDRESS: missing_vars.append("ENTRYPOINT_CONTRACT_ADDRESS")
-    if not EXECUTOR_PRIVATE_KEY: missing_vars.append("EXECUTOR_PRIVATE_KEY")
-    if not CONTRACT_ABI: missing_vars.append("ABI (Check ABI_PATH)")
+# --- SWAP TEMPLATES ---
+# Everything about a swap except nonce, fees and signature is known when the
+# strategy is created, so it is validated and ABI-encoded once at ingest.
 
-    if missing_vars:
-        print(f"   ❌ [Executor] CRITICAL ERROR: Missing config: {', '.join(missing_vars)}")
-        return
+def resolve_token(raw, field):
+    """Checksummed address for a token symbol or address"""
+    from web3 import Web3
+    TOKEN_ADDRESSES = token_addresses()
+    if raw in TOKEN_ADDRESSES:
+        return TOKEN_ADDRESSES[raw]
+    if Web3.is_address(raw):
+        return Web3.to_checksum_address(raw)
+    raise TradeRejected(f"Invalid {field}: '{raw}'")
+
+def swap_args(strategy):
+    """Validated arguments of Entrypoint.swap(...) for a strategy; raises TradeRejected"""
+    from web3 import Web3
 
+    # 1. Parse ZK Data
     try:
-        # 2. Connect to Blockchain
-        w3 = Web3(Web3.HTTPProvider(SEPOLIA_RPC_URL))
-        # Inject PoA middleware for Sepolia/testnets
-        w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        raw_zkp = strategy['zkp_data']
+        zk_payload = raw_zkp if isinstance(raw_zkp, dict) else json.loads(raw_zkp)
+        inputs = zk_payload.get('publicInputs', {})
 
-        if not w3.is_connected():
-            print("   ❌ [Executor] Could not connect to RPC.")
-            return
+        raw_proof = zk_payload.get('proof', [])
+        proof_array = format_proof_to_uint_array(raw_proof)
 
-        executor_account = w3.eth.account.from_key(EXECUTOR_PRIVATE_KEY)
-        entrypoint_contract = w3.eth.contract(address=ENTRYPOINT_CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+        zk_proof_struct = {
+            "stateRoot": safe_int(inputs.get('root')),
+            "nullifier": safe_int(inputs.get('nullifier')),
+            "newCommitment": safe_int(inputs.get('newCommitment')),
+            "proof": proof_array
+        }
 
-        # 3. Parse ZK Data
-        try:
-            zk_payload = json.loads(strategy['zkp_data'])
-            inputs = zk_payload.get('publicInputs', {})
-
-            raw_proof = zk_payload.get('proof', [])
-            proof_array = format_proof_to_uint_array(raw_proof)
-
-            zk_proof_struct = {
-                "stateRoot": safe_int(inputs.get('root')),
-                "nullifier": safe_int(inputs.get('nullifier')),
-                "newCommitment": safe_int(inputs.get('newCommitment')),
-                "proof": proof_array
-            }
-
-            _amountIn = safe_int(inputs.get('amount'))
-
-            raw_asset_in = inputs.get('asset', '')
-            if raw_asset_in in TOKEN_ADDRESSES:
-                _srcToken = TOKEN_ADDRESSES[raw_asset_in]
-            elif w3.is_address(raw_asset_in):
-                _srcToken = Web3.to_checksum_address(raw_asset_in)
-            else:
-                print(f"   ❌ [Executor] Invalid asset_in: '{raw_asset_in}'")
-                return
-
-        except Exception as e:
-            print(f"   ❌ [Executor] Failed to parse zkp_data: {e}")
-            return
-
-        # 4. BUILD TRANSACTION PARAMS
-        raw_asset_out = strategy.get('asset_out', 'ETH')
-        if raw_asset_out in TOKEN_ADDRESSES:
-            _dstToken = TOKEN_ADDRESSES[raw_asset_out]
-        elif w3.is_address(raw_asset_out):
-            _dstToken = Web3.to_checksum_address(raw_asset_out)
-        else:
-            print(f"   ❌ [Executor] Invalid asset_out: '{raw_asset_out}'")
-            return
-
-        # Use Pool Address from Strategy or Fallback
-        _pool = strategy.get('pool_address')
-        if not _pool or not w3.is_address(_pool):
-            # Fallback WETH/USDC Pool on Sepolia (Example)
-            _pool = Web3.to_checksum_address("0x3289680dD4d6C10bb19b899729cda5eEF58AEfF1")
-            print(f"   ⚠️ [Executor] Missing strategy pool_address. Using Fallback: {_pool}")
-        else:
-            _pool = Web3.to_checksum_address(_pool)
+        _amountIn = safe_int(inputs.get('amount'))
+        _srcToken = resolve_token(inputs.get('asset', ''), 'asset_in')
+    except TradeRejected:
+        raise
+    except Exception as e:
+        raise TradeRejected(f"Failed to parse zkp_data: {e}")
 
+    # 2. Swap parameters
+    _dstToken = resolve_token(strategy.get('asset_out') or 'ETH', 'asset_out')
 
+    # Use Pool Address from Strategy or Fallback
+    _pool = strategy.get('pool_address')
+    if not _pool or not Web3.is_address(_pool):
+        _pool = FALLBACK_POOL_ADDRESS
+        print(f"   ⚠️ [Executor] Missing strategy pool_address. Using Fallback: {_pool}")
+    _pool = Web3.to_checksum_address(_pool)
+
+    try:
         _recipient = Web3.to_checksum_address(strategy['recipient_address'])
-        _minAmountOut = 0
-        _fee = 500  # 0.05% fee tier
-
-        print(f"   [Executor] Building transaction for Entrypoint...")
-        print(f"     -> Amount In: {_amountIn}")
-        print(f"     -> Asset Path: {_srcToken} -> {_dstToken}")
-
-        # 5. Build & Send (EIP-1559 Compatible)
-        tx_func = entrypoint_contract.functions.swap(
-            _pool,
-            _srcToken,
-            _dstToken,
-            _recipient,
-            _amountIn,
-            _minAmountOut,
-            _fee,
-            zk_proof_struct
-        )
+    except Exception as e:
+        raise TradeRejected(f"Invalid recipient_address: {e}")
+    _minAmountOut = 0
+
+    return [_pool, _srcToken, _dstToken, _recipient, _amountIn, _minAmountOut, SWAP_FEE_TIER, zk_proof_struct]
+
+@lru_cache(maxsize=None)
+def swap_encoder():
+    """Provider-less contract object, only used to ABI-encode calls"""
+    from web3 import Web3
+    abi = contract_abi()
+    return Web3().eth.contract(abi=abi) if abi else None
+
+def build_swap_template(strategy):
+    """Ready-to-sign swap call: {"pool", "src_token", "dst_token", "amount_in", "data"}.
+
+    Raises TradeRejected for strategies that can't produce a valid swap;
+    returns None when no ABI is configured (the trade is then built at trigger time).
+    """
+    args = swap_args(strategy)
+    encoder = swap_encoder()
+    if encoder is None:
+        return None
+    return {
+        "pool": args[0],
+        "src_token": args[1],
+        "dst_token": args[2],
+        "amount_in": args[4],
+        "data": encoder.encodeABI(fn_name="swap", args=args),
+    }
+
+# --- FEES ---
+def gwei_to_wei(gwei):
+    return math.ceil(gwei * 10**9)
+
+def replacement_fees(replacement):
+    """(maxFeePerGas, maxPriorityFeePerGas) in wei for the n-th transaction sent at one nonce (0 = first send)"""
+    bump = REPLACEMENT_FEE_BUMP ** replacement
+    return gwei_to_wei(MAX_FEE_GWEI * bump), gwei_to_wei(PRIORITY_FEE_GWEI * bump)
+
+def can_replace(replacement):
+    """Whether the n-th transaction at a nonce stays within MAX_FEE_CAP_GWEI"""
+    return replacement_fees(replacement)[0] <= gwei_to_wei(MAX_FEE_CAP_GWEI)
+
+# --- PERSISTENT EXECUTOR CLIENT ---
+class NonceManager:
+    """Hands out the executor account's nonces from a counter in the database, so every process sending from
+    it (web workers, standalone schedulers) gets distinct ones without asking the chain before each send"""
+
+    def __init__(self, w3, address, allocate_nonce=allocate_nonce):
+        self.w3 = w3
+        self.address = address
+        self._allocate_nonce = allocate_nonce
+        self._lock = threading.Lock()
+        self._synced = False
+
+    def chain_nonce(self):
+        # 'pending' counts transactions already in the mempool, not just mined ones
+        return self.w3.eth.get_transaction_count(self.address, 'pending')
+
+    def allocate(self):
+        with self._lock:
+            # The first allocation of a process catches the counter up with the chain, in case the
+            # account was used from elsewhere
+            nonce = self._allocate_nonce(self.address, None if self._synced else self.chain_nonce())
+            if nonce is None:
+                nonce = self._allocate_nonce(self.address, self.chain_nonce())
+            self._synced = True
+            return nonce
+
+    def resync(self):
+        """Catch the counter up with the chain again on the next allocation"""
+        with self._lock:
+            self._synced = False
+
+class ExecutorClient:
+    """Long-lived Web3 connection, signer and contract for the executor account.
+
+    Built once on the first trade and shared by every trade after it: one pooled
+    HTTP session, PoA middleware injected once, and nonces from a NonceManager,
+    so triggers in quick succession are broadcast without per-trade setup.
+    """
+
+    def __init__(self, rpc_url, private_key, contract_address, abi, pool_size=RPC_POOL_SIZE):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from web3 import Web3
+        from web3.middleware import geth_poa_middleware
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        self.rpc_url = rpc_url
+        self.session = session
+
+        self.w3 = Web3(Web3.HTTPProvider(rpc_url, session=session, request_kwargs={"timeout": RPC_TIMEOUT_SECONDS}))
+        # Inject PoA middleware for Sepolia/testnets
+        self.w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        self.account = self.w3.eth.account.from_key(private_key)
+        self.contract = self.w3.eth.contract(address=contract_address, abi=abi)
+        self.nonces = NonceManager(self.w3, self.account.address)
+        # (pool, src token, dst token) -> (gas limit, monotonic expiry)
+        self.gas_estimates = {}
+
+    def gas_limit(self, template):
+        """Gas limit for a swap, estimated once per pool and token pair and reused for GAS_ESTIMATE_TTL_SECONDS"""
+        key = (template['pool'], template['src_token'], template['dst_token'])
+        cached = self.gas_estimates.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
 
         # Estimate gas to prevent under-gassing failures
         try:
-            estimated_gas = tx_func.estimate_gas({'from': executor_account.address})
-            gas_limit = int(estimated_gas * 1.2) # Add 20% buffer
+            estimated_gas = self.w3.eth.estimate_gas({
+                'from': self.account.address,
+                'to': self.contract.address,
+                'data': template['data'],
+            })
         except Exception as gas_err:
             print(f"   ⚠️ Gas estimation failed ({gas_err}), using default.")
-            gas_limit = 3000000
-
-        tx = tx_func.build_transaction({
-            'from': executor_account.address,
-            'nonce': w3.eth.get_transaction_count(executor_account.address),
-            'gas': gas_limit,
-            'maxFeePerGas': w3.to_wei('50', 'gwei'),
-            'maxPriorityFeePerGas': w3.to_wei('2', 'gwei'),
-            'chainId': 11155111 # Sepolia
-        })
-
-        signed_tx = w3.eth.account.sign_transaction(tx, private_key=EXECUTOR_PRIVATE_KEY)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        
-        print(f"   ✅ Transaction sent! Hash: {tx_hash.hex()}")
-        print(f"   🔗 https://sepolia.etherscan.io/tx/{tx_hash.hex()}")
+            return DEFAULT_GAS_LIMIT
+        gas_limit = int(estimated_gas * 1.2) # Add 20% buffer
+        self.gas_estimates[key] = (gas_limit, time.monotonic() + GAS_ESTIMATE_TTL_SECONDS)
+        return gas_limit
+
+    def swap_call(self, data, gas_limit):
+        """Transaction fields of a call to the Entrypoint with pre-encoded calldata"""
+        return {'to': self.contract.address, 'data': data, 'value': 0, 'gas': gas_limit}
+
+    def cancel_call(self):
+        """Transaction fields of an empty transfer to ourselves, which uses up a nonce without swapping"""
+        return {'to': self.account.address, 'data': b'', 'value': 0, 'gas': CANCEL_GAS_LIMIT}
+
+    def sign(self, call, nonce, replacement=0):
+        """(tx hash, raw transaction) for `call` at `nonce`, with the fees of the n-th send at that nonce"""
+        from web3 import Web3
+        max_fee, priority_fee = replacement_fees(replacement)
+        tx = dict(call, nonce=nonce, maxFeePerGas=max_fee, maxPriorityFeePerGas=priority_fee, chainId=CHAIN_ID)
+        with metrics.TX_STAGE_SECONDS.time(stage="sign"):
+            signed_tx = self.account.sign_transaction(tx)
+        return Web3.to_hex(signed_tx.hash), signed_tx.rawTransaction
+
+    def broadcast(self, raw_transaction):
+        with metrics.TX_STAGE_SECONDS.time(stage="broadcast"):
+            self.w3.eth.send_raw_transaction(raw_transaction)
+
+    def mined_count(self):
+        """Transactions of ours mined so far, i.e. the lowest nonce not used yet"""
+        return self.w3.eth.get_transaction_count(self.account.address, 'latest')
+
+    def nonce_consumed(self, nonce):
+        """Whether a mined transaction of ours has used `nonce`"""
+        return self.mined_count() > nonce
+
+    def transaction_nonce(self, tx_hash):
+        """Nonce of a transaction the node knows (mined or in its mempool), else None"""
+        from web3.exceptions import TransactionNotFound
+        try:
+            return self.w3.eth.get_transaction(tx_hash)['nonce']
+        except TransactionNotFound:
+            return None
+
+    def get_receipts(self, tx_hashes):
+        """Receipts for many transactions in one JSON-RPC batch; maps hash -> receipt, or None while pending"""
+        if not tx_hashes:
+            return {}
+        batch = [
+            {"jsonrpc": "2.0", "id": i, "method": "eth_getTransactionReceipt", "params": [tx_hash]}
+            for i, tx_hash in enumerate(tx_hashes)
+        ]
+        response = self.session.post(self.rpc_url, json=batch, timeout=RPC_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        receipts = {tx_hash: None for tx_hash in tx_hashes}
+        for item in response.json():
+            if item.get("result"):
+                receipts[tx_hashes[item["id"]]] = item["result"]
+        return receipts
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_executor_client():
+    """The shared ExecutorClient, created on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ExecutorClient(SEPOLIA_RPC_URL, EXECUTOR_PRIVATE_KEY, ENTRYPOINT_CONTRACT_ADDRESS, contract_abi())
+            print(f"   [Executor] RPC client ready for {_client.account.address}")
+        return _client
+
+def prepare_trade(strategy):
+    """Transaction fields of the swap for a triggered strategy, ready to sign at a nonce (ExecutorClient.sign).
+
+    Uses the calldata template stored at ingest (building it here for older
+    strategies), so a trigger only costs a nonce, a signature and the broadcast.
+    Raises TradeRejected when the strategy or config can't produce a valid
+    transaction, and lets RPC errors propagate so the caller can retry.
+    """
+    print("\n" + "="*60)
+    print(f"✅ EXECUTION: Preparing swap for strategy '{strategy['id']}'")
+
+    # 1. Validation Checks
+    missing_vars = []
+    if not SEPOLIA_RPC_URL: missing_vars.append("SEPOLIA_RPC_URL")
+    if not ENTRYPOINT_CONTRACT_ADDRESS: missing_vars.append("ENTRYPOINT_CONTRACT_ADDRESS")
+    if not EXECUTOR_PRIVATE_KEY: missing_vars.append("EXECUTOR_PRIVATE_KEY")
+    if not contract_abi(): missing_vars.append("ABI (Check ABI_PATH)")
+
+    if missing_vars:
+        print(f"   ❌ [Executor] CRITICAL ERROR: Missing config: {', '.join(missing_vars)}")
+        raise TradeRejected(f"Missing config: {', '.join(missing_vars)}")
+
+    try:
+        # 2. Precompiled calldata (strategies created before templates get one built now)
+        with metrics.TX_STAGE_SECONDS.time(stage="build"):
+            template = strategy.get('swap_template') or build_swap_template(strategy)
+
+        # 3. Reuse the long-lived blockchain connection
+        client = get_executor_client()
+        with metrics.TX_STAGE_SECONDS.time(stage="gas"):
+            gas_limit = client.gas_limit(template)
+
+        print(f"   [Executor] Swap through Entrypoint ready...")
+        print(f"     -> Amount In: {template['amount_in']}")
+        print(f"     -> Asset Path: {template['src_token']} -> {template['dst_token']}")
         print("="*60)
+        return client.swap_call(template['data'], gas_limit)
 
+    except TradeRejected as e:
+        print(f"   ❌ [Executor] {e}")
+        print("="*60)
+        raise
     except Exception as e:
         print(f"   ❌ [Executor] On-chain error: {e}")
         import traceback
         traceback.print_exc()
-        print("="*60)
\ No newline at end of file
+        print("="*60)
+        raise